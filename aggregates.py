@@ -0,0 +1,101 @@
+"""
+Dashboard aggregates for Capital.com Market Analyzer
+
+Refreshed in the same transaction as every publish, so the dashboard header
+and /api/stats read one precomputed row instead of loading every market.
+One row per category plus an ALL_SCOPE row for the whole universe.
+"""
+
+import json
+
+# Horizons that get a best and worst market per scope
+AGGREGATE_METRICS = (
+    'price_change_pct',
+    'perf_1w_pct',
+    'perf_1m_pct',
+    'perf_3m_pct',
+    'perf_6m_pct',
+    'perf_ytd_pct',
+    'perf_1y_pct',
+    'perf_5y_pct',
+    'perf_10y_pct',
+)
+
+ALL_SCOPE = '*'
+
+
+def _market(symbol, name, value) -> dict:
+    return {'symbol': symbol, 'name': name, 'value': value}
+
+
+def refresh_aggregates(conn) -> int:
+    """
+    Recompute market_aggregates from the markets table on the caller's
+    transaction. Gainers and losers count the sign of price_change_pct;
+    extremes maps each AGGREGATE_METRICS column to its best and worst market.
+    """
+    row = conn.execute("SELECT value FROM metadata WHERE key = 'last_fetch_time'").fetchone()
+    last_fetch = row[0] if row else None
+
+    scopes = {}
+    for category, markets, gainers, losers in conn.execute('''
+        SELECT category, COUNT(*),
+               COALESCE(SUM(price_change_pct > 0), 0),
+               COALESCE(SUM(price_change_pct < 0), 0)
+        FROM markets GROUP BY category
+    '''):
+        scopes[category] = {'markets': markets, 'categories': 1, 'gainers': gainers, 'losers': losers, 'extremes': {}}
+
+    overall = {
+        'markets': sum(s['markets'] for s in scopes.values()),
+        'categories': len(scopes),
+        'gainers': sum(s['gainers'] for s in scopes.values()),
+        'losers': sum(s['losers'] for s in scopes.values()),
+        'extremes': {},
+    }
+
+    for metric in AGGREGATE_METRICS:
+        for label, pick in (('best', 'MAX'), ('worst', 'MIN')):
+            # SQLite returns the other columns from the row holding the MAX/MIN
+            for category, symbol, name, value in conn.execute(f'''
+                SELECT category, symbol, name, {pick}({metric})
+                FROM markets WHERE {metric} IS NOT NULL GROUP BY category
+            '''):
+                market = _market(symbol, name, value)
+                scopes[category]['extremes'].setdefault(metric, {})[label] = market
+                current = overall['extremes'].setdefault(metric, {}).get(label)
+                if current is None or (value > current['value'] if label == 'best' else value < current['value']):
+                    overall['extremes'][metric][label] = market
+
+    scopes[ALL_SCOPE] = overall
+    conn.execute('DELETE FROM market_aggregates')
+    conn.executemany(
+        '''
+        INSERT INTO market_aggregates (scope, markets, categories, gainers, losers, extremes, last_fetch)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''',
+        (
+            (scope, s['markets'], s['categories'], s['gainers'], s['losers'], json.dumps(s['extremes']), last_fetch)
+            for scope, s in scopes.items()
+        ),
+    )
+    return len(scopes)
+
+
+def load_aggregates(conn, scope: str = ALL_SCOPE):
+    """A scope's aggregate row as a dict (extremes decoded), or None before the first publish."""
+    row = conn.execute(
+        'SELECT markets, categories, gainers, losers, extremes, last_fetch FROM market_aggregates WHERE scope = ?',
+        (scope,),
+    ).fetchone()
+    if row is None:
+        return None
+    markets, categories, gainers, losers, extremes, last_fetch = row
+    return {
+        'markets': markets,
+        'categories': categories,
+        'gainers': gainers,
+        'losers': losers,
+        'extremes': json.loads(extremes),
+        'last_fetch': last_fetch,
+    }
@@ -3,18 +3,27 @@ Flask web app for Capital.com Market Analyzer
 Modern, responsive interface with integrated analyzer control
 """
 
-from flask import Flask, render_template, request, jsonify, Response
+from flask import Flask, render_template, request, jsonify, make_response, Response
 import pandas as pd
 import sqlite3
 import os
-import subprocess
-import sys
 import json
 import time
 import config # Import config for available categories
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import wraps
 from pathlib import Path
 import threading
+from rankings import RANKED_METRICS, top_performers as top_performers_by_category
+from row_versions import changes_since, dataset_version
+from aggregates import load_aggregates
+from correlation import DEFAULT_WINDOW, CorrelationEngine
+from db_connections import enable_wal, pool_for
+from schema import migrate
+from market_query import DEFAULT_LIMIT, PAGE_PARAMS, MarketQueryError, market_page, parse_range_filters
+from search import matching_ids_sql, search_markets
+from snapshots import SNAPSHOT_METRICS, snapshot_history
+from run_analyzer import market_rows_from_frame, replace_market_rows, run_analysis, tune_write_connection
 
 app = Flask(__name__)
 # Pick up template edits without restarting the server (HTML/JS in index.html).
@@ -25,7 +34,11 @@ app.config["TEMPLATES_AUTO_RELOAD"] = True
 def _no_store_dashboard_and_api(response: Response) -> Response:
     """Avoid stale table UI and JSON when the app or template is updated."""
     if request.path == "/" or request.path.startswith("/api"):
-        response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+        if response.get_etag()[0]:
+            # Dataset-versioned endpoints: the client may keep a copy but must revalidate it
+            response.headers["Cache-Control"] = "no-cache, must-revalidate, max-age=0"
+        else:
+            response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
         response.headers["Pragma"] = "no-cache"
         response.headers["Expires"] = "0"
     return response
@@ -34,83 +47,67 @@ def _no_store_dashboard_and_api(response: Response) -> Response:
 # Configuration
 DB_PATH = 'market_data.db'
 CSV_FILE = 'capital_markets_analysis.csv'
-ANALYZER_PROCESS = None
+ANALYZER_LOCK = threading.Lock()
 ANALYZER_RUNNING = False
+ANALYZER_LAST_RESULT = None
 APP_STARTUP_DONE = False
+CORRELATIONS = CorrelationEngine()
+
+
+def _db():
+    """Shared connections for DB_PATH (readers checked out per request, one writer)."""
+    return pool_for(DB_PATH)
+
+
+@app.teardown_appcontext
+def _release_reader(exc):
+    """Return the request thread's reader; the dev server starts a thread per request."""
+    pool_for(DB_PATH).release()
+
+
+def conditional_on_dataset(view):
+    """
+    ETag/Last-Modified from the dataset version, which every publish and
+    streamed batch bumps. A matching If-None-Match gets a 304 from the
+    metadata row alone, before the view reads any markets. If-Modified-Since
+    is only consulted without an ETag; every bump moves Last-Modified to a
+    later whole second, so a date at or after it means nothing changed.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            version, published_at = dataset_version(_db().reader())
+        except Exception as e:
+            print(f"Error reading dataset version: {e}")
+            return view(*args, **kwargs)
+
+        etag = f'dataset-{version}'
+        last_modified = None
+        if published_at:
+            last_modified = datetime.strptime(published_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = last_modified is not None and since is not None and since >= last_modified
+
+        response = Response(status=304) if not_modified else make_response(view(*args, **kwargs))
+        if response.status_code in (200, 304):
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+        return response
+    return wrapper
 
 
 def init_db():
-    """Initialize SQLite database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS markets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT NOT NULL,
-            symbol TEXT NOT NULL UNIQUE,
-            name TEXT NOT NULL,
-            current_price REAL,
-            currency TEXT,
-            price_change_pct REAL,
-            perf_1w_pct REAL,
-            perf_1m_pct REAL,
-            perf_3m_pct REAL,
-            perf_6m_pct REAL,
-            perf_ytd_pct REAL,
-            perf_1y_pct REAL,
-            perf_5y_pct REAL,
-            perf_10y_pct REAL,
-            rsi_24h REAL,
-            rsi_1w REAL,
-            rsi_1m REAL,
-            rsi_3m REAL,
-            rsi_6m REAL,
-            rsi_ytd REAL,
-            rsi_1h REAL,
-            rsi_4h REAL,
-            rsi_1y REAL,
-            rsi_5y REAL,
-            rsi_10y REAL,
-            market_status TEXT,
-            type TEXT,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS metadata (
-            key TEXT PRIMARY KEY,
-            value TEXT,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    _ensure_rsi_columns(conn)
-    conn.close()
-
-
-def _ensure_rsi_columns(conn):
-    cur = conn.cursor()
-    cur.execute("PRAGMA table_info(markets)")
-    existing = {row[1] for row in cur.fetchall()}
-    for col in (
-        "rsi_24h",
-        "rsi_1w",
-        "rsi_1m",
-        "rsi_3m",
-        "rsi_6m",
-        "rsi_ytd",
-        "rsi_1h",
-        "rsi_4h",
-        "rsi_1y",
-        "rsi_5y",
-        "rsi_10y",
-    ):
-        if col not in existing:
-            cur.execute(f"ALTER TABLE markets ADD COLUMN {col} REAL")
-    conn.commit()
+    """Create or migrate the SQLite database to the current schema"""
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        enable_wal(conn)
+        migrate(conn)
+    finally:
+        conn.close()
 
 
 def import_csv_to_db(csv_file):
@@ -119,112 +116,32 @@ def import_csv_to_db(csv_file):
         return False
     
     try:
-        df = pd.read_csv(csv_file)
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        _ensure_rsi_columns(conn)
-
-        # Clear existing data
-        cursor.execute('DELETE FROM markets')
-        
-        def parse_rsi(val):
-            if pd.isna(val) or val == '' or val == 'N/A':
-                return None
-            if isinstance(val, (int, float)):
-                return float(val)
-            try:
-                return float(str(val).replace('%', '').strip())
-            except (ValueError, TypeError):
-                return None
-
-        for _, row in df.iterrows():
-            def parse_pct(val):
-                if pd.isna(val) or val == 'N/A':
-                    return None
-                if isinstance(val, str):
-                    try:
-                        return float(val.replace('%', '').strip())
-                    except (ValueError, AttributeError):
-                        return None
-                return float(val)
-            
-            cursor.execute('''
-                INSERT INTO markets (
-                    category, symbol, name, current_price, currency,
-                    price_change_pct, perf_1w_pct, perf_1m_pct, perf_3m_pct,
-                    perf_6m_pct, perf_ytd_pct, perf_1y_pct, perf_5y_pct,
-                    perf_10y_pct, rsi_24h, rsi_1w, rsi_1m, rsi_3m, rsi_6m,
-                    rsi_ytd, rsi_1h, rsi_4h, market_status, type
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                row.get('Category', ''),
-                row.get('Symbol', ''),
-                row.get('Name', ''),
-                parse_pct(row.get('Current Price', None)),
-                row.get('Currency', ''),
-                parse_pct(row.get('Price Change %', None)),
-                parse_pct(row.get('Perf % 1W', None)),
-                parse_pct(row.get('Perf % 1M', None)),
-                parse_pct(row.get('Perf % 3M', None)),
-                parse_pct(row.get('Perf % 6M', None)),
-                parse_pct(row.get('Perf % YTD', None)),
-                parse_pct(row.get('Perf % 1Y', None)),
-                parse_pct(row.get('Perf % 5Y', None)),
-                parse_pct(row.get('Perf % 10Y', None)),
-                parse_rsi(row.get('RSI 24H', None)),
-                parse_rsi(row.get('RSI 1W', None)),
-                parse_rsi(row.get('RSI 1M', None)),
-                parse_rsi(row.get('RSI 3M', None)),
-                parse_rsi(row.get('RSI 6M', None)),
-                parse_rsi(row.get('RSI YTD', None)),
-                parse_rsi(row.get('RSI 1H', None)),
-                parse_rsi(row.get('RSI 4H', None)),
-                row.get('Market Status', ''),
-                row.get('Type', '')
-            ))
-        
-        # Update metadata
-        cursor.execute('DELETE FROM metadata WHERE key = ?', ('last_fetch_time',))
-        cursor.execute(
-            'INSERT INTO metadata (key, value) VALUES (?, ?)',
-            ('last_fetch_time', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        )
-        
-        conn.commit()
-        conn.close()
+        rows = market_rows_from_frame(pd.read_csv(csv_file))
+        with _db().writer() as conn:
+            tune_write_connection(conn)
+            # Replace the whole table in one transaction
+            replace_market_rows(conn, rows)
         return True
     except Exception as e:
         print(f"Error importing CSV: {e}")
         return False
 
 
-def set_last_fetch_time(value=None):
-    """Persist the latest fetch timestamp in metadata."""
+def has_market_data():
+    """Whether the markets table holds any rows"""
     try:
-        timestamp = value or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM metadata WHERE key = ?', ('last_fetch_time',))
-        cursor.execute(
-            'INSERT INTO metadata (key, value) VALUES (?, ?)',
-            ('last_fetch_time', timestamp)
-        )
-        conn.commit()
-        conn.close()
-        return timestamp
-    except Exception as e:
-        print(f"Error updating fetch timestamp: {e}")
-        return None
+        row = _db().reader().execute('SELECT 1 FROM markets LIMIT 1').fetchone()
+        return row is not None
+    except Exception:
+        return False
 
 
 def get_last_fetch_time():
     """Get last data fetch timestamp"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        cursor = _db().reader().cursor()
         cursor.execute('SELECT value FROM metadata WHERE key = ?', ('last_fetch_time',))
         result = cursor.fetchone()
-        conn.close()
         return result[0] if result else "Never"
     except:
         return "Unknown"
@@ -233,9 +150,7 @@ def get_last_fetch_time():
 def load_markets_from_db(category=None, search=None):
     """Load markets from SQLite"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = _db().reader().cursor()
         
         query = 'SELECT * FROM markets WHERE 1=1'
         params = []
@@ -244,13 +159,14 @@ def load_markets_from_db(category=None, search=None):
             query += ' AND category = ?'
             params.append(category)
         
-        if search:
-            query += ' AND (name LIKE ? OR symbol LIKE ?)'
-            params.extend([f'%{search}%', f'%{search}%'])
+        matching = matching_ids_sql(cursor.connection, search) if search else None
+        if matching:
+            condition, match_params = matching
+            query += f' AND {condition}'
+            params.extend(match_params)
         
         cursor.execute(query, params)
         rows = cursor.fetchall()
-        conn.close()
         
         return [dict(row) for row in rows]
     except Exception as e:
@@ -261,11 +177,9 @@ def load_markets_from_db(category=None, search=None):
 def get_categories():
     """Get all categories"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        cursor = _db().reader().cursor()
         cursor.execute('SELECT DISTINCT category FROM markets ORDER BY category')
         categories = [row[0] for row in cursor.fetchall()]
-        conn.close()
         return ['All'] + categories
     except:
         return ['All']
@@ -292,62 +206,88 @@ def get_top_performers(timeframe):
     col_name = perf_col_map.get(timeframe, 'perf_1m_pct')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT DISTINCT category FROM markets ORDER BY category')
-        categories = [row[0] for row in cursor.fetchall()]
-        
         top_performers = {}
-        for category in categories:
-            cursor.execute(f'''
-                SELECT name, symbol, {col_name} as perf
-                FROM markets
-                WHERE category = ? AND {col_name} IS NOT NULL
-                ORDER BY {col_name} DESC
-                LIMIT 5
-            ''', (category,))
-            
-            performers = []
-            for row in cursor.fetchall():
-                performers.append({
-                    'name': row['name'],
-                    'symbol': row['symbol'],
-                    'performance': f"{row['perf']:.2f}%" if row['perf'] is not None else 'N/A'
-                })
-            
-            top_performers[category] = performers
+        for row in top_performers_by_category(_db().reader(), col_name):
+            performers = top_performers.setdefault(row['category'], [])
+            # Categories with no values still get an (empty) entry
+            if row['value'] is None:
+                continue
+            performers.append({
+                'name': row['name'],
+                'symbol': row['symbol'],
+                'performance': f"{row['value']:.2f}%"
+            })
         
-        conn.close()
         return top_performers
     except Exception as e:
         print(f"Error getting top performers: {e}")
         return {}
 
 
-@app.route('/')
-def index():
-    """Main dashboard"""
-    markets = load_markets_from_db()
-    
+def get_ranked_markets(metric, category=None, scope='category', min_percentile=0.0, limit=50):
+    """Markets at or above a percentile for a metric, best first (indexed lookup)."""
+    pct_col = 'global_percentile' if scope == 'global' else 'category_percentile'
+    try:
+        cursor = _db().reader().cursor()
+
+        query = '''
+            SELECT r.symbol, m.name, r.category, r.value,
+                   r.category_rank, r.category_percentile, r.category_zscore,
+                   r.global_rank, r.global_percentile, r.global_zscore
+            FROM market_ranks r
+            JOIN markets m ON m.symbol = r.symbol
+            WHERE r.metric = ?
+        '''
+        params = [metric]
+        if scope != 'global' and category and category != 'All':
+            query += ' AND r.category = ?'
+            params.append(category)
+        query += f' AND r.{pct_col} >= ? ORDER BY r.{pct_col} DESC LIMIT ?'
+        params.extend([min_percentile, limit])
+
+        cursor.execute(query, params)
+        rows = [dict(row) for row in cursor.fetchall()]
+        return rows
+    except Exception as e:
+        print(f"Error getting rankings: {e}")
+        return []
+
+
+def get_dashboard_stats():
+    """Header stats from the precomputed market_aggregates row"""
+    try:
+        aggregates = load_aggregates(_db().reader())
+    except Exception as e:
+        print(f"Error loading aggregates: {e}")
+        aggregates = None
+    if aggregates is None:
+        return {'total_markets': 0, 'total_categories': 0, 'gainers': 0, 'losers': 0,
+                'last_fetch': get_last_fetch_time(), 'has_data': False}
+
     stats = {
-        'total_markets': len(markets),
-        'total_categories': len(set(m['category'] for m in markets)) if markets else 0,
-        'last_fetch': get_last_fetch_time(),
-        'has_data': len(markets) > 0
+        'total_markets': aggregates['markets'],
+        'total_categories': aggregates['categories'],
+        'gainers': aggregates['gainers'],
+        'losers': aggregates['losers'],
+        'last_fetch': aggregates['last_fetch'] or "Never",
+        'has_data': aggregates['markets'] > 0
     }
-    
+
     # Best performer (1M)
-    if markets:
-        best = max([m for m in markets if m['perf_1m_pct'] is not None], 
-                   key=lambda x: x['perf_1m_pct'], default=None)
-        if best:
-            stats['best_performer'] = {
-                'name': best['name'],
-                'symbol': best['symbol'],
-                'value': f"{best['perf_1m_pct']:.2f}%"
-            }
+    best = aggregates['extremes'].get('perf_1m_pct', {}).get('best')
+    if best:
+        stats['best_performer'] = {
+            'name': best['name'],
+            'symbol': best['symbol'],
+            'value': f"{best['value']:.2f}%"
+        }
+    return stats
+
+
+@app.route('/')
+def index():
+    """Main dashboard"""
+    stats = get_dashboard_stats()
 
     # Pass available categories from config.py
     available_categories = config.CATEGORIES if hasattr(config, 'CATEGORIES') else []
@@ -355,15 +295,9 @@ def index():
     return render_template('index.html', stats=stats, available_categories=available_categories)
 
 
-@app.route('/api/markets')
-def api_markets():
-    """API endpoint for market data"""
-    category = request.args.get('category', 'All')
-    search = request.args.get('search', '').lower()
-    
-    markets = load_markets_from_db(category if category != 'All' else None, search)
-    
-    return jsonify([{
+def _market_json(m):
+    """A markets row in the /api/markets shape"""
+    return {
         'id': m['id'],
         'Category': m['category'],
         'Symbol': m['symbol'],
@@ -387,7 +321,81 @@ def api_markets():
         'rsi_ytd': m.get('rsi_ytd'),
         'rsi_1h': m.get('rsi_1h'),
         'rsi_4h': m.get('rsi_4h'),
-    } for m in markets])
+        'row_version': m.get('row_version'),
+    }
+
+
+@app.route('/api/markets')
+@conditional_on_dataset
+def api_markets():
+    """
+    API endpoint for market data
+
+    Without sort/dir/limit/cursor or a <column>_lt/_lte/_gt/_gte filter this
+    returns every matching market as an array (what the dashboard loads).
+    With any of them it returns one keyset page:
+    {markets, next_cursor, total_estimate, sort, dir, limit}.
+    """
+    category = request.args.get('category', 'All')
+    search = request.args.get('search', '').lower()
+
+    try:
+        ranges = parse_range_filters(request.args)
+        if ranges or any(param in request.args for param in PAGE_PARAMS):
+            page = market_page(
+                _db().reader(),
+                sort=request.args.get('sort', 'symbol'),
+                direction=request.args.get('dir', 'asc'),
+                limit=request.args.get('limit', DEFAULT_LIMIT, type=int),
+                cursor=request.args.get('cursor') or None,
+                category=category if category != 'All' else None,
+                search=search or None,
+                ranges=ranges,
+            )
+            page['markets'] = [_market_json(dict(row)) for row in page['markets']]
+            return jsonify(page)
+    except MarketQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    markets = load_markets_from_db(category if category != 'All' else None, search)
+
+    return jsonify([_market_json(m) for m in markets])
+
+
+@app.route('/api/markets/search')
+def api_search_markets():
+    """Name/symbol search: exact symbol first, then symbol and word prefix matches"""
+    q = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    category = request.args.get('category')
+
+    try:
+        rows = search_markets(_db().reader(), q, limit=limit,
+                              category=category if category and category != 'All' else None)
+    except Exception as e:
+        print(f"Error searching markets: {e}")
+        return jsonify({'error': 'Search failed'}), 500
+
+    return jsonify([_market_json(dict(row)) for row in rows])
+
+
+@app.route('/api/markets/changes')
+def api_market_changes():
+    """Markets written and symbols deleted after row version `since`; pass back `version` next time"""
+    since = request.args.get('since', 0, type=int)
+
+    try:
+        rows, deleted, version = changes_since(_db().reader(), since)
+    except Exception as e:
+        print(f"Error loading market changes: {e}")
+        return jsonify({'error': 'Change lookup failed'}), 500
+
+    return jsonify({
+        'since': since,
+        'version': version,
+        'markets': [_market_json(dict(row)) for row in rows],
+        'deleted': deleted,
+    })
 
 
 @app.route('/api/categories')
@@ -397,64 +405,120 @@ def api_categories():
 
 
 @app.route('/api/top-performers')
+@conditional_on_dataset
 def api_top_performers():
     """Get top performers by category"""
     timeframe = request.args.get('timeframe', '1M')
     return jsonify(get_top_performers(timeframe))
 
 
+@app.route('/api/rankings')
+def api_rankings():
+    """Ranked markets for a metric, e.g. ?metric=perf_1m&category=Forex&min_percentile=0.9"""
+    metric = request.args.get('metric', 'perf_1m_pct')
+    if metric not in RANKED_METRICS and f'{metric}_pct' in RANKED_METRICS:
+        metric = f'{metric}_pct'
+    if metric not in RANKED_METRICS:
+        return jsonify({'error': f'Unknown metric: {metric}'}), 400
+
+    scope = request.args.get('scope', 'category')
+    min_percentile = request.args.get('min_percentile', 0.0, type=float)
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(get_ranked_markets(
+        metric,
+        category=request.args.get('category'),
+        scope=scope,
+        min_percentile=min_percentile,
+        limit=limit,
+    ))
+
+
+@app.route('/api/markets/<symbol>/correlated')
+def api_correlated(symbol):
+    """Top-k instruments by daily log-return correlation with a symbol"""
+    window = request.args.get('window', DEFAULT_WINDOW, type=int)
+    k = request.args.get('k', 10, type=int)
+
+    try:
+        conn = _db().reader()
+        top = CORRELATIONS.top_correlated(conn, symbol, window=window, k=k)
+        if top is None:
+            return jsonify({'error': f'No candle history for {symbol}'}), 404
+
+        names = {}
+        if top:
+            placeholders = ', '.join('?' for _ in top)
+            names = {
+                row['symbol']: row for row in conn.execute(
+                    f'SELECT symbol, name, category FROM markets WHERE symbol IN ({placeholders})',
+                    [s for s, _ in top],
+                )
+            }
+    except Exception as e:
+        print(f"Error computing correlations: {e}")
+        return jsonify({'error': 'Correlation lookup failed'}), 500
+
+    return jsonify({
+        'symbol': symbol,
+        'window': window,
+        'correlated': [{
+            'symbol': s,
+            'name': names[s]['name'] if s in names else s,
+            'category': names[s]['category'] if s in names else None,
+            'correlation': round(corr, 4),
+        } for s, corr in top],
+    })
+
+
+@app.route('/api/markets/<symbol>/history')
+def api_history(symbol):
+    """A symbol's snapshot history for one metric (default RSI 1H, last 24 hours)"""
+    metric = request.args.get('metric', 'rsi_1h')
+    hours = request.args.get('hours', 24, type=float)
+    if metric not in SNAPSHOT_METRICS:
+        return jsonify({'error': f'Unknown metric: {metric}'}), 400
+
+    try:
+        points = snapshot_history(_db().reader(), symbol, metric, since=time.time() - hours * 3600)
+    except Exception as e:
+        print(f"Error loading snapshot history: {e}")
+        return jsonify({'error': 'History lookup failed'}), 500
+
+    return jsonify({
+        'symbol': symbol,
+        'metric': metric,
+        'points': [{'ts': ts, 'value': value} for ts, value in points],
+    })
+
+
 @app.route('/api/stats')
+@conditional_on_dataset
 def api_stats():
     """Get statistics"""
-    markets = load_markets_from_db()
+    stats = get_dashboard_stats()
     return jsonify({
-        'last_fetch': get_last_fetch_time(),
-        'total_markets': len(markets),
-        'total_categories': len(set(m['category'] for m in markets)) if markets else 0
+        'last_fetch': stats['last_fetch'],
+        'total_markets': stats['total_markets'],
+        'total_categories': stats['total_categories'],
+        'gainers': stats['gainers'],
+        'losers': stats['losers'],
     })
 
 
 def run_analyzer(categories=None):
-    """Run the analyzer script in background"""
-    global ANALYZER_PROCESS, ANALYZER_RUNNING
+    """Run the analyzer pipeline in-process; it writes straight to the database"""
+    global ANALYZER_RUNNING, ANALYZER_LAST_RESULT
     
     try:
-        ANALYZER_RUNNING = True
-
-        cmd = [sys.executable, 'run_analyzer.py']
-        if categories:
-            cmd.extend(['--categories'] + categories)
-
-        # Run run_analyzer.py as subprocess
-        ANALYZER_PROCESS = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        # Wait for completion
-        stdout, stderr = ANALYZER_PROCESS.communicate()
-        ANALYZER_RUNNING = False
-        
-        # Re-import data if successful
-        if ANALYZER_PROCESS.returncode == 0:
-            if os.path.exists(CSV_FILE):
-                import_csv_to_db(CSV_FILE)
-                set_last_fetch_time()
-        
-        return {
-            'success': ANALYZER_PROCESS.returncode == 0,
-            'stdout': stdout,
-            'stderr': stderr,
-            'returncode': ANALYZER_PROCESS.returncode
-        }
+        result = run_analysis(categories or None, db_path=DB_PATH)
     except Exception as e:
-        ANALYZER_RUNNING = False
-        return {
+        result = {
             'success': False,
             'error': str(e)
         }
+    ANALYZER_LAST_RESULT = result
+    ANALYZER_RUNNING = False
+    return result
 
 
 @app.route('/api/analyzer/status')
@@ -463,6 +527,7 @@ def analyzer_status():
     return jsonify({
         'running': ANALYZER_RUNNING,
         'last_fetch': get_last_fetch_time(),
+        'last_result': ANALYZER_LAST_RESULT,
     })
 
 
@@ -471,13 +536,15 @@ def analyzer_run():
     """Start analyzer"""
     global ANALYZER_RUNNING
     
-    if ANALYZER_RUNNING:
-        return jsonify({'success': False, 'error': 'Analyzer already running'}), 400
+    with ANALYZER_LOCK:
+        if ANALYZER_RUNNING:
+            return jsonify({'success': False, 'error': 'Analyzer already running'}), 400
+        ANALYZER_RUNNING = True
     
     data = request.json or {}
     categories = data.get('categories', [])
     
-    # Run in background thread to not block
+    # Run on a background worker thread to not block
     thread = threading.Thread(target=run_analyzer, args=(categories,))
     thread.daemon = True
     thread.start()
@@ -489,8 +556,8 @@ if __name__ == '__main__':
     # Initialize database
     init_db()
     
-    # Import CSV data if available
-    if os.path.exists(CSV_FILE):
+    # The database is the primary store; only seed an empty one from the CSV backup
+    if os.path.exists(CSV_FILE) and not has_market_data():
         import_csv_to_db(CSV_FILE)
         print(f"[OK] Data imported from {CSV_FILE}")
 
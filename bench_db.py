@@ -0,0 +1,366 @@
+"""
+Benchmark market table writes
+
+Compares the legacy per-row write path (DELETE, then one cursor.execute per
+row, rows parsed with df.iterrows() for the CSV import) against the bulk
+path (column-wise row tuples loaded into markets_staging with executemany,
+indexes built once at the swap, a single transaction with WRITE_PRAGMAS).
+Both sides time the markets rows only;
+the metadata stamp and rankings refresh that follow a publish are excluded.
+
+--reads times the dashboard's top-performers lookup instead: the legacy
+per-category ORDER BY ... LIMIT 5 loop on an unindexed table against the
+single ROW_NUMBER() query with the (category, metric) indexes in place.
+--search times market search: LIKE '%q%' against the markets_fts index.
+--delta republishes a populated table with 5% of the markets changed:
+rebuilding it through markets_staging against the in-place upsert that
+skips unchanged content hashes, reporting time and WAL bytes written.
+--shards streams --rows markets per category through MarketWriter in one
+and in two processes (different categories), with and without
+CATEGORY_SHARDS, and then times the publish that follows.
+
+    python bench_db.py --rows 2500 100000
+    python bench_db.py --reads --rows 100000
+    python bench_db.py --search --rows 100000
+    python bench_db.py --delta --rows 2500 100000
+    python bench_db.py --shards --rows 20000
+"""
+
+import argparse
+import copy
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+import config
+from run_analyzer import (
+    INSERT_MARKET_SQL,
+    MARKET_FIELDS,
+    MarketWriter,
+    export_to_csv,
+    init_database,
+    market_row_tuples,
+    market_rows_from_frame,
+    tune_write_connection,
+    publish_market_rows,
+    _publish_via_staging,
+)
+from row_versions import next_row_version, versioned_rows
+from rankings import top_performers
+from search import search_markets
+from schema import PERF_COLUMNS, ensure_market_indexes
+
+CATEGORIES = ['Forex', 'Shares', 'Indices', 'Commodities', 'Cryptocurrencies', 'Etf']
+
+
+def synthetic_records(n: int, seed: int = 7) -> list:
+    """Analyzer-style records with typed metrics, as _build_market_record emits them."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        record = {}
+        for _, field, kind in MARKET_FIELDS:
+            if kind == 'num':
+                record[field] = None if rng.random() < 0.05 else rng.uniform(-50, 50)
+            else:
+                record[field] = f"{field} {i % 50}"
+        record['Category'] = CATEGORIES[i % len(CATEGORIES)]
+        record['Symbol'] = f"EPIC{i:06d}"
+        record['Name'] = f"Market {i}"
+        record['Current Price'] = round(rng.uniform(1, 1000), 5)
+        records.append(record)
+    return records
+
+
+def _legacy_parse(val):
+    if pd.isna(val) or val == 'N/A':
+        return None
+    if isinstance(val, str):
+        try:
+            return float(val.replace('%', '').strip())
+        except (ValueError, AttributeError):
+            return None
+    return float(val)
+
+
+def legacy_store(conn, records: list):
+    """Per-row inserts after a DELETE, as store_to_database used to write."""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM markets')
+    for row in records:
+        cursor.execute(INSERT_MARKET_SQL, tuple(
+            _legacy_parse(row.get(field)) if kind == 'num' else row.get(field, '')
+            for _, field, kind in MARKET_FIELDS
+        ))
+    conn.commit()
+
+
+def legacy_import(conn, csv_path: str):
+    """df.iterrows() with per-row parsing, as import_csv_to_db used to import."""
+    df = pd.read_csv(csv_path)
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM markets')
+    for _, row in df.iterrows():
+        cursor.execute(INSERT_MARKET_SQL, tuple(
+            _legacy_parse(row.get(field)) if kind == 'num' else row.get(field, '')
+            for _, field, kind in MARKET_FIELDS
+        ))
+    conn.commit()
+
+
+def bulk_store(conn, records: list):
+    tune_write_connection(conn)
+    with conn:
+        publish_market_rows(conn, market_row_tuples(records))
+
+
+def bulk_import(conn, csv_path: str):
+    tune_write_connection(conn)
+    with conn:
+        publish_market_rows(conn, market_rows_from_frame(pd.read_csv(csv_path)))
+
+
+def _timed(db_path: str, fn, *args) -> float:
+    conn = sqlite3.connect(db_path)
+    try:
+        start = time.perf_counter()
+        fn(conn, *args)
+        return time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def run(rows: int, workdir: str):
+    records = synthetic_records(rows)
+    csv_path = os.path.join(workdir, f"bench_{rows}.csv")
+    export_to_csv(records, csv_path)
+
+    results = []
+    for label, fn, arg in (
+        ('store legacy', legacy_store, records),
+        ('store bulk', bulk_store, records),
+        ('csv legacy', legacy_import, csv_path),
+        ('csv bulk', bulk_import, csv_path),
+    ):
+        db_path = os.path.join(workdir, f"bench_{rows}_{label.replace(' ', '_')}.db")
+        init_database(db_path)
+        _timed(db_path, fn, arg)            # first load: empty table
+        seconds = _timed(db_path, fn, arg)  # refresh: table already populated
+        results.append((label, seconds))
+    return results
+
+
+def legacy_top_performers(conn, column: str, limit: int = 5) -> list:
+    """DISTINCT categories, then one sorted LIMIT query per category."""
+    rows = []
+    categories = [r[0] for r in conn.execute('SELECT DISTINCT category FROM markets ORDER BY category')]
+    for category in categories:
+        rows.extend(conn.execute(
+            f'SELECT category, name, symbol, {column} FROM markets '
+            f'WHERE category = ? AND {column} IS NOT NULL ORDER BY {column} DESC LIMIT ?',
+            (category, limit),
+        ).fetchall())
+    return rows
+
+
+def _timed_reads(conn, fn, repeat: int) -> float:
+    """Mean seconds for one pass over every performance column."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for column in PERF_COLUMNS:
+            fn(conn, column)
+    return (time.perf_counter() - start) / (repeat * len(PERF_COLUMNS))
+
+
+def run_reads(rows: int, workdir: str, repeat: int = 5):
+    db_path = os.path.join(workdir, f"bench_reads_{rows}.db")
+    init_database(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        bulk_store(conn, synthetic_records(rows))
+        indexes = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'markets' AND sql IS NOT NULL"
+        )]
+        for name in indexes:
+            conn.execute(f'DROP INDEX {name}')
+        results = [('top legacy', _timed_reads(conn, legacy_top_performers, repeat))]
+        ensure_market_indexes(conn)
+        conn.execute('ANALYZE')
+        results.append(('top window', _timed_reads(conn, top_performers, repeat)))
+        return results
+    finally:
+        conn.close()
+
+
+_SYLLABLES = ('al', 'ba', 'co', 'de', 'fi', 'go', 'ha', 'in', 'ka', 'lo', 'ma', 'ne', 'or', 'pa',
+              'qu', 'ri', 'sa', 'te', 'un', 've', 'wa', 'xi', 'yo', 'zu', 'tech', 'gold', 'oil', 'bank')
+
+
+def _instrument_names(n: int, seed: int = 11) -> list:
+    """Varied multi-word instrument names ("Gobate Kaun Holdings"-style)."""
+    rng = random.Random(seed)
+    def word():
+        return ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+    suffixes = ('Inc', 'PLC', 'Holdings', 'Group', 'ETF', 'Trust', 'Fund', 'AG')
+    return [f"{word()} {word()} {rng.choice(suffixes)}" for _ in range(n)]
+
+
+def legacy_search(conn, query: str) -> list:
+    pattern = f'%{query}%'
+    return conn.execute('SELECT * FROM markets WHERE name LIKE ? OR symbol LIKE ?', (pattern, pattern)).fetchall()
+
+
+def run_search(rows: int, workdir: str, repeat: int = 50):
+    db_path = os.path.join(workdir, f"bench_search_{rows}.db")
+    init_database(db_path)
+    records = synthetic_records(rows)
+    names = _instrument_names(rows)
+    for record, name in zip(records, names):
+        record['Name'] = name
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        bulk_store(conn, records)
+        queries = ['EPIC000042', 'EPIC0123', names[rows // 2].split()[0][:4], names[7].split()[1], 'zzzq', 'gold oil']
+        results = []
+        for label, fn in (('search like', legacy_search), ('search fts', search_markets)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for query in queries:
+                    fn(conn, query)
+            results.append((label, (time.perf_counter() - start) / (repeat * len(queries))))
+        return results
+    finally:
+        conn.close()
+
+
+def rebuild_store(conn, rows: list):
+    """Republish every row through markets_staging, as every publish did before delta writes."""
+    conn.execute('BEGIN')
+    version = next_row_version(conn)
+    _publish_via_staging(conn, versioned_rows(rows, version), None, None, version)
+
+
+def run_delta(rows: int, workdir: str, changed_share: float = 0.05):
+    records = synthetic_records(rows)
+    refreshed = copy.deepcopy(records)
+    step = max(1, round(1 / changed_share))
+    for record in refreshed[::step]:
+        record['Perf % 1M'] = (record['Perf % 1M'] or 0.0) + 1.0
+    refreshed_rows = market_row_tuples(refreshed)
+
+    results = []
+    for label, fn in (('delta rebuild', rebuild_store), ('delta upsert', publish_market_rows)):
+        db_path = os.path.join(workdir, f"bench_{rows}_{label.replace(' ', '_')}.db")
+        init_database(db_path)
+        _timed(db_path, bulk_store, records)
+        conn = sqlite3.connect(db_path)
+        try:
+            tune_write_connection(conn)
+            conn.execute('PRAGMA wal_autocheckpoint = 0')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            start = time.perf_counter()
+            with conn:
+                fn(conn, refreshed_rows)
+            seconds = time.perf_counter() - start
+            results.append((label, seconds, os.path.getsize(db_path + '-wal')))
+        finally:
+            conn.close()
+    return results
+
+
+def _category_records(category: str, rows: int) -> list:
+    records = synthetic_records(rows, seed=len(category))
+    for i, record in enumerate(records):
+        record['Category'] = category
+        record['Symbol'] = f"{category[:3].upper()}{i:06d}"
+    return records
+
+
+def _stream(db_path: str, category: str, rows: int, shards: bool):
+    """Stream one category's markets through a MarketWriter (runs in its own process)."""
+    config.CATEGORY_SHARDS = shards
+    writer = MarketWriter(db_path, batch_size=int(getattr(config, 'WRITE_BATCH_SIZE', 25))).start()
+    for record in _category_records(category, rows):
+        writer.put(record)
+    writer.stop()
+
+
+def run_shards(rows: int, workdir: str):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for shards in (False, True):
+        mode = 'shards' if shards else 'main'
+        for streams in (1, 2):
+            db_path = os.path.join(workdir, f"bench_shards_{rows}_{mode}_{streams}.db")
+            init_database(db_path)
+            workers = [
+                context.Process(target=_stream, args=(db_path, category, rows, shards))
+                for category in CATEGORIES[:streams]
+            ]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            results.append((f'{mode} x{streams}', time.perf_counter() - start))
+
+        # Publish the two-stream run; every streamed market is kept
+        config.CATEGORY_SHARDS = shards
+        symbols = [r['Symbol'] for c in CATEGORIES[:2] for r in _category_records(c, rows)]
+        start = time.perf_counter()
+        MarketWriter(db_path).publish(categories=CATEGORIES[:2], retain_symbols=symbols)
+        results.append((f'{mode} publish', time.perf_counter() - start))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark market table writes")
+    parser.add_argument('--rows', type=int, nargs='+', default=[2500, 100000])
+    parser.add_argument('--reads', action='store_true', help="Benchmark the top-performers query instead")
+    parser.add_argument('--search', action='store_true', help="Benchmark market search instead")
+    parser.add_argument('--delta', action='store_true', help="Benchmark republishing mostly unchanged markets instead")
+    parser.add_argument('--shards', action='store_true', help="Benchmark streaming with CATEGORY_SHARDS instead")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        bench = (
+            run_shards if args.shards else run_delta if args.delta else run_search if args.search
+            else run_reads if args.reads else run
+        )
+        report = [(rows, bench(rows, workdir)) for rows in args.rows]
+
+    if args.shards:
+        print(f"\n{'Rows':>8s}  {'Writers':14s} {'Seconds':>9s}")
+        for rows, results in report:
+            for label, seconds in results:
+                print(f"{rows:>8d}  {label:14s} {seconds:>9.3f}")
+        return
+
+    if args.delta:
+        print(f"\n{'Rows':>8s}  {'Path':14s} {'Seconds':>9s} {'WAL MiB':>9s}")
+        for rows, results in report:
+            for label, seconds, wal_bytes in results:
+                print(f"{rows:>8d}  {label:14s} {seconds:>9.3f} {wal_bytes / 2**20:>9.2f}")
+        return
+
+    if args.reads or args.search:
+        print(f"\n{'Rows':>8s}  {'Query':14s} {'ms/query':>9s}")
+        for rows, results in report:
+            for label, seconds in results:
+                print(f"{rows:>8d}  {label:14s} {seconds * 1000:>9.3f}")
+        return
+
+    print(f"\n{'Rows':>8s}  {'Path':14s} {'Seconds':>9s} {'Rows/sec':>10s}")
+    for rows, results in report:
+        for label, seconds in results:
+            print(f"{rows:>8d}  {label:14s} {seconds:>9.3f} {rows / seconds:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark the RSI compute stage under concurrent fetch threads
+
+Each simulated market waits on the network (time.sleep, which releases the
+GIL like a real socket read) and then turns its DAY/HOUR/HOUR_4 payloads
+into RSI values and a daily close history, either in the fetch thread
+(candle_indicators, INDICATOR_PROCESSES = 0) or by submitting them to an
+IndicatorPool and moving on, as run_analyzer's fetch threads do. Payloads
+have the sizes fetch_rsi_payloads requests (RSI_SERIES).
+
+Besides throughput it reports the CPU time each fetch thread spends per
+market (thread_time, i.e. time holding the GIL in the fetching process).
+That cost caps the fetching process at 1000 / cpu-ms markets per second
+however many cores the pool has; the rest of the work scales with them.
+
+The pool only pays off with spare cores: on a single core the processes
+compete with the fetch threads for the same CPU.
+
+    python bench_indicators.py --markets 400 --threads 16 --processes 0 2 4
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from capital_analyzer import RSI_SERIES, candle_indicators
+from indicator_pool import IndicatorPool
+
+_STEPS = {"DAY": timedelta(days=1), "HOUR": timedelta(hours=1), "HOUR_4": timedelta(hours=4)}
+
+
+def synthetic_payloads(now: datetime) -> dict:
+    """One market's RSI payloads, newest first as the API returns them."""
+    payloads = {}
+    for key, resolution, points in RSI_SERIES:
+        step = _STEPS[resolution]
+        payloads[key] = {"prices": [
+            {
+                "snapshotTimeUTC": (now - step * i).strftime("%Y-%m-%dT%H:%M:%S"),
+                "closePrice": {"bid": 100 + (i % 11) * 0.7 - (i % 5) * 0.9},
+            }
+            for i in range(points)
+        ]}
+    return payloads
+
+
+def run(markets: int, threads: int, processes: int, latency: float):
+    """(markets per second through `threads` fetch threads, fetch-thread CPU ms per market)."""
+    now = datetime.now(timezone.utc)
+    payloads = synthetic_payloads(now)
+    pool = IndicatorPool(processes) if processes else None
+    try:
+        if pool is not None:
+            # Start every worker outside the timing
+            for future in [pool.submit(payloads, now) for _ in range(pool.batch_size * processes)]:
+                future.result()
+
+        def market(_):
+            time.sleep(latency)
+            cpu = time.thread_time()
+            if pool is not None:
+                result = pool.submit(payloads, now)
+            else:
+                result = candle_indicators(payloads, now)
+            return result, time.thread_time() - cpu
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(market, range(markets)))
+        for result, _ in results:
+            if pool is not None:
+                result.result()
+        elapsed = time.perf_counter() - start
+        return markets / elapsed, 1000 * sum(cpu for _, cpu in results) / markets
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the RSI compute stage")
+    parser.add_argument('--markets', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--processes', type=int, nargs='+', default=[0, 2, 4],
+                        help="Indicator processes per run (0 = compute in the fetch threads)")
+    parser.add_argument('--latency', type=float, default=0.05, help="Simulated seconds of network wait per market")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.threads} fetch threads, {args.latency * 1000:.0f} ms latency")
+    print(f"\n{'Processes':>9s} {'Markets/sec':>12s} {'Fetch CPU ms':>13s}")
+    for processes in args.processes:
+        rate, cpu_ms = run(args.markets, args.threads, processes, args.latency)
+        print(f"{processes:>9d} {rate:>12,.1f} {cpu_ms:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ Fetches and categorizes market symbols with performance metrics
 
 import requests
 import time
+from concurrency import ApiGovernor, backoff_delay
+from array import array
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple
 import json
@@ -81,6 +83,95 @@ def _normalize_candles(
     return [(_utc(t), c) for t, c in candles]
 
 
+# (series key, API resolution, max points) fetched for the RSI horizons.
+RSI_SERIES = (
+    ("day", "DAY", 1000),
+    ("hour", "HOUR", 500),
+    ("h4", "HOUR_4", 500),
+)
+
+# Historical performance lookbacks: (metric, days back, price resolution).
+# None means "since Jan 1st". Each costs one /prices request per market.
+PERFORMANCE_HORIZONS = (
+    ("perf_1d", 1, "MINUTE"),
+    ("perf_1w", 7, "DAY"),
+    ("perf_1m", 30, "DAY"),
+    ("perf_3m", 90, "DAY"),
+    ("perf_6m", 180, "DAY"),
+    ("perf_ytd", None, "DAY"),
+    ("perf_1y", 365, "DAY"),
+    ("perf_5y", 1825, "DAY"),
+    ("perf_10y", 3650, "DAY"),
+)
+
+
+def rsi_metrics_from_candles(
+    daily: List[Tuple[datetime, float]],
+    hourly: List[Tuple[datetime, float]],
+    h4: List[Tuple[datetime, float]],
+    now: datetime,
+    period: int = 14,
+) -> Dict[str, Optional[float]]:
+    """
+    Wilder RSI(14) for every horizon from already-parsed UTC candles.
+    Pure CPU work, so it can run in a separate process.
+    """
+    rsi: Dict[str, Optional[float]] = {
+        "rsi_1h": None,
+        "rsi_4h": None,
+        "rsi_24h": None,
+        "rsi_1w": None,
+        "rsi_1m": None,
+        "rsi_3m": None,
+        "rsi_6m": None,
+        "rsi_ytd": None,
+    }
+
+    closes_1h = [c for _, c in hourly]
+    if len(closes_1h) >= period + 1:
+        rsi["rsi_1h"] = wilders_rsi(closes_1h, period)
+
+    closes_4h = [c for _, c in h4]
+    if len(closes_4h) >= period + 1:
+        rsi["rsi_4h"] = wilders_rsi(closes_4h, period)
+
+    rsi["rsi_24h"] = rsi_from_candles(hourly, now - timedelta(hours=24), period)
+    rsi["rsi_1w"] = rsi_from_candles(hourly, now - timedelta(days=7), period)
+    rsi["rsi_1m"] = rsi_from_candles(daily, now - timedelta(days=30), period)
+    rsi["rsi_3m"] = rsi_from_candles(daily, now - timedelta(days=90), period)
+    rsi["rsi_6m"] = rsi_from_candles(daily, now - timedelta(days=180), period)
+    ytd_start = datetime(now.year, 1, 1, tzinfo=timezone.utc)
+    rsi["rsi_ytd"] = rsi_from_candles(daily, ytd_start, period)
+    return rsi
+
+
+def daily_closes_from_candles(
+    daily: List[Tuple[datetime, float]], max_days: Optional[int] = None
+) -> Tuple[array, array]:
+    """
+    Last close per UTC day as compact (day ordinals, closes) arrays, oldest first.
+    Used to keep a local candle history without holding datetime tuples.
+    """
+    by_day: Dict[int, float] = {}
+    for t, c in daily:
+        by_day[t.date().toordinal()] = c
+    days = sorted(by_day)
+    if max_days is not None:
+        days = days[-max_days:]
+    return array("l", days), array("d", (by_day[d] for d in days))
+
+
+def candle_indicators(
+    payloads: Dict[str, Optional[Dict]], now: datetime, period: int = 14
+) -> Tuple[Dict[str, Optional[float]], Tuple[array, array]]:
+    """Parse raw RSI payloads and return (RSI metrics, daily close history)."""
+    daily = _normalize_candles(_parse_price_candles(payloads.get("day")))
+    hourly = _normalize_candles(_parse_price_candles(payloads.get("hour")))
+    h4 = _normalize_candles(_parse_price_candles(payloads.get("h4")))
+    rsi = rsi_metrics_from_candles(daily, hourly, h4, now, period)
+    return rsi, daily_closes_from_candles(daily)
+
+
 class CapitalAPI:
     """Capital.com API client"""
     
@@ -93,7 +184,8 @@ class CapitalAPI:
         'etf': 'hierarchy_v1.etf_group',
     }
     
-    def __init__(self, api_key: str, identifier: str, password: str, demo: bool = True):
+    def __init__(self, api_key: str, identifier: str, password: str, demo: bool = True,
+                 base_url: Optional[str] = None, governor: Optional[ApiGovernor] = None):
         """
         Initialize Capital.com API client
         
@@ -102,14 +194,18 @@ class CapitalAPI:
             identifier: Your username/email
             password: Your password
             demo: Use demo environment (True) or live (False)
+            base_url: Override the API root (e.g. a local mock API for testing)
+            governor: Shared concurrency limiter and per-endpoint circuit breakers
         """
         self.api_key = api_key
         self.identifier = identifier
         self.password = password
-        self.base_url = (
+        self.base_url = base_url or (
             "https://demo-api-capital.backend-capital.com/api/v1" if demo 
             else "https://api-capital.backend-capital.com/api/v1"
         )
+        self.governor = governor
+        self.last_navigation_nodes = 0
         self.cst = None
         self.security_token = None
         self.session_expiry = None
@@ -136,7 +232,8 @@ class CapitalAPI:
         
         for attempt in range(1, max_retries + 1):
             try:
-                response = self.session.post(url, headers=headers, json=payload, timeout=10)
+                post = lambda: self.session.post(url, headers=headers, json=payload, timeout=10)
+                response = post() if self.governor is None else self.governor.login(post)
                 
                 if response.status_code == 200:
                     self.cst = response.headers.get('CST')
@@ -144,11 +241,12 @@ class CapitalAPI:
                     self.session_expiry = datetime.now() + timedelta(minutes=10)
                     print("[OK] Session created successfully")
                     return True
-                elif response.status_code >= 500:
-                    # Server error - retry
+                elif response.status_code >= 500 or response.status_code == 429:
+                    # Server error or rate limited - retry
                     if attempt < max_retries:
-                        print(f"[WARNING] Server error {response.status_code} (attempt {attempt}/{max_retries}). Retrying in {retry_delay}s...")
-                        time.sleep(retry_delay)
+                        delay = self._retry_delay(attempt, response) if response.status_code == 429 else retry_delay
+                        print(f"[WARNING] Server error {response.status_code} (attempt {attempt}/{max_retries}). Retrying in {delay:.1f}s...")
+                        time.sleep(delay)
                         continue
                     else:
                         print(f"[ERROR] Session creation failed after {max_retries} attempts: {response.status_code}")
@@ -193,7 +291,7 @@ class CapitalAPI:
         headers = self._get_auth_headers()
         
         try:
-            response = self.session.get(url, headers=headers)
+            response = self._send('ping', 'GET', url, headers=headers)
             if response.status_code == 200:
                 self.session_expiry = datetime.now() + timedelta(minutes=10)
                 return True
@@ -201,6 +299,23 @@ class CapitalAPI:
         except:
             return False
     
+    def _send(self, endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, through the governor when one is configured"""
+        if self.governor is None:
+            return self.session.request(method, url, **kwargs)
+        return self.governor.request(endpoint, lambda: self.session.request(method, url, **kwargs))
+
+    @staticmethod
+    def _retry_delay(attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Backoff before the next attempt, honouring Retry-After on 429"""
+        retry_after = None
+        if response is not None and response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                retry_after = None
+        return backoff_delay(attempt, retry_after)
+
     def _get_auth_headers(self) -> Dict[str, str]:
         """Get authentication headers for requests"""
         return {
@@ -235,7 +350,6 @@ class CapitalAPI:
         visited_nodes = set()
         
         max_retries = 3
-        retry_delay = 2
         
         try:
             while nodes_to_visit:
@@ -254,7 +368,9 @@ class CapitalAPI:
                         if limit is not None:
                             params["limit"] = limit
 
-                        response = self.session.get(url, headers=headers, params=params, timeout=10)
+                        response = self._send(
+                            'marketnavigation', 'GET', url, headers=headers, params=params, timeout=10
+                        )
                         
                         if response.status_code == 200:
                             data = response.json()
@@ -272,11 +388,11 @@ class CapitalAPI:
                                     nodes_to_visit.append(sub_id)
                             break  # Success, move to next node
                         
-                        elif response.status_code >= 500:
-                            # Server error - retry
+                        elif response.status_code >= 500 or response.status_code == 429:
+                            # Server error or throttled - back off and retry
                             if attempt < max_retries:
                                 print(f"[WARNING] Server error {response.status_code} fetching {current_node} (attempt {attempt}/{max_retries}). Retrying...")
-                                time.sleep(retry_delay)
+                                time.sleep(self._retry_delay(attempt, response))
                                 continue
                             else:
                                 print(f"[WARNING] Skipping {current_node} after {max_retries} failed attempts")
@@ -288,7 +404,7 @@ class CapitalAPI:
                     except requests.exceptions.Timeout:
                         if attempt < max_retries:
                             print(f"[WARNING] Timeout fetching {current_node} (attempt {attempt}/{max_retries}). Retrying...")
-                            time.sleep(retry_delay)
+                            time.sleep(self._retry_delay(attempt))
                             continue
                         else:
                             print(f"[WARNING] Skipping {current_node} after timeout")
@@ -309,6 +425,7 @@ class CapitalAPI:
                     seen_epics.add(epic)
                     unique_markets.append(market)
             
+            self.last_navigation_nodes = len(visited_nodes)
             print(f"[OK] Found {len(unique_markets)} unique markets in {category}")
             return unique_markets
             
@@ -325,18 +442,17 @@ class CapitalAPI:
         headers = self._get_auth_headers()
         
         max_retries = 3
-        retry_delay = 2
         
         for attempt in range(1, max_retries + 1):
             try:
-                response = self.session.get(url, headers=headers, timeout=10)
+                response = self._send('markets', 'GET', url, headers=headers, timeout=10)
                 
                 if response.status_code == 200:
                     return response.json()
                 
-                elif response.status_code >= 500:
+                elif response.status_code >= 500 or response.status_code == 429:
                     if attempt < max_retries:
-                        time.sleep(retry_delay)
+                        time.sleep(self._retry_delay(attempt, response))
                         continue
                     else:
                         print(f"[WARNING] Could not fetch details for {epic} after {max_retries} attempts")
@@ -346,7 +462,7 @@ class CapitalAPI:
             
             except requests.exceptions.Timeout:
                 if attempt < max_retries:
-                    time.sleep(retry_delay)
+                    time.sleep(self._retry_delay(attempt))
                     continue
                 else:
                     return None
@@ -389,7 +505,7 @@ class CapitalAPI:
             params["to"] = to_date
         
         try:
-            response = self.session.get(url, headers=headers, params=params)
+            response = self._send('prices', 'GET', url, headers=headers, params=params)
             if response.status_code == 200:
                 return response.json()
             return None
@@ -465,90 +581,28 @@ class CapitalAPI:
             current_price = details['snapshot'].get('bid')
         
         if current_price:
-            # 1 Day (1 day)
-            old_price = get_price_at_datetime(days_ago=1)
-            if old_price and old_price > 0:
-                performance['perf_1d'] = ((current_price - old_price) / old_price) * 100
-            
-            # 1 Week (7 days)
-            old_price = get_price_at_datetime(days_ago=7, resolution="DAY")
-            if old_price and old_price > 0:
-                performance['perf_1w'] = ((current_price - old_price) / old_price) * 100
-            
-            # 1 Month (30 days)
-            old_price = get_price_at_datetime(days_ago=30, resolution="DAY")
-            if old_price and old_price > 0:
-                performance['perf_1m'] = ((current_price - old_price) / old_price) * 100
-            
-            # 3 Months (90 days)
-            old_price = get_price_at_datetime(days_ago=90, resolution="DAY")
-            if old_price and old_price > 0:
-                performance['perf_3m'] = ((current_price - old_price) / old_price) * 100
-            
-            # 6 Months (180 days)
-            old_price = get_price_at_datetime(days_ago=180, resolution="DAY")
-            if old_price and old_price > 0:
-                performance['perf_6m'] = ((current_price - old_price) / old_price) * 100
-            
-            # YTD (from Jan 1st of current year)
-            ytd_days = (now - datetime(now.year, 1, 1)).days
-            old_price = get_price_at_datetime(days_ago=ytd_days, resolution="DAY")
-            if old_price and old_price > 0:
-                performance['perf_ytd'] = ((current_price - old_price) / old_price) * 100
-            
-            # 1 Year (365 days)
-            old_price = get_price_at_datetime(days_ago=365, resolution="DAY")
-            if old_price and old_price > 0:
-                performance['perf_1y'] = ((current_price - old_price) / old_price) * 100
-            
-            # 5 Years (1825 days)
-            old_price = get_price_at_datetime(days_ago=1825, resolution="DAY")
-            if old_price and old_price > 0:
-                performance['perf_5y'] = ((current_price - old_price) / old_price) * 100
-            
-            # 10 Years (3650 days)
-            old_price = get_price_at_datetime(days_ago=3650, resolution="DAY")
-            if old_price and old_price > 0:
-                performance['perf_10y'] = ((current_price - old_price) / old_price) * 100
+            for metric, days_ago, resolution in PERFORMANCE_HORIZONS:
+                if days_ago is None:
+                    # YTD (from Jan 1st of current year)
+                    days_ago = (now - datetime(now.year, 1, 1)).days
+                old_price = get_price_at_datetime(days_ago=days_ago, resolution=resolution)
+                if old_price and old_price > 0:
+                    performance[metric] = ((current_price - old_price) / old_price) * 100
         
         return performance
 
+    def fetch_rsi_payloads(self, epic: str) -> Dict[str, Optional[Dict]]:
+        """Fetch the raw price payloads needed for the RSI horizons (I/O only)."""
+        return {
+            key: self.get_historical_prices(epic, resolution=resolution, max_points=max_points)
+            for key, resolution, max_points in RSI_SERIES
+        }
+
     def calculate_rsi_metrics(self, epic: str, period: int = 14) -> Dict[str, Optional[float]]:
         """
         Wilder RSI(14): 1H / 4H on full intraday series; 24h and 1W on hourly windows;
         longer horizons on daily closes.
         """
-        now = datetime.now(timezone.utc)
-        rsi: Dict[str, Optional[float]] = {
-            "rsi_1h": None,
-            "rsi_4h": None,
-            "rsi_24h": None,
-            "rsi_1w": None,
-            "rsi_1m": None,
-            "rsi_3m": None,
-            "rsi_6m": None,
-            "rsi_ytd": None,
-        }
-        day_payload = self.get_historical_prices(epic, resolution="DAY", max_points=1000)
-        hour_payload = self.get_historical_prices(epic, resolution="HOUR", max_points=500)
-        h4_payload = self.get_historical_prices(epic, resolution="HOUR_4", max_points=500)
-        daily = _normalize_candles(_parse_price_candles(day_payload))
-        hourly = _normalize_candles(_parse_price_candles(hour_payload))
-        h4 = _normalize_candles(_parse_price_candles(h4_payload))
-
-        closes_1h = [c for _, c in hourly]
-        if len(closes_1h) >= period + 1:
-            rsi["rsi_1h"] = wilders_rsi(closes_1h, period)
-
-        closes_4h = [c for _, c in h4]
-        if len(closes_4h) >= period + 1:
-            rsi["rsi_4h"] = wilders_rsi(closes_4h, period)
-
-        rsi["rsi_24h"] = rsi_from_candles(hourly, now - timedelta(hours=24), period)
-        rsi["rsi_1w"] = rsi_from_candles(hourly, now - timedelta(days=7), period)
-        rsi["rsi_1m"] = rsi_from_candles(daily, now - timedelta(days=30), period)
-        rsi["rsi_3m"] = rsi_from_candles(daily, now - timedelta(days=90), period)
-        rsi["rsi_6m"] = rsi_from_candles(daily, now - timedelta(days=180), period)
-        ytd_start = datetime(now.year, 1, 1, tzinfo=timezone.utc)
-        rsi["rsi_ytd"] = rsi_from_candles(daily, ytd_start, period)
+        payloads = self.fetch_rsi_payloads(epic)
+        rsi, _ = candle_indicators(payloads, datetime.now(timezone.utc), period)
         return rsi
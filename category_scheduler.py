@@ -0,0 +1,72 @@
+"""
+Per-category refresh scheduling for the analyzer daemon
+
+Each category refreshes on its own cadence. First runs are staggered across
+the shortest cadence and later runs keep their phase, so jobs stay spread
+out instead of all firing at once.
+"""
+
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Seconds between refreshes, per category
+DEFAULT_REFRESH_SECONDS = {
+    'forex': 5 * 60,
+    'cryptocurrencies': 5 * 60,
+    'commodities': 60 * 60,
+    'indices': 60 * 60,
+    'shares': 6 * 60 * 60,
+    'etf': 6 * 60 * 60,
+}
+FALLBACK_REFRESH_SECONDS = 60 * 60
+
+
+class CategoryScheduler:
+    """Min-heap of (due time, category) with fixed per-category cadences."""
+
+    def __init__(
+        self,
+        categories: List[str],
+        cadences: Optional[Dict[str, float]] = None,
+        now: Optional[float] = None,
+    ):
+        now = time.time() if now is None else now
+        merged = {**DEFAULT_REFRESH_SECONDS, **(cadences or {})}
+        self.cadences = {
+            c.lower(): float(merged.get(c.lower(), FALLBACK_REFRESH_SECONDS)) for c in categories
+        }
+
+        # Fastest categories go first; offsets split the shortest cadence evenly
+        ordered = sorted(self.cadences, key=lambda c: (self.cadences[c], c))
+        spacing = min(self.cadences.values()) / len(ordered) if ordered else 0.0
+        self._heap: List[Tuple[float, str]] = [
+            (now + i * spacing, category) for i, category in enumerate(ordered)
+        ]
+        heapq.heapify(self._heap)
+
+    def peek(self) -> Tuple[float, str]:
+        """(due time, category) of the next job."""
+        return self._heap[0]
+
+    def pop_due(self, now: Optional[float] = None) -> Optional[Tuple[float, str]]:
+        """Remove and return the next job if it is due, else None."""
+        now = time.time() if now is None else now
+        if self._heap and self._heap[0][0] <= now:
+            return heapq.heappop(self._heap)
+        return None
+
+    def reschedule(self, category: str, due: float, now: Optional[float] = None) -> float:
+        """
+        Queue a category's next run one cadence after its previous due time.
+        If a run overran whole cadences, skip the missed slots rather than
+        firing them back to back.
+        """
+        now = time.time() if now is None else now
+        cadence = self.cadences[category]
+        next_due = due + cadence
+        if next_due <= now:
+            missed = int((now - next_due) // cadence) + 1
+            next_due += missed * cadence
+        heapq.heappush(self._heap, (next_due, category))
+        return next_due
@@ -0,0 +1,114 @@
+"""
+Per-category shard files for the analyzer's streaming writes
+
+With CATEGORY_SHARDS enabled, the MarketWriter keeps each category's markets
+in its own SQLite file next to the database (market_data.forex.db, ...), so
+refreshes of different categories stream into separate files under separate
+write locks.
+
+Only the streaming is sharded; per-category storage is partial. The main
+market_data.db keeps the unified markets table that the dashboard, search,
+rankings and row versions work from, so it still holds every market and is
+not read through the shards. Publishes, the full-refresh staging swap and
+any VACUUM still run against that one file, so categories still serialize
+there at publish time.
+
+While a run streams, nothing is written to the main file. Each shard also
+collects the candle history, refresh state, snapshots and journal marks of
+its markets, in the same transaction as their rows. Publishing a category
+ATTACHes its shard and, in one short transaction on the main file, moves
+those over and merges the markets in, upserting only the rows whose content
+hash changed. The shard keeps its published markets, which the next run's
+upserts compare against.
+"""
+
+import glob
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from correlation import ensure_candle_history_table
+from db_connections import enable_wal
+from refresh_policy import ensure_refresh_state_table
+from run_journal import ensure_done_epics_table
+from schema import MARKETS_COLUMNS, create_markets_table
+from snapshots import ensure_snapshot_tables
+
+
+def shard_key(category: str) -> str:
+    """File-name-safe lower-case key of a category ("Forex" -> "forex")."""
+    return ''.join(ch if ch.isalnum() else '_' for ch in str(category).lower()).strip('_') or 'unknown'
+
+
+def shard_path(db_path: str, category: str) -> str:
+    """The shard file of a category: market_data.db -> market_data.<key>.db."""
+    stem, ext = os.path.splitext(db_path)
+    return f'{stem}.{shard_key(category)}{ext or ".db"}'
+
+
+def existing_shard_keys(db_path: str) -> List[str]:
+    """Keys of the shard files present for a database."""
+    stem, ext = os.path.splitext(db_path)
+    ext = ext or '.db'
+    prefix, suffix = f'{stem}.', ext
+    return sorted(
+        path[len(prefix):-len(suffix)]
+        for path in glob.glob(glob.escape(prefix) + '*' + suffix)
+        if '.' not in path[len(prefix):-len(suffix)]
+    )
+
+
+def open_shard(db_path: str, category: str) -> sqlite3.Connection:
+    """A write connection to a category's shard file, creating it on first use."""
+    conn = sqlite3.connect(shard_path(db_path, category), timeout=30)
+    enable_wal(conn)
+    # Only symbol lookups hit a shard, so it needs none of the metric indexes
+    create_markets_table(conn)
+    # Shard files are not migrated; add markets columns newer than the file
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(markets)')}
+    for name, decl in MARKETS_COLUMNS:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE markets ADD COLUMN {name} {decl}')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # What publish moves into the main file along with the markets
+    ensure_candle_history_table(conn)
+    ensure_refresh_state_table(conn)
+    ensure_snapshot_tables(conn)
+    ensure_done_epics_table(conn)
+    conn.commit()
+    return conn
+
+
+def shard_schema(key: str) -> str:
+    """The schema name a shard is attached under."""
+    return f'shard_{key}'
+
+
+@contextmanager
+def attached_shards(conn, db_path: str, keys: List[str]) -> Iterator[Dict[str, str]]:
+    """
+    ATTACH the existing shards among `keys` to a main-database connection for
+    the duration of the block, yielding {key: schema name}. SQLite refuses to
+    attach inside a transaction, so enter this before the write transaction
+    and leave it after the commit.
+    """
+    attached = {}
+    try:
+        for key in keys:
+            path = shard_path(db_path, key)
+            if key not in attached and os.path.exists(path):
+                # Brings shards from before the collected tables up to date
+                open_shard(db_path, key).close()
+                conn.execute(f'ATTACH DATABASE ? AS {shard_schema(key)}', (path,))
+                attached[key] = shard_schema(key)
+        yield attached
+    finally:
+        for schema in attached.values():
+            conn.execute(f'DETACH DATABASE {schema}')
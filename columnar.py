@@ -0,0 +1,245 @@
+"""
+Parquet exports and ad-hoc SQL over them
+
+The CSV exports carry display strings ("12.34%", "N/A") that every reader
+has to parse again. The Parquet exports hold the same markets with typed
+float metrics (null where unavailable) and dictionary-encoded category,
+currency, status and type columns, under the database column names.
+
+run_query() runs SQL in an embedded DuckDB over those files:
+
+    markets    every per-category Parquet export (category_exports/*.parquet)
+    snapshots  the market_snapshots history from market_data.db, with the
+               symbol and a UTC `taken_at` timestamp, narrowed in SQLite by
+               the caller's symbols and time range (query --symbol/--since)
+
+pyarrow (exports) and duckdb (queries) are optional dependencies.
+"""
+
+import glob
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+from snapshots import DAY_SECONDS, SNAPSHOT_METRICS
+
+# (column, record field) for every exported column, in file order
+PARQUET_FIELDS = (
+    ('category', 'Category'),
+    ('symbol', 'Symbol'),
+    ('name', 'Name'),
+    ('current_price', 'Current Price'),
+    ('currency', 'Currency'),
+    ('price_change_pct', 'Price Change %'),
+    ('perf_1d_pct', 'Perf % 1D'),
+    ('perf_1w_pct', 'Perf % 1W'),
+    ('perf_1m_pct', 'Perf % 1M'),
+    ('perf_3m_pct', 'Perf % 3M'),
+    ('perf_6m_pct', 'Perf % 6M'),
+    ('perf_ytd_pct', 'Perf % YTD'),
+    ('perf_1y_pct', 'Perf % 1Y'),
+    ('perf_5y_pct', 'Perf % 5Y'),
+    ('perf_10y_pct', 'Perf % 10Y'),
+    ('rsi_1h', 'RSI 1H'),
+    ('rsi_4h', 'RSI 4H'),
+    ('rsi_24h', 'RSI 24H'),
+    ('rsi_1w', 'RSI 1W'),
+    ('rsi_1m', 'RSI 1M'),
+    ('rsi_3m', 'RSI 3M'),
+    ('rsi_6m', 'RSI 6M'),
+    ('rsi_ytd', 'RSI YTD'),
+    ('market_status', 'Market Status'),
+    ('type', 'Type'),
+)
+
+# Low-cardinality text columns stored as dictionary indexes
+DICTIONARY_COLUMNS = ('category', 'currency', 'market_status', 'type')
+TEXT_COLUMNS = DICTIONARY_COLUMNS + ('symbol', 'name')
+
+_SNAPSHOTS_REFERENCE = re.compile(r'\bsnapshots\b', re.IGNORECASE)
+
+# Snapshot rows converted to Arrow per fetchmany()
+SNAPSHOT_BATCH_ROWS = 65536
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+def parquet_path(csv_path: str) -> str:
+    """The Parquet file written next to a CSV export."""
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def _float(value):
+    # Records from the database carry floats; CSV-era callers may pass "1.23%"
+    if value is None or isinstance(value, float):
+        return value
+    try:
+        return float(str(value).replace('%', '').strip())
+    except ValueError:
+        return None
+
+
+def _parquet_schema():
+    fields = []
+    for column, _ in PARQUET_FIELDS:
+        if column in DICTIONARY_COLUMNS:
+            fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+        elif column in TEXT_COLUMNS:
+            fields.append(pa.field(column, pa.string()))
+        else:
+            fields.append(pa.field(column, pa.float64()))
+    return pa.schema(fields)
+
+
+def export_to_parquet(data: list, filename: str) -> bool:
+    """Write analyzer records to one Parquet file (zstd). Returns False if nothing was written."""
+    if not data:
+        print("[ERROR] No data to export")
+        return False
+    if pa is None:
+        print("[WARNING] pyarrow is not installed; skipping Parquet export (pip install pyarrow)")
+        return False
+
+    schema = _parquet_schema()
+    arrays = []
+    for (column, field), schema_field in zip(PARQUET_FIELDS, schema):
+        if column in TEXT_COLUMNS:
+            values = pa.array([row.get(field) or None for row in data], type=pa.string())
+            if column in DICTIONARY_COLUMNS:
+                values = values.dictionary_encode()
+        else:
+            values = pa.array([_float(row.get(field)) for row in data], type=pa.float64())
+        arrays.append(values.cast(schema_field.type))
+
+    try:
+        # Write to a temp file and rename so readers never see a partial file
+        tmp_path = filename + '.tmp'
+        pq.write_table(pa.Table.from_arrays(arrays, schema=schema), tmp_path, compression='zstd')
+        os.replace(tmp_path, filename)
+    except Exception as e:
+        print(f"[ERROR] Error exporting to Parquet: {str(e)}")
+        return False
+    print(f"[OK] Data exported to: {filename}")
+    return True
+
+
+def parse_since(value: str) -> float:
+    """Epoch seconds for '36h', '7d' (that long ago) or an ISO date/time (UTC unless it says otherwise)."""
+    relative = re.fullmatch(r'(\d+)([hd])', value.strip())
+    if relative:
+        hours = int(relative.group(1)) * (24 if relative.group(2) == 'd' else 1)
+        return time.time() - hours * 3600
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def snapshot_table(
+    db_path: str,
+    symbols: Optional[List[str]] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+):
+    """
+    The snapshot history as an Arrow table (symbol, taken_at, run_id,
+    metrics), limited in SQLite to the given symbols and [since, until)
+    epoch seconds so only those rows leave the database. Rows are converted
+    SNAPSHOT_BATCH_ROWS at a time rather than fetched as one Python list.
+    """
+    columns = ', '.join(f's.{column}' for column in SNAPSHOT_METRICS)
+    conditions, params = [], []
+    if symbols:
+        conditions.append(f"sym.symbol IN ({', '.join('?' for _ in symbols)})")
+        params.extend(symbols)
+    if since is not None:
+        # day leads the primary key, so the range walks only those days
+        conditions += ['s.day >= ?', 's.ts >= ?']
+        params += [int(since) // DAY_SECONDS, since]
+    if until is not None:
+        conditions += ['s.day <= ?', 's.ts < ?']
+        params += [int(until) // DAY_SECONDS, until]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    names = ('symbol', 'taken_at', 'run_id') + SNAPSHOT_METRICS
+    types = [pa.string(), pa.timestamp('s', tz='UTC'), pa.int64()] + [pa.float64()] * len(SNAPSHOT_METRICS)
+    schema = pa.schema(list(zip(names, types)))
+    batches = []
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(f'''
+            SELECT sym.symbol, s.ts, s.run_id, {columns}
+            FROM market_snapshots AS s
+            JOIN snapshot_symbols AS sym ON sym.symbol_id = s.symbol_id
+            {where}
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(SNAPSHOT_BATCH_ROWS)
+            if not rows:
+                break
+            batches.append(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=kind) for values, kind in zip(zip(*rows), types)], schema=schema,
+            ))
+    except sqlite3.OperationalError:
+        batches = []
+    finally:
+        conn.close()
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def _parquet_files(export_dir: str, output_file: Optional[str]) -> List[str]:
+    files = sorted(glob.glob(os.path.join(export_dir, '*.parquet')))
+    if not files and output_file and os.path.exists(output_file):
+        files = [output_file]
+    return files
+
+
+def run_query(
+    sql: str,
+    db_path: str = 'market_data.db',
+    export_dir: str = 'category_exports',
+    output_file: Optional[str] = None,
+    symbols: Optional[List[str]] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+):
+    """
+    Run SQL against the `markets` and `snapshots` views and return the result
+    as a pandas DataFrame. The snapshot history is only loaded when the query
+    mentions it, and then only for `symbols` and [since, until) if given
+    (see snapshot_table). Raises RuntimeError if duckdb or pyarrow is not
+    installed.
+    """
+    if duckdb is None or pa is None:
+        raise RuntimeError("The query command needs duckdb and pyarrow (pip install duckdb pyarrow)")
+
+    conn = duckdb.connect()
+    try:
+        files = _parquet_files(export_dir, output_file)
+        if files:
+            listed = ', '.join("'" + path.replace("'", "''") + "'" for path in files)
+            conn.execute(f'CREATE VIEW markets AS SELECT * FROM read_parquet([{listed}], union_by_name = true)')
+        else:
+            print(f"[WARNING] No Parquet exports in {export_dir}; the markets view is empty")
+            conn.register('markets', _parquet_schema().empty_table())
+        if _SNAPSHOTS_REFERENCE.search(sql):
+            conn.register('snapshots', snapshot_table(db_path, symbols, since, until))
+        return conn.execute(sql).df()
+    finally:
+        conn.close()
@@ -0,0 +1,248 @@
+"""
+Adaptive concurrency and circuit breaking for Capital.com API calls
+
+AdaptiveLimiter caps the number of in-flight requests and tunes that cap
+with AIMD: it grows by one per healthy window in which the cap was actually
+reached (p95 latency near its baseline, few errors) and shrinks
+multiplicatively on 5xx, 429 or timeouts. A CircuitBreaker per endpoint
+fails fast after repeated failures and lets a single probe through once its
+reset timeout has passed. ApiGovernor ties both together and is shared by
+every API client (thread) in a process. Logins (POST /session) go through
+it too, under their own smaller cap, since every worker thread opens its
+own session and a burst of them is the first thing to get rate-limited.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to an endpoint whose circuit is open."""
+
+    def __init__(self, endpoint: str):
+        super().__init__(f"circuit open for {endpoint}")
+        self.endpoint = endpoint
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None,
+                  base: float = 0.5, cap: float = 8.0) -> float:
+    """Seconds to wait before retry `attempt` (1-based): full-jitter exponential,
+    or the server's Retry-After when it sent one."""
+    if retry_after is not None:
+        return min(cap, max(0.0, retry_after))
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def _p95(samples: List[float]) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open single probe."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                self._probing = False
+
+
+class AdaptiveLimiter:
+    """AIMD limit on concurrent requests, driven by p95 latency and overload signals."""
+
+    def __init__(
+        self,
+        initial: int = 5,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        window: int = 50,
+        latency_tolerance: float = 2.0,
+        error_threshold: float = 0.05,
+        decrease_factor: float = 0.7,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.clock = clock
+        self.baseline_p95: Optional[float] = None
+        self.last_p95: Optional[float] = None
+        self.in_flight = 0
+        self._latencies: List[float] = []
+        self._errors = 0
+        self._saturated = False
+        self._last_decrease = float('-inf')
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Block until an in-flight slot is free under the current limit."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._saturated = True
+                self._cond.wait()
+            self.in_flight += 1
+            if self.in_flight >= int(self.limit):
+                self._saturated = True
+
+    def release(self, latency: float, overloaded: bool = False):
+        """Free a slot and feed back the request's latency and outcome."""
+        with self._cond:
+            self.in_flight -= 1
+            self._latencies.append(latency)
+            if overloaded:
+                self._errors += 1
+                self._decrease()
+            if len(self._latencies) >= self.window:
+                self._adjust()
+            self._cond.notify_all()
+
+    def _reset_window(self):
+        self._latencies = []
+        self._errors = 0
+        self._saturated = False
+
+    def _decrease(self):
+        now = self.clock()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self._last_decrease = now
+        self._reset_window()
+
+    def _adjust(self):
+        p95 = _p95(self._latencies)
+        error_rate = self._errors / len(self._latencies)
+        self.last_p95 = p95
+        # The baseline tracks the best p95 seen but drifts up slowly, so a
+        # permanently slower API does not pin the limit at the minimum.
+        self.baseline_p95 = p95 if self.baseline_p95 is None else min(p95, self.baseline_p95 * 1.05)
+
+        if error_rate > self.error_threshold or p95 > self.baseline_p95 * self.latency_tolerance:
+            self.limit = max(float(self.min_limit), self.limit - 1)
+        elif self._saturated:
+            self.limit = min(float(self.max_limit), self.limit + 1)
+        self._reset_window()
+
+
+class ApiGovernor:
+    """Shared limiter plus one circuit breaker per API endpoint."""
+
+    def __init__(self, limiter: AdaptiveLimiter, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_logins: int = 2):
+        self.limiter = limiter
+        self._logins = threading.BoundedSemaphore(max(1, max_logins))
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[endpoint]
+
+    def request(self, endpoint: str, send: Callable):
+        """
+        Send one request through the endpoint's breaker and the shared limiter.
+
+        `send` returns a response with a status_code. 5xx, 429 and exceptions
+        (timeouts, connection errors) count as overload; anything else as
+        success. Raises CircuitOpenError without sending when the circuit is open.
+        """
+        breaker = self.breaker(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(endpoint)
+
+        self.limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = send()
+        except Exception:
+            self.limiter.release(time.monotonic() - start, overloaded=True)
+            breaker.record_failure()
+            raise
+
+        latency = time.monotonic() - start
+        overloaded = response.status_code >= 500 or response.status_code == 429
+        self.limiter.release(latency, overloaded=overloaded)
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=1000)).append(latency)
+        if overloaded:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    def login(self, send: Callable):
+        """A session request: at most `max_logins` at once, then as request('session', send)."""
+        with self._logins:
+            return self.request('session', send)
+
+    def latency_stats(self) -> Dict[str, dict]:
+        """{endpoint: {'samples', 'mean', 'p95'}} over recent responses (seconds)."""
+        with self._lock:
+            recent = {endpoint: list(samples) for endpoint, samples in self._latencies.items() if samples}
+        return {
+            endpoint: {'samples': len(samples), 'mean': sum(samples) / len(samples), 'p95': _p95(samples)}
+            for endpoint, samples in recent.items()
+        }
+
+    def summary(self) -> str:
+        """One-line state for progress logs."""
+        limiter = self.limiter
+        p95 = f"{limiter.last_p95 * 1000:.0f}ms" if limiter.last_p95 is not None else "n/a"
+        with self._lock:
+            open_endpoints = sorted(e for e, b in self._breakers.items() if b.state != CircuitBreaker.CLOSED)
+        line = f"concurrency limit {int(limiter.limit)}, p95 {p95}"
+        if open_endpoints:
+            line += f", open circuits: {', '.join(open_endpoints)}"
+        return line
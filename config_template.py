@@ -15,9 +15,18 @@ PASSWORD = "-Cullbanga#1"
 # Set to False for live trading environment
 USE_DEMO = True
 
+# Override the API endpoint (e.g. a local mock API: "http://127.0.0.1:8800/api/v1").
+# None uses the demo or live endpoint selected above.
+API_BASE_URL = None
+
 # Export Settings
 OUTPUT_FILENAME = "capital_markets_analysis.csv"
 
+# Export file formats: 'csv' (display strings) and/or 'parquet' (typed columns,
+# written next to each CSV with a .parquet suffix; needs pyarrow). The
+# `run_analyzer.py query "SQL"` command reads the Parquet exports (needs duckdb).
+EXPORT_FORMATS = ['csv']
+
 # Categories to fetch (comment out any you don't want)
 CATEGORIES = [
     'commodities',
@@ -32,3 +41,59 @@ REQUEST_DELAY = 0.15
 
 # Maximum markets to fetch per category (set to None for all available markets)
 MAX_MARKETS_PER_CATEGORY = 50
+
+# Processes for the RSI compute stage (None = one per CPU core, in the fetch threads on a
+# single core; 0 = always compute in the fetch threads)
+INDICATOR_PROCESSES = None
+
+# Incremental runs (run_analyzer.py --incremental): seconds a market's data stays fresh, per category
+FRESHNESS_SECONDS = {
+    'forex': 300,
+    'cryptocurrencies': 300,
+    'commodities': 900,
+    'indices': 900,
+    'shares': 3600,
+}
+
+# Completed markets are written to the database in transactions of this many rows
+WRITE_BATCH_SIZE = 25
+
+# Daemon mode (run_analyzer.py --daemon): seconds between refreshes, per category
+CATEGORY_REFRESH_SECONDS = {
+    'forex': 5 * 60,
+    'cryptocurrencies': 5 * 60,
+    'commodities': 60 * 60,
+    'indices': 60 * 60,
+    'shares': 6 * 60 * 60,
+}
+
+# Adaptive concurrency: MAX_THREADS is the starting point and the number of
+# requests in flight is tuned between 1 and MAX_CONCURRENCY from observed
+# latency and errors. Endpoints that keep failing are short-circuited and
+# probed for recovery. Set ADAPTIVE_CONCURRENCY = False for a fixed MAX_THREADS.
+ADAPTIVE_CONCURRENCY = True
+MAX_CONCURRENCY = 16
+# Worker threads log in (POST /session) at most this many at a time
+MAX_CONCURRENT_LOGINS = 2
+
+# Snapshot history: every write also appends the market's metrics to
+# market_snapshots. Snapshots are kept as written for SNAPSHOT_RAW_DAYS, then
+# downsampled to the last one per hour until SNAPSHOT_HOURLY_DAYS, to the last
+# one per day until SNAPSHOT_RETENTION_DAYS, and deleted after that.
+SNAPSHOT_HISTORY = True
+SNAPSHOT_RAW_DAYS = 2
+SNAPSHOT_HOURLY_DAYS = 30
+SNAPSHOT_RETENTION_DAYS = 365
+
+# A full publish is swapped in from a staging table only if it has at least
+# this share of the rows the replaced categories held before (0 disables)
+PUBLISH_MIN_ROW_RATIO = 0.5
+
+# Stream each category's markets, with their candle history, snapshots and
+# run progress, into its own SQLite file next to the database
+# (market_data.forex.db, ...) during a run, so refreshes of different
+# categories write under separate locks and not to market_data.db at all.
+# Only streaming is sharded: publishing merges them into market_data.db, which
+# still holds every market, so publishes still serialize on that one file.
+# Markets then appear on the dashboard once a run publishes.
+CATEGORY_SHARDS = False
@@ -0,0 +1,211 @@
+"""
+Return-correlation engine for Capital.com Market Analyzer
+
+Builds daily log-returns from the local candle history (daily_closes),
+each over a symbol's own consecutive closes and aligned by day, and
+computes the full correlation matrix in blocks with NumPy. Missing days
+are handled with pairwise masks: every pair is correlated only over the
+days both instruments traded.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from row_versions import current_row_version
+
+DEFAULT_WINDOW = 90
+MIN_OVERLAP = 20
+BLOCK_SIZE = 256
+CACHE_ENTRIES = 4
+
+
+def ensure_candle_history_table(conn):
+    """Create the daily close history table (one row per symbol per UTC day)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_closes (
+            symbol TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            close REAL NOT NULL,
+            PRIMARY KEY (symbol, day)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_daily_closes_day ON daily_closes (day)')
+
+
+def store_daily_closes(conn, symbol: str, days, closes):
+    """Upsert a symbol's (day ordinal, close) history on the caller's transaction."""
+    conn.executemany(
+        '''
+        INSERT INTO daily_closes (symbol, day, close) VALUES (?, ?, ?)
+        ON CONFLICT(symbol, day) DO UPDATE SET close = excluded.close
+        ''',
+        ((symbol, day, close) for day, close in zip(days, closes)),
+    )
+
+
+def load_log_returns(conn, window: int = DEFAULT_WINDOW) -> Tuple[List[str], np.ndarray]:
+    """
+    Log-returns over each symbol's most recent `window` observations, aligned
+    on the day axis.
+
+    Each return runs from one observed close of a symbol to its next one, so
+    a share's Monday return spans the weekend and is not lost when crypto
+    (which trades every day) puts Saturday and Sunday on the axis. Closes
+    older than twice the window in calendar days are ignored, so a long-
+    delisted symbol cannot stretch the axis.
+
+    Returns (symbols, returns) where returns has one row per symbol and one
+    column per day; NaN marks days on which a symbol has no return.
+    """
+    latest = conn.execute('SELECT MAX(day) FROM daily_closes').fetchone()[0]
+    if latest is None:
+        return [], np.empty((0, 0))
+
+    rows = conn.execute(
+        '''
+        SELECT symbol, day, close FROM (
+            SELECT symbol, day, close,
+                   ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY day DESC) AS recent
+            FROM daily_closes WHERE day > ? AND close > 0
+        )
+        WHERE recent <= ?
+        ORDER BY symbol, day
+        ''',
+        (latest - 2 * window, window + 1),
+    ).fetchall()
+    if not rows:
+        return [], np.empty((0, 0))
+
+    symbol_of = [r[0] for r in rows]
+    days = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+    log_closes = np.log(np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows)))
+
+    # Consecutive rows of the same symbol are consecutive observations of it
+    same_symbol = np.fromiter(
+        (a == b for a, b in zip(symbol_of, symbol_of[1:])), dtype=bool, count=len(rows) - 1
+    )
+    returns = (log_closes[1:] - log_closes[:-1])[same_symbol]
+    return_days = days[1:][same_symbol]
+    return_symbols = [s for s, keep in zip(symbol_of[1:], same_symbol) if keep]
+    if not return_symbols:
+        return [], np.empty((0, 0))
+
+    symbols = sorted(set(return_symbols))
+    sym_index = {s: i for i, s in enumerate(symbols)}
+    axis, day_idx = np.unique(return_days, return_inverse=True)
+    sym_idx = np.fromiter((sym_index[s] for s in return_symbols), dtype=np.intp, count=len(return_symbols))
+
+    aligned = np.full((len(symbols), len(axis)), np.nan)
+    aligned[sym_idx, day_idx] = returns
+    return symbols, aligned
+
+
+def blocked_correlation(
+    returns: np.ndarray, block: int = BLOCK_SIZE, min_overlap: int = MIN_OVERLAP
+) -> np.ndarray:
+    """
+    Pairwise-masked Pearson correlation of the rows of `returns`.
+
+    The matrix is filled block by block (only the upper triangle is computed
+    and mirrored), and every statistic is a matrix product over the masked
+    values, so no Python-level pair loop is needed. Pairs with fewer than
+    `min_overlap` common days, or zero variance over them, are NaN.
+    """
+    n_symbols = returns.shape[0]
+    mask = ~np.isnan(returns)
+    x = np.where(mask, returns, 0.0)
+    x2 = x * x
+    m = mask.astype(np.float64)
+    out = np.full((n_symbols, n_symbols), np.nan, dtype=np.float32)
+
+    for i0 in range(0, n_symbols, block):
+        i1 = min(i0 + block, n_symbols)
+        xi, x2i, mi = x[i0:i1], x2[i0:i1], m[i0:i1]
+        for j0 in range(i0, n_symbols, block):
+            j1 = min(j0 + block, n_symbols)
+            xj, x2j, mj = x[j0:j1], x2[j0:j1], m[j0:j1]
+
+            n = mi @ mj.T
+            sx = xi @ mj.T
+            sy = mi @ xj.T
+            sxx = x2i @ mj.T
+            syy = mi @ x2j.T
+            sxy = xi @ xj.T
+
+            cov = n * sxy - sx * sy
+            var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                corr = cov / np.sqrt(var)
+            corr[(n < min_overlap) | ~(var > 0)] = np.nan
+            np.clip(corr, -1.0, 1.0, out=corr)
+
+            out[i0:i1, j0:j1] = corr
+            out[j0:j1, i0:i1] = corr.T
+    return out
+
+
+def universe_hash(conn) -> str:
+    """
+    Identify the current universe and data version for cache keys. The row
+    version advances with every write transaction, including each streamed
+    MarketWriter batch that stores candle history, so a matrix cached
+    mid-run is not served after the next batch.
+    """
+    digest = hashlib.sha1()
+    for (symbol,) in conn.execute('SELECT symbol FROM markets ORDER BY symbol'):
+        digest.update(symbol.encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(str(current_row_version(conn)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CorrelationEngine:
+    """Correlation matrices cached by (universe hash, window)."""
+
+    def __init__(self, max_entries: int = CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[Dict[str, int], List[str], np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def matrix(self, conn, window: int = DEFAULT_WINDOW):
+        """Return (symbol index, symbols, matrix) for the window, computing once."""
+        key = (universe_hash(conn), window)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        symbols, returns = load_log_returns(conn, window)
+        matrix = blocked_correlation(returns) if symbols else np.empty((0, 0), dtype=np.float32)
+        entry = ({s: i for i, s in enumerate(symbols)}, symbols, matrix)
+
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return entry
+
+    def top_correlated(
+        self, conn, symbol: str, window: int = DEFAULT_WINDOW, k: int = 10
+    ) -> Optional[List[Tuple[str, float]]]:
+        """The k symbols most correlated with `symbol`, or None without history."""
+        index, symbols, matrix = self.matrix(conn, window)
+        row_idx = index.get(symbol)
+        if row_idx is None:
+            return None
+
+        row = matrix[row_idx].astype(np.float64)
+        row[row_idx] = np.nan
+        valid = np.flatnonzero(~np.isnan(row))
+        if valid.size == 0:
+            return []
+        k = min(k, valid.size)
+        top = valid[np.argpartition(-row[valid], k - 1)[:k]]
+        top = top[np.argsort(-row[top])]
+        return [(symbols[i], float(row[i])) for i in top]
@@ -1,12 +1,13 @@
 """
 Database module for Capital.com Market Analyzer
-Handles SQLite database operations
+Handles SQLite database reads; markets are written by run_analyzer.py
+(store_to_database / MarketWriter)
 """
 
 import sqlite3
 import pandas as pd
 import os
-from datetime import datetime
+from schema import migrate
 
 DB_FILE = 'market_data.db'
 
@@ -17,91 +18,12 @@ def get_db_connection():
     return conn
 
 def init_db():
-    """Initialize the database with required tables"""
+    """Create or migrate the database to the shared schema (see schema.py)"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create markets table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS markets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        category TEXT,
-        symbol TEXT UNIQUE,
-        name TEXT,
-        current_price REAL,
-        currency TEXT,
-        price_change_pct TEXT,
-        perf_1w TEXT,
-        perf_1m TEXT,
-        perf_3m TEXT,
-        perf_6m TEXT,
-        perf_ytd TEXT,
-        perf_1y TEXT,
-        perf_5y TEXT,
-        perf_10y TEXT,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create metadata table for storing fetch timestamps and other metadata
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS metadata (
-        key TEXT PRIMARY KEY,
-        value TEXT,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def save_market_data(data):
-    """
-    Save market data to the database
-    
-    Args:
-        data (list): List of dictionaries containing market data
-    """
-    if not data:
-        return
-        
-    init_db()
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Clear existing data to ensure fresh snapshot (optional, depending on requirement)
-    # For now, we'll replace existing records or insert new ones
-    
-    # Prepare data for insertion
-    # We use INSERT OR REPLACE to handle updates
-    for item in data:
-        cursor.execute('''
-        INSERT OR REPLACE INTO markets (
-            category, symbol, name, current_price, currency, 
-            price_change_pct, perf_1w, perf_1m, perf_3m, 
-            perf_6m, perf_ytd, perf_1y, perf_5y, perf_10y,
-            updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            item.get('Category'),
-            item.get('Symbol'),
-            item.get('Name'),
-            item.get('Current Price'),
-            item.get('Currency'),
-            item.get('Price Change %'),
-            item.get('Perf % 1W'),
-            item.get('Perf % 1M'),
-            item.get('Perf % 3M'),
-            item.get('Perf % 6M'),
-            item.get('Perf % YTD'),
-            item.get('Perf % 1Y'),
-            item.get('Perf % 5Y'),
-            item.get('Perf % 10Y'),
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        ))
-    
-    conn.commit()
-    conn.close()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
 
 def load_market_data_df():
     """Load market data into a pandas DataFrame"""
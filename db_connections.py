@@ -0,0 +1,123 @@
+"""
+Shared SQLite connections for market_data.db
+
+The database runs in WAL mode, so dashboard reads keep seeing the last
+committed data while the analyzer writes, instead of waiting on the rollback
+journal's exclusive lock. A thread checks a read-only connection (with
+memory-mapped I/O) out on its first read and hands it back with release();
+the web app does so at request teardown, so Flask's thread-per-request
+server reuses a bounded set of readers instead of opening one per request.
+All writes from a process go through a single writer connection.
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+BUSY_TIMEOUT_MS = 30000
+# Released readers kept open for reuse; more than this are closed
+MAX_IDLE_READERS = 8
+
+
+def enable_wal(conn):
+    """Switch the database file to WAL journaling (persistent across connections)."""
+    mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+    # NORMAL is durable across application crashes in WAL mode
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return mode
+
+
+class ConnectionPool:
+    """Checked-out reader connections plus one serialized writer for a database file."""
+
+    def __init__(self, db_path: str, mmap_size: int = DEFAULT_MMAP_SIZE, max_idle_readers: int = MAX_IDLE_READERS):
+        self.db_path = db_path
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._idle = queue.LifoQueue(maxsize=max(1, max_idle_readers))
+        self._readers = set()
+        self._readers_lock = threading.Lock()
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, **kwargs)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """This thread's read-only connection, checked out on first use until release()."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                # Used by one thread at a time; unchecked so it can move between
+                # threads and close() can run anywhere
+                conn = self._connect(check_same_thread=False)
+                conn.execute('PRAGMA query_only = ON')
+                with self._readers_lock:
+                    self._readers.add(conn)
+            self._local.conn = conn
+        return conn
+
+    def release(self):
+        """Hand this thread's reader back for other threads (a no-op without one)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            with self._readers_lock:
+                self._readers.discard(conn)
+            conn.close()
+
+    @contextmanager
+    def writer(self):
+        """
+        The process's writer connection, held exclusively for one transaction
+        that commits on success and rolls back on error.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect(check_same_thread=False)
+                enable_wal(self._writer)
+            with self._writer:
+                yield self._writer
+
+    def close(self):
+        """Close the writer and every reader opened so far."""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            readers, self._readers = self._readers, set()
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for conn in readers:
+            conn.close()
+        self._local = threading.local()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(db_path: str) -> ConnectionPool:
+    """The shared pool for a database file."""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path)
+        return pool
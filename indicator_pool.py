@@ -0,0 +1,276 @@
+"""
+Process-pool compute stage for RSI indicators.
+
+I/O threads only fetch: submit() packs a market's candle series into compact
+bytes (float64 closes, fixed-width raw timestamps) and returns a Future at
+once, so the fetch thread moves on to its next market. A dispatcher thread
+gathers up to batch_size markets, copies them into one block of a
+preallocated ring of shared memory blocks and hands the whole batch to a
+worker process, which parses the timestamps and runs Wilder's RSI outside
+the fetching process's GIL. The daily close history comes back alongside
+the RSI values as compact arrays. Blocks return to the ring when their batch
+is done; workers keep ring blocks attached between batches.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from capital_analyzer import (
+    RSI_SERIES,
+    _normalize_candles,
+    _parse_snapshot_time,
+    daily_closes_from_candles,
+    rsi_metrics_from_candles,
+)
+
+# Bytes reserved per raw snapshot timestamp, e.g. "2024-01-31T13:00:00.000Z".
+TIMESTAMP_WIDTH = 32
+CLOSE_WIDTH = 8
+ROW_WIDTH = CLOSE_WIDTH + TIMESTAMP_WIDTH
+
+# Candle rows one market's fetch_rsi_payloads can return
+MARKET_ROWS = sum(points for _, _, points in RSI_SERIES)
+
+Layout = Dict[str, Tuple[int, int]]
+Indicators = Tuple[Dict[str, Optional[float]], Tuple[array, array]]
+
+
+class PackedCandles:
+    """One market's candle series as contiguous bytes, ready to copy into a block."""
+
+    __slots__ = ("layout", "closes", "stamps", "rows")
+
+    def __init__(self, layout: Layout, closes: bytes, stamps: bytes, rows: int):
+        self.layout = layout
+        self.closes = closes
+        self.stamps = stamps
+        self.rows = rows
+
+
+def pack_candles(payloads: Dict[str, Optional[Dict]]) -> PackedCandles:
+    """Raw (timestamp, close bid) rows of every series; dates are left unparsed."""
+    closes = array("d")
+    stamps: List[bytes] = []
+    layout: Layout = {}
+    for key, payload in payloads.items():
+        start = len(closes)
+        for p in (payload or {}).get("prices") or []:
+            ts = p.get("snapshotTimeUTC") or p.get("snapshotTime")
+            bid = (p.get("closePrice") or {}).get("bid")
+            if not ts or bid is None:
+                continue
+            try:
+                close = float(bid)
+            except (TypeError, ValueError):
+                continue
+            closes.append(close)
+            stamps.append(str(ts).encode("ascii", "ignore")[:TIMESTAMP_WIDTH].ljust(TIMESTAMP_WIDTH, b"\0"))
+        layout[key] = (start, len(closes) - start)
+    return PackedCandles(layout, closes.tobytes(), b"".join(stamps), len(closes))
+
+
+def _write_batch(buf, capacity: int, batch: List[PackedCandles]) -> List[Layout]:
+    """
+    Copy a batch into a block holding `capacity` rows: closes from the start,
+    timestamps from capacity * CLOSE_WIDTH. Returns each market's layout
+    with block-wide offsets.
+    """
+    layouts = []
+    row = 0
+    for packed in batch:
+        buf[row * CLOSE_WIDTH : (row + packed.rows) * CLOSE_WIDTH] = packed.closes
+        stamps = capacity * CLOSE_WIDTH + row * TIMESTAMP_WIDTH
+        buf[stamps : stamps + packed.rows * TIMESTAMP_WIDTH] = packed.stamps
+        layouts.append({key: (offset + row, count) for key, (offset, count) in packed.layout.items()})
+        row += packed.rows
+    return layouts
+
+
+def _read_candles(buf, capacity: int, layout: Layout) -> Dict[str, list]:
+    closes = buf[: capacity * CLOSE_WIDTH].cast("d")
+    stamps = buf[capacity * CLOSE_WIDTH : capacity * ROW_WIDTH]
+    series: Dict[str, list] = {}
+    try:
+        for key, (offset, count) in layout.items():
+            candles = []
+            for i in range(offset, offset + count):
+                start = i * TIMESTAMP_WIDTH
+                raw = bytes(stamps[start : start + TIMESTAMP_WIDTH]).rstrip(b"\0")
+                t = _parse_snapshot_time(raw.decode("ascii"))
+                if t is not None:
+                    candles.append((t, closes[i]))
+            candles.sort(key=lambda x: x[0])
+            series[key] = _normalize_candles(candles)
+    finally:
+        closes.release()
+        stamps.release()
+    return series
+
+
+# Ring blocks a worker process has attached, by name
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _indicator_worker(
+    shm_name: str, capacity: int, markets: List[Tuple[Layout, float]], period: int, keep: bool
+) -> List[Indicators]:
+    """Runs in a pool process: parse and compute RSI for every market of a block."""
+    shm = _attached.get(shm_name) or shared_memory.SharedMemory(name=shm_name)
+    if keep:
+        _attached[shm_name] = shm
+    try:
+        results = []
+        for layout, now_ts in markets:
+            series = _read_candles(shm.buf, capacity, layout)
+            now = datetime.fromtimestamp(now_ts, timezone.utc)
+            daily = series.get("day", [])
+            rsi = rsi_metrics_from_candles(
+                daily, series.get("hour", []), series.get("h4", []), now, period
+            )
+            results.append((rsi, daily_closes_from_candles(daily)))
+        return results
+    finally:
+        if not keep:
+            shm.close()
+
+
+def resolve_indicator_processes(configured) -> int:
+    """
+    0 disables the pool, None means one process per CPU core. On a single
+    core None disables it too: the processes would only compete with the
+    fetch threads for that core (see bench_indicators.py).
+    """
+    if configured is None:
+        cores = os.cpu_count() or 1
+        return cores if cores > 1 else 0
+    return max(0, int(configured))
+
+
+class IndicatorPool:
+    """ProcessPoolExecutor that computes RSI metrics from batched shared candle arrays."""
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        period: int = 14,
+        batch_size: int = 16,
+        linger: float = 0.02,
+    ):
+        self.processes = processes or os.cpu_count() or 1
+        self.period = period
+        self.batch_size = max(1, int(batch_size))
+        # Seconds the dispatcher waits for a batch to fill before sending it
+        self.linger = linger
+        self.capacity = self.batch_size * MARKET_ROWS
+        # Spawn rather than fork: the pool starts while fetch threads (or a
+        # Flask request thread) are running, and a forked child can inherit
+        # a lock one of them held
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+        )
+        # Two blocks per process: one being computed, one queued behind it
+        self._blocks = [
+            shared_memory.SharedMemory(create=True, size=self.capacity * ROW_WIDTH)
+            for _ in range(2 * self.processes)
+        ]
+        self._free: queue.Queue = queue.Queue()
+        for block in self._blocks:
+            self._free.put(block)
+        self._pending: queue.Queue = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="indicator-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, payloads: Dict[str, Optional[Dict]], now: Optional[datetime] = None) -> Future:
+        """
+        Queue a market's payloads and return a Future of its (RSI metrics,
+        daily close history) without waiting for a process.
+        """
+        future: Future = Future()
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
+        self._pending.put((future, pack_candles(payloads), now_ts))
+        return future
+
+    def indicators(self, payloads: Dict[str, Optional[Dict]], now: Optional[datetime] = None) -> Indicators:
+        """submit() and wait for the result."""
+        return self.submit(payloads, now).result()
+
+    def rsi_metrics(
+        self, payloads: Dict[str, Optional[Dict]], now: Optional[datetime] = None
+    ) -> Dict[str, Optional[float]]:
+        return self.indicators(payloads, now)[0]
+
+    def _dispatch(self):
+        stopping = False
+        while not stopping:
+            item = self._pending.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._send(batch)
+
+    def _send(self, batch):
+        futures = [future for future, _, _ in batch]
+        packed = [candles for _, candles, _ in batch]
+        rows = sum(candles.rows for candles in packed)
+        try:
+            if rows <= self.capacity:
+                block, capacity, keep = self._free.get(), self.capacity, True
+            else:
+                # Longer series than RSI_SERIES asks for: a block of its own
+                capacity, keep = rows, False
+                block = shared_memory.SharedMemory(create=True, size=max(1, rows * ROW_WIDTH))
+            layouts = _write_batch(block.buf, capacity, packed)
+            markets = [(layout, now_ts) for layout, (_, _, now_ts) in zip(layouts, batch)]
+            task = self.executor.submit(_indicator_worker, block.name, capacity, markets, self.period, keep)
+        except Exception as exc:
+            for future in futures:
+                future.set_exception(exc)
+            return
+        task.add_done_callback(lambda done: self._finish(done, block, keep, futures))
+
+    def _finish(self, task, block, keep: bool, futures: List[Future]):
+        if keep:
+            self._free.put(block)
+        else:
+            block.close()
+            block.unlink()
+        exc = task.exception()
+        for i, future in enumerate(futures):
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(task.result()[i])
+
+    def shutdown(self):
+        """Compute what is still queued, then stop the processes and free the ring."""
+        self._pending.put(None)
+        self._dispatcher.join()
+        self.executor.shutdown(wait=True)
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
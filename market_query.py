@@ -0,0 +1,162 @@
+"""
+Sorted, filtered and keyset-paginated market listings for /api/markets
+
+A page is one ORDER BY <column>, id ... LIMIT query continuing after the
+cursor's (value, id) row value, so every page costs the same however deep
+the client pages, and with a category filter the (category, metric) indexes
+serve both the order and the range filters. Markets without a value for the
+sort column come after all the others, in id order, in either direction.
+
+The total is an estimate: without range filters or search it is read from
+market_aggregates (as of the last publish) instead of counting rows.
+"""
+
+import base64
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aggregates import ALL_SCOPE, load_aggregates
+from schema import PERF_COLUMNS, RSI_COLUMNS
+from search import matching_ids_sql
+
+NUMERIC_COLUMNS = ('current_price',) + PERF_COLUMNS + RSI_COLUMNS
+TEXT_COLUMNS = ('symbol', 'name', 'category')
+SORTABLE_COLUMNS = TEXT_COLUMNS + NUMERIC_COLUMNS
+
+# /api/markets field names that differ from the column (perf_1w -> perf_1w_pct)
+COLUMN_ALIASES = {column[:-len('_pct')]: column for column in PERF_COLUMNS if column.startswith('perf_')}
+
+RANGE_OPERATORS = {'lt': '<', 'lte': '<=', 'gt': '>', 'gte': '>='}
+
+# Query parameters that ask for a page instead of the full legacy listing
+PAGE_PARAMS = ('sort', 'dir', 'limit', 'cursor')
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class MarketQueryError(ValueError):
+    """An unknown column, a malformed filter value or a cursor from another ordering."""
+
+
+def resolve_column(name: str, columns: Iterable[str] = SORTABLE_COLUMNS) -> str:
+    column = COLUMN_ALIASES.get(name, name)
+    if column not in columns:
+        raise MarketQueryError(f"Unknown column: {name}")
+    return column
+
+
+def parse_range_filters(args) -> List[Tuple[str, str, float]]:
+    """(column, SQL operator, value) for every <column>_lt/_lte/_gt/_gte argument."""
+    filters = []
+    for key in args:
+        name, _, suffix = key.rpartition('_')
+        if suffix not in RANGE_OPERATORS or not name:
+            continue
+        column = resolve_column(name, NUMERIC_COLUMNS)
+        try:
+            value = float(args[key])
+        except (TypeError, ValueError):
+            raise MarketQueryError(f"{key} must be a number")
+        filters.append((column, RANGE_OPERATORS[suffix], value))
+    return filters
+
+
+def encode_cursor(column: str, direction: str, value, row_id: int) -> str:
+    payload = json.dumps([column, direction, value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, column: str, direction: str) -> Tuple[object, int]:
+    """The (value, id) a cursor continues after; it must come from the same ordering."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_column, cursor_direction, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise MarketQueryError("Malformed cursor")
+    if (cursor_column, cursor_direction) != (column, direction):
+        raise MarketQueryError("Cursor belongs to a different sort order")
+    return value, int(row_id)
+
+
+def _select(conn, conditions: list, params: list, order: str, limit: int) -> list:
+    where = ' AND '.join(conditions) or '1=1'
+    return conn.execute(
+        f'SELECT * FROM markets WHERE {where} ORDER BY {order} LIMIT ?', params + [limit]
+    ).fetchall()
+
+
+def market_page(
+    conn,
+    sort: str = 'symbol',
+    direction: str = 'asc',
+    limit: int = DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    ranges: Iterable[Tuple[str, str, float]] = (),
+) -> Dict:
+    """
+    One page of markets rows with the cursor of the next page (None on the
+    last one) and a total_estimate of the matching markets.
+    """
+    column = resolve_column(sort)
+    direction = (direction or 'asc').lower()
+    if direction not in ('asc', 'desc'):
+        raise MarketQueryError("dir must be asc or desc")
+    limit = min(max(int(limit), 1), MAX_LIMIT)
+
+    conditions, params = [], []
+    if category:
+        conditions.append('category = ?')
+        params.append(category)
+    matching = matching_ids_sql(conn, search) if search else None
+    if matching:
+        conditions.append(matching[0])
+        params.extend(matching[1])
+    ranges = list(ranges)
+    for range_column, operator, value in ranges:
+        conditions.append(f'{range_column} {operator} ?')
+        params.append(value)
+
+    position = decode_cursor(cursor, column, direction) if cursor else None
+    order = 'ASC' if direction == 'asc' else 'DESC'
+    rows = []
+    if position is None or position[0] is not None:
+        # Rows with a value, walking the (category, column) index
+        keyset = [f'{column} IS NOT NULL']
+        keyset_params = []
+        if position is not None:
+            keyset.append(f"({column}, id) {'>' if order == 'ASC' else '<'} (?, ?)")
+            keyset_params.extend(position)
+        rows = _select(conn, conditions + keyset, params + keyset_params, f'{column} {order}, id {order}', limit + 1)
+    if len(rows) <= limit:
+        keyset = [f'{column} IS NULL']
+        keyset_params = []
+        if position is not None and position[0] is None:
+            keyset.append('id > ?')
+            keyset_params.append(position[1])
+        rows += _select(conn, conditions + keyset, params + keyset_params, 'id', limit + 1 - len(rows))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(column, direction, rows[-1][column], rows[-1]['id'])
+
+    return {
+        'markets': rows,
+        'next_cursor': next_cursor,
+        'total_estimate': _total_estimate(conn, conditions, params, category, exact=bool(ranges or matching)),
+        'sort': column,
+        'dir': direction,
+        'limit': limit,
+    }
+
+
+def _total_estimate(conn, conditions: list, params: list, category: Optional[str], exact: bool) -> int:
+    if not exact:
+        aggregate = load_aggregates(conn, category or ALL_SCOPE)
+        if aggregate is not None:
+            return aggregate['markets']
+    where = ' AND '.join(conditions) or '1=1'
+    return conn.execute(f'SELECT COUNT(*) FROM markets WHERE {where}', params).fetchone()[0]
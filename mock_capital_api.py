@@ -0,0 +1,228 @@
+"""
+Local mock of the Capital.com REST endpoints used by the analyzer
+
+Serves deterministic markets and candles so the full pipeline (including
+sharded runs) can be exercised end to end without credentials:
+
+    python mock_capital_api.py --port 8800 --markets 200
+
+then set API_BASE_URL = "http://127.0.0.1:8800/api/v1" in config.py.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from capital_analyzer import CapitalAPI
+
+RESOLUTION_SECONDS = {
+    'MINUTE': 60,
+    'MINUTE_5': 5 * 60,
+    'MINUTE_15': 15 * 60,
+    'MINUTE_30': 30 * 60,
+    'HOUR': 60 * 60,
+    'HOUR_4': 4 * 60 * 60,
+    'DAY': 24 * 60 * 60,
+    'WEEK': 7 * 24 * 60 * 60,
+}
+CLOSED_EVERY = 7  # every 7th generated market is reported as CLOSED
+
+
+def mock_markets(markets_per_category: int = 10, categories=None) -> dict:
+    """{category: [market, ...]} with stable epics like FOREX_0003."""
+    categories = categories or list(CapitalAPI.CATEGORY_NODE_IDS)
+    return {
+        category: [
+            {
+                'epic': f"{category.upper()}_{i:04d}",
+                'instrumentName': f"{category.title()} {i}",
+                'marketStatus': 'CLOSED' if i % CLOSED_EVERY == CLOSED_EVERY - 1 else 'TRADEABLE',
+            }
+            for i in range(markets_per_category)
+        ]
+        for category in categories
+    }
+
+
+def _seed(epic: str) -> int:
+    return int(hashlib.sha1(epic.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def mock_price(epic: str, ts: float) -> float:
+    """Deterministic price of an epic at a UTC timestamp."""
+    seed = _seed(epic)
+    base = 10 + seed % 1000
+    phase = (seed % 360) * math.pi / 180
+    return round(base * (1 + 0.1 * math.sin(ts / (30 * 86400) + phase) + 0.01 * math.sin(ts / 3600)), 5)
+
+
+def _parse_time(value: str):
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+class MockCapitalAPI(ThreadingHTTPServer):
+    """HTTP server holding the mock universe and per-endpoint request counts."""
+
+    daemon_threads = True
+
+    def __init__(self, address, markets: dict):
+        super().__init__(address, _Handler)
+        self.markets = markets
+        self.by_epic = {
+            m['epic']: (category, m) for category, group in markets.items() for m in group
+        }
+        self.node_ids = {node: category for category, node in CapitalAPI.CATEGORY_NODE_IDS.items()}
+        self.request_counts = Counter()
+        self._counts_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def count(self, endpoint: str):
+        with self._counts_lock:
+            self.request_counts[endpoint] += 1
+
+    def navigation(self, node: str):
+        # Root category nodes hold one sub node; markets live on the sub node
+        if node in self.node_ids:
+            return {'nodes': [{'id': f"{node}.all", 'name': 'All'}], 'markets': []}
+        if node.endswith('.all') and node[:-4] in self.node_ids:
+            return {'nodes': [], 'markets': self.markets.get(self.node_ids[node[:-4]], [])}
+        return None
+
+    def details(self, epic: str):
+        if epic not in self.by_epic:
+            return None
+        category, market = self.by_epic[epic]
+        now = datetime.now(timezone.utc).timestamp()
+        bid = mock_price(epic, now)
+        previous = mock_price(epic, now - 86400)
+        return {
+            'instrument': {'epic': epic, 'name': market['instrumentName'], 'currency': 'USD',
+                           'type': category.upper()},
+            'snapshot': {'bid': bid, 'offer': round(bid * 1.0005, 5),
+                         'percentageChange': round((bid - previous) / previous * 100, 2),
+                         'marketStatus': market['marketStatus']},
+        }
+
+    def prices(self, epic: str, query: dict):
+        if epic not in self.by_epic:
+            return None
+        step = RESOLUTION_SECONDS.get(query.get('resolution', 'MINUTE'), 60)
+        max_points = int(query.get('max', 10))
+        now = datetime.now(timezone.utc).timestamp()
+        start = _parse_time(query['from']) if 'from' in query else None
+        end = _parse_time(query['to']) if 'to' in query else None
+        end = min(end or now, now)
+
+        if start is not None:
+            first = math.ceil(start / step) * step
+            times = [first + i * step for i in range(max_points) if first + i * step <= end]
+        else:
+            last = math.floor(end / step) * step
+            times = [last - i * step for i in range(max_points)][::-1]
+
+        candles = []
+        for ts in times:
+            close = mock_price(epic, ts)
+            stamp = datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+            candles.append({
+                'snapshotTime': stamp,
+                'snapshotTimeUTC': stamp,
+                'openPrice': {'bid': mock_price(epic, ts - step)},
+                'closePrice': {'bid': close, 'ask': round(close * 1.0005, 5)},
+            })
+        return {'prices': candles}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MockCapitalAPI
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict | None = None, headers: dict | None = None):
+        payload = json.dumps(body or {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if path == '/api/v1/session':
+            self.server.count('session')
+            token = hashlib.sha1(str(id(self)).encode('utf-8')).hexdigest()
+            self._send(200, {'accountType': 'CFD'}, {'CST': token, 'X-SECURITY-TOKEN': token})
+        else:
+            self._send(404, {'errorCode': 'error.not-found'})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if parts[:2] != ['api', 'v1'] or len(parts) < 3:
+            self._send(404, {'errorCode': 'error.not-found'})
+            return
+        if not self.headers.get('CST'):
+            self._send(401, {'errorCode': 'error.invalid.session.token'})
+            return
+
+        endpoint, arg = parts[2], '/'.join(parts[3:])
+        self.server.count(endpoint)
+        if endpoint == 'ping':
+            body = {'status': 'OK'}
+        elif endpoint == 'marketnavigation':
+            body = self.server.navigation(arg)
+        elif endpoint == 'markets':
+            body = self.server.details(arg)
+        elif endpoint == 'prices':
+            body = self.server.prices(arg, query)
+        else:
+            body = None
+
+        if body is None:
+            self._send(404, {'errorCode': 'error.not-found'})
+        else:
+            self._send(200, body)
+
+
+def serve_mock_api(port: int = 0, markets: dict | None = None) -> MockCapitalAPI:
+    """Start the mock on 127.0.0.1 in a background thread (port 0 picks a free one)."""
+    server = MockCapitalAPI(('127.0.0.1', port), markets or mock_markets())
+    threading.Thread(target=server.serve_forever, name='mock-capital-api', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Capital.com API")
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--markets', type=int, default=10, help='Markets per category')
+    args = parser.parse_args()
+
+    server = MockCapitalAPI(('127.0.0.1', args.port), mock_markets(args.markets))
+    print(f"[OK] Mock Capital.com API at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[OK] Mock API stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Cross-sectional rankings for Capital.com Market Analyzer
+
+Computed once per write, in the same transaction as the market rows, so the
+dashboard can ask for "top decile by 1M momentum within Forex" with an
+indexed lookup instead of sorting every row.
+"""
+
+import pandas as pd
+
+from schema import INDEXED_METRICS
+
+# markets columns that get a rank, percentile and z-score
+RANKED_METRICS = INDEXED_METRICS
+
+RANK_COLUMNS = (
+    'symbol',
+    'category',
+    'metric',
+    'value',
+    'category_rank',
+    'category_percentile',
+    'category_zscore',
+    'global_rank',
+    'global_percentile',
+    'global_zscore',
+)
+
+
+def compute_rankings(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rank every metric within its category and across the whole universe.
+
+    Rank 1 is the highest value; percentile is the share of values less than
+    or equal to this one (1.0 = top); z-score uses the population std.
+    """
+    metrics = [m for m in RANKED_METRICS if m in df.columns]
+    long = df.melt(
+        id_vars=['symbol', 'category'],
+        value_vars=metrics,
+        var_name='metric',
+        value_name='value',
+    )
+    long['value'] = pd.to_numeric(long['value'], errors='coerce')
+    long = long.dropna(subset=['value']).reset_index(drop=True)
+
+    for scope, keys in (('category', ['metric', 'category']), ('global', ['metric'])):
+        grouped = long.groupby(keys)['value']
+        long[f'{scope}_rank'] = grouped.rank(method='min', ascending=False).astype(int)
+        long[f'{scope}_percentile'] = grouped.rank(method='max', pct=True)
+        mean = grouped.transform('mean')
+        std = grouped.transform('std', ddof=0)
+        long[f'{scope}_zscore'] = ((long['value'] - mean) / std.where(std > 0)).fillna(0.0)
+
+    return long[list(RANK_COLUMNS)]
+
+
+def refresh_rankings(conn):
+    """Recompute market_ranks from the markets table on the caller's transaction."""
+    # Every ranked column exists from migration 1 on, so the table is not inspected
+    df = pd.read_sql_query(
+        f"SELECT symbol, category, {', '.join(RANKED_METRICS)} FROM markets", conn
+    )
+    ranks = compute_rankings(df)
+
+    conn.execute('DELETE FROM market_ranks')
+    conn.executemany(
+        f'''
+        INSERT INTO market_ranks ({', '.join(RANK_COLUMNS)})
+        VALUES ({', '.join('?' for _ in RANK_COLUMNS)})
+        ''',
+        zip(*(ranks[col].tolist() for col in RANK_COLUMNS)),
+    )
+    return len(ranks)
+
+
+def top_performers(conn, column: str, limit: int = 5) -> list:
+    """
+    The `limit` highest values of a markets column within each category, as
+    (category, name, symbol, value, rank) rows ordered by category then rank.
+    A category whose values are all NULL still appears once, with value None.
+
+    One statement: each category's leaders come from a LIMIT walk down its
+    (category, column) index, and ROW_NUMBER() ranks just those rows. Ranking
+    the whole table in the window instead sorts every row.
+    """
+    return conn.execute(
+        f'''
+        WITH leaders AS (
+            SELECT c.category, m.name, m.symbol, m.{column} AS value
+            FROM (SELECT DISTINCT category FROM markets) AS c
+            LEFT JOIN markets AS m ON m.rowid IN (
+                SELECT rowid FROM markets
+                WHERE category = c.category AND {column} IS NOT NULL
+                ORDER BY {column} DESC
+                LIMIT ?
+            )
+        )
+        SELECT category, name, symbol, value,
+               ROW_NUMBER() OVER (PARTITION BY category ORDER BY value DESC) AS rank
+        FROM leaders
+        ORDER BY category, rank
+        ''',
+        (limit,),
+    ).fetchall()
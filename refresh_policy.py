@@ -0,0 +1,113 @@
+"""
+Staleness-aware incremental refresh for Capital.com Market Analyzer
+
+Remembers when each epic was last refreshed and what its market status was,
+so a run can skip markets whose data is still fresh, or that are closed and
+were already captured after they closed.
+"""
+
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+OPEN_STATUS = 'TRADEABLE'
+
+# Seconds a refreshed market counts as fresh, per category
+DEFAULT_FRESHNESS_SECONDS = {
+    'forex': 300,
+    'cryptocurrencies': 300,
+    'commodities': 900,
+    'indices': 900,
+    'shares': 3600,
+    'etf': 3600,
+}
+FALLBACK_FRESHNESS_SECONDS = 900
+
+
+def ensure_refresh_state_table(conn):
+    """Create the per-epic refresh bookkeeping table."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS refresh_state (
+            symbol TEXT PRIMARY KEY,
+            category TEXT NOT NULL,
+            market_status TEXT,
+            last_refreshed REAL NOT NULL
+        )
+    ''')
+
+
+def record_refresh(conn, market_data: list, refreshed_at: Optional[float] = None):
+    """Mark stored records as refreshed now, on the caller's transaction."""
+    refreshed_at = time.time() if refreshed_at is None else refreshed_at
+    conn.executemany(
+        '''
+        INSERT INTO refresh_state (symbol, category, market_status, last_refreshed)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(symbol) DO UPDATE SET
+            category = excluded.category,
+            market_status = excluded.market_status,
+            last_refreshed = excluded.last_refreshed
+        ''',
+        (
+            (row['Symbol'], row.get('Category', ''), row.get('Market Status'), refreshed_at)
+            for row in market_data
+            if row.get('Symbol')
+        ),
+    )
+
+
+class RefreshPolicy:
+    """
+    Decides which epics of a category need refetching.
+
+    An epic is refetched when it has never been stored, or when its data is
+    older than the category's freshness target and either the market is
+    tradeable now or the stored snapshot was taken while it was still
+    trading. Closed markets captured after the close are skipped until they
+    reopen, which is what makes weekend forex and share runs nearly free.
+    """
+
+    def __init__(
+        self,
+        state: Dict[str, Tuple[Optional[str], float]],
+        freshness_seconds: Optional[Dict[str, int]] = None,
+        now: Optional[float] = None,
+    ):
+        self.state = state
+        self.freshness_seconds = {**DEFAULT_FRESHNESS_SECONDS, **(freshness_seconds or {})}
+        self.now = time.time() if now is None else now
+        self.retained: List[str] = []
+
+    @classmethod
+    def load(cls, db_path: str, freshness_seconds: Optional[Dict[str, int]] = None):
+        conn = sqlite3.connect(db_path)
+        try:
+            state = {
+                symbol: (status, refreshed)
+                for symbol, status, refreshed in conn.execute(
+                    'SELECT symbol, market_status, last_refreshed FROM refresh_state'
+                )
+            }
+        finally:
+            conn.close()
+        return cls(state, freshness_seconds)
+
+    def needs_refresh(self, category: str, market: dict) -> bool:
+        stored = self.state.get(market.get('epic'))
+        if stored is None:
+            return True
+        stored_status, refreshed = stored
+        max_age = self.freshness_seconds.get(category.lower(), FALLBACK_FRESHNESS_SECONDS)
+        if self.now - refreshed < max_age:
+            return False
+        if market.get('marketStatus') == OPEN_STATUS:
+            return True
+        return stored_status == OPEN_STATUS
+
+    def split(self, category: str, markets: list) -> Tuple[list, list]:
+        """Return (markets to fetch, skipped markets); skipped epics are retained."""
+        to_fetch, skipped = [], []
+        for market in markets:
+            (to_fetch if self.needs_refresh(category, market) else skipped).append(market)
+        self.retained.extend(m.get('epic') for m in skipped if m.get('epic'))
+        return to_fetch, skipped
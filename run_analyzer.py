@@ -6,12 +6,38 @@ Stores data directly to SQLite database (primary storage)
 import csv
 import sqlite3
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 import argparse
-from capital_analyzer import CapitalAPI
+import pandas as pd
+from capital_analyzer import CapitalAPI, candle_indicators
+from category_shards import attached_shards, existing_shard_keys, open_shard, shard_key
+from correlation import store_daily_closes
+from indicator_pool import IndicatorPool, resolve_indicator_processes
+from aggregates import refresh_aggregates
+from columnar import export_to_parquet, parquet_path, parse_since, run_query
+from rankings import refresh_rankings
+from refresh_policy import RefreshPolicy, record_refresh
+from row_versions import (
+    bump_dataset_version,
+    clear_deletions,
+    current_row_version,
+    next_row_version,
+    record_deletions,
+    tombstone_symbols,
+    versioned_rows,
+)
+from run_journal import RunJournal, merge_done_epics
+from run_planner import build_plan, cache_navigation, print_plan, record_api_latency
+from category_scheduler import CategoryScheduler
+from concurrency import AdaptiveLimiter, ApiGovernor
+from db_connections import enable_wal
+from schema import MARKETS_COLUMNS, MARKETS_STAGING, create_markets_staging, migrate, swap_in_markets_staging
+from snapshots import SNAPSHOT_METRICS, compact_snapshots, merge_snapshots, record_snapshots
 import os
+import queue
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 import threading
 
 # Import configuration
@@ -30,27 +56,92 @@ def format_percentage(value: float) -> str:
     return f"{value:.2f}%"
 
 
+def format_rsi(value: float) -> str:
+    """Format RSI value for display"""
+    if value is None:
+        return "N/A"
+    return f"{value:.2f}"
+
+
 _thread_local = threading.local()
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> ApiGovernor | None:
+    """Process-wide concurrency governor shared by all API clients (None when
+    ADAPTIVE_CONCURRENCY is off)."""
+    global _governor
+    if not getattr(config, 'ADAPTIVE_CONCURRENCY', True):
+        return None
+    with _governor_lock:
+        if _governor is None:
+            limiter = AdaptiveLimiter(
+                initial=max(1, int(getattr(config, 'MAX_THREADS', 5))),
+                max_limit=resolve_worker_count(),
+            )
+            _governor = ApiGovernor(limiter, max_logins=int(getattr(config, 'MAX_CONCURRENT_LOGINS', 2)))
+        return _governor
+
+
+def resolve_worker_count() -> int:
+    """Worker threads per process: MAX_THREADS, or MAX_CONCURRENCY with the
+    adaptive governor (which then caps the requests actually in flight)."""
+    threads = max(1, int(getattr(config, 'MAX_THREADS', 5)))
+    if getattr(config, 'ADAPTIVE_CONCURRENCY', True):
+        return max(threads, int(getattr(config, 'MAX_CONCURRENCY', 16)))
+    return threads
+
+
+def create_api() -> CapitalAPI:
+    """API client from config.py (API_BASE_URL, if set, overrides the demo/live endpoint)."""
+    return CapitalAPI(
+        api_key=config.API_KEY,
+        identifier=config.USERNAME,
+        password=config.PASSWORD,
+        demo=config.USE_DEMO,
+        base_url=getattr(config, 'API_BASE_URL', None),
+        governor=get_governor(),
+    )
 
 
 def _get_worker_api() -> CapitalAPI:
     """Create one API client per worker thread for parallel fetching."""
     api = getattr(_thread_local, "api", None)
     if api is None:
-        api = CapitalAPI(
-            api_key=config.API_KEY,
-            identifier=config.USERNAME,
-            password=config.PASSWORD,
-            demo=config.USE_DEMO,
-        )
+        api = create_api()
         if not api.create_session():
             raise RuntimeError("Failed to create session for parallel worker")
         _thread_local.api = api
     return api
 
 
-def _build_market_record(category: str, market: dict, request_delay: float) -> dict | None:
+def _build_market_record(
+    category: str,
+    market: dict,
+    request_delay: float,
+    indicator_pool: IndicatorPool | None = None,
+) -> dict | None:
     """Fetch details and performance metrics for one market."""
+    fetched = _fetch_market_record(category, market, request_delay, indicator_pool)
+    if fetched is None:
+        return None
+    return _with_indicators(*fetched)
+
+
+def _fetch_market_record(
+    category: str,
+    market: dict,
+    request_delay: float,
+    indicator_pool: IndicatorPool | None = None,
+):
+    """Fetch one market and return (record, indicators), or None.
+
+    When an indicator pool is given, this thread only fetches the candles:
+    indicators is a Future of the pool's RSI parsing/computation, and the
+    thread moves on without waiting for it. Otherwise it is the computed
+    (RSI metrics, daily closes). _with_indicators completes the record.
+    """
     api = _get_worker_api()
     epic = market.get('epic')
     name = market.get('instrumentName', epic)
@@ -66,220 +157,750 @@ def _build_market_record(category: str, market: dict, request_delay: float) -> d
     snapshot = details.get('snapshot', {})
     instrument = details.get('instrument', {})
     performance = api.calculate_performance(epic)
-    rsi_vals = api.calculate_rsi_metrics(epic)
-
-    def fmt_rsi(v):
-        if v is None:
-            return "N/A"
-        return f"{v:.2f}"
+    candle_payloads = api.fetch_rsi_payloads(epic)
+    if indicator_pool is not None:
+        indicators = indicator_pool.submit(candle_payloads)
+    else:
+        indicators = candle_indicators(candle_payloads, datetime.now(timezone.utc))
 
-    return {
+    record = {
         'Category': category.title(),
         'Symbol': epic,
         'Name': name,
-        'Current Price': snapshot.get('bid', 'N/A'),
+        'Current Price': snapshot.get('bid'),
         'Currency': instrument.get('currency', 'N/A'),
-        'Price Change %': format_percentage(snapshot.get('percentageChange')),
-        'Perf % 30M': format_percentage(performance.get('perf_30m')),
-        'Perf % 1H': format_percentage(performance.get('perf_1h')),
-        'Perf % 4H': format_percentage(performance.get('perf_4h')),
-        'Perf % 6H': format_percentage(performance.get('perf_6h')),
-        'Perf % 1D': format_percentage(performance.get('perf_1d')),
-        'Perf % 1W': format_percentage(performance.get('perf_1w')),
-        'Perf % 1M': format_percentage(performance.get('perf_1m')),
-        'Perf % 3M': format_percentage(performance.get('perf_3m')),
-        'Perf % 6M': format_percentage(performance.get('perf_6m')),
-        'Perf % YTD': format_percentage(performance.get('perf_ytd')),
-        'Perf % 1Y': format_percentage(performance.get('perf_1y')),
-        'Perf % 5Y': format_percentage(performance.get('perf_5y')),
-        'Perf % 10Y': format_percentage(performance.get('perf_10y')),
-        'RSI 1H': fmt_rsi(rsi_vals.get('rsi_1h')),
-        'RSI 4H': fmt_rsi(rsi_vals.get('rsi_4h')),
-        'RSI 24H': fmt_rsi(rsi_vals.get('rsi_24h')),
-        'RSI 1W': fmt_rsi(rsi_vals.get('rsi_1w')),
-        'RSI 1M': fmt_rsi(rsi_vals.get('rsi_1m')),
-        'RSI 3M': fmt_rsi(rsi_vals.get('rsi_3m')),
-        'RSI 6M': fmt_rsi(rsi_vals.get('rsi_6m')),
-        'RSI YTD': fmt_rsi(rsi_vals.get('rsi_ytd')),
+        'Price Change %': snapshot.get('percentageChange'),
+        'Perf % 30M': performance.get('perf_30m'),
+        'Perf % 1H': performance.get('perf_1h'),
+        'Perf % 4H': performance.get('perf_4h'),
+        'Perf % 6H': performance.get('perf_6h'),
+        'Perf % 1D': performance.get('perf_1d'),
+        'Perf % 1W': performance.get('perf_1w'),
+        'Perf % 1M': performance.get('perf_1m'),
+        'Perf % 3M': performance.get('perf_3m'),
+        'Perf % 6M': performance.get('perf_6m'),
+        'Perf % YTD': performance.get('perf_ytd'),
+        'Perf % 1Y': performance.get('perf_1y'),
+        'Perf % 5Y': performance.get('perf_5y'),
+        'Perf % 10Y': performance.get('perf_10y'),
+        # Filled in by _with_indicators
+        **{field: None for field in RSI_RECORD_FIELDS.values()},
         'Market Status': snapshot.get('marketStatus', 'N/A'),
         'Type': instrument.get('type', category.upper()),
+        'Daily Closes': None,
     }
+    return record, indicators
+
+
+# Record field of each RSI metric
+RSI_RECORD_FIELDS = {
+    'rsi_1h': 'RSI 1H',
+    'rsi_4h': 'RSI 4H',
+    'rsi_24h': 'RSI 24H',
+    'rsi_1w': 'RSI 1W',
+    'rsi_1m': 'RSI 1M',
+    'rsi_3m': 'RSI 3M',
+    'rsi_6m': 'RSI 6M',
+    'rsi_ytd': 'RSI YTD',
+}
+
+
+def _with_indicators(record: dict, indicators) -> dict:
+    """Fill a fetched record's RSI fields and daily closes, waiting for the pool if needed."""
+    if isinstance(indicators, Future):
+        indicators = indicators.result()
+    rsi_vals, daily_closes = indicators
+    for metric, field in RSI_RECORD_FIELDS.items():
+        record[field] = rsi_vals.get(metric)
+    record['Daily Closes'] = daily_closes
+    return record
 
 
 def init_database(db_path: str = 'market_data.db'):
-    """Initialize SQLite database with markets table"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS markets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT NOT NULL,
-            symbol TEXT NOT NULL UNIQUE,
-            name TEXT NOT NULL,
-            current_price REAL,
-            currency TEXT,
-            price_change_pct REAL,
-            perf_1w_pct REAL,
-            perf_1m_pct REAL,
-            perf_3m_pct REAL,
-            perf_6m_pct REAL,
-            perf_ytd_pct REAL,
-            perf_1y_pct REAL,
-            perf_5y_pct REAL,
-            perf_10y_pct REAL,
-            rsi_24h REAL,
-            rsi_1w REAL,
-            rsi_1m REAL,
-            rsi_3m REAL,
-            rsi_6m REAL,
-            rsi_ytd REAL,
-            rsi_1h REAL,
-            rsi_4h REAL,
-            rsi_1y REAL,
-            rsi_5y REAL,
-            rsi_10y REAL,
-            market_status TEXT,
-            type TEXT,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """Create or migrate the database to the current schema (see schema.py)"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        enable_wal(conn)
+        migrate(conn)
+    finally:
+        conn.close()
+    print(f"[OK] Database initialized at {db_path}")
+
+
+# (column, record field, kind) for each stored markets column. Analyzer
+# records carry 'num' fields as floats or None; the CSV export (and older
+# callers) may still hand over display strings ("1.23%", "N/A"), which are
+# parsed to floats.
+MARKET_FIELDS = (
+    ('category', 'Category', 'text'),
+    ('symbol', 'Symbol', 'text'),
+    ('name', 'Name', 'text'),
+    ('current_price', 'Current Price', 'num'),
+    ('currency', 'Currency', 'text'),
+    ('price_change_pct', 'Price Change %', 'num'),
+    ('perf_1d_pct', 'Perf % 1D', 'num'),
+    ('perf_1w_pct', 'Perf % 1W', 'num'),
+    ('perf_1m_pct', 'Perf % 1M', 'num'),
+    ('perf_3m_pct', 'Perf % 3M', 'num'),
+    ('perf_6m_pct', 'Perf % 6M', 'num'),
+    ('perf_ytd_pct', 'Perf % YTD', 'num'),
+    ('perf_1y_pct', 'Perf % 1Y', 'num'),
+    ('perf_5y_pct', 'Perf % 5Y', 'num'),
+    ('perf_10y_pct', 'Perf % 10Y', 'num'),
+    ('rsi_24h', 'RSI 24H', 'num'),
+    ('rsi_1w', 'RSI 1W', 'num'),
+    ('rsi_1m', 'RSI 1M', 'num'),
+    ('rsi_3m', 'RSI 3M', 'num'),
+    ('rsi_6m', 'RSI 6M', 'num'),
+    ('rsi_ytd', 'RSI YTD', 'num'),
+    ('rsi_1h', 'RSI 1H', 'num'),
+    ('rsi_4h', 'RSI 4H', 'num'),
+    ('market_status', 'Market Status', 'text'),
+    ('type', 'Type', 'text'),
+)
+MARKET_COLUMNS = tuple(column for column, _, _ in MARKET_FIELDS)
+_CATEGORY_INDEX = MARKET_COLUMNS.index('category')
+_SYMBOL_INDEX = MARKET_COLUMNS.index('symbol')
+_SNAPSHOT_INDEXES = tuple(MARKET_COLUMNS.index(column) for column in SNAPSHOT_METRICS)
+
+INSERT_MARKET_SQL = f'''
+    INSERT INTO markets ({', '.join(MARKET_COLUMNS)})
+    VALUES ({', '.join('?' for _ in MARKET_COLUMNS)})
+'''
+
+# Row tuples in MARKET_COLUMNS order plus content_hash and row_version
+# (versioned_rows); a stored market with the same hash is left untouched.
+VERSIONED_COLUMNS = MARKET_COLUMNS + ('content_hash', 'row_version')
+
+UPSERT_MARKET_SQL = f'''
+    INSERT INTO markets ({', '.join(VERSIONED_COLUMNS)})
+    VALUES ({', '.join('?' for _ in VERSIONED_COLUMNS)})
+    ON CONFLICT(symbol) DO UPDATE SET
+''' + ',\n'.join(
+    f'        {col} = excluded.{col}' for col in VERSIONED_COLUMNS if col != 'symbol'
+) + ''',
+        last_updated = CURRENT_TIMESTAMP
+    WHERE markets.content_hash IS NOT excluded.content_hash
+'''
+
+# Bulk writes commit once per batch, so skip the per-commit fsync of the
+# rollback journal and keep temp b-trees (retained_symbols) in memory. Changed
+# markets are scattered over the table and its metric indexes, so give the
+# writer a page cache (64 MiB, filled on demand) that holds their working set.
+WRITE_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -65536',
+)
+
+
+def tune_write_connection(conn):
+    """Apply WRITE_PRAGMAS to a connection used for bulk market writes."""
+    for pragma in WRITE_PRAGMAS:
+        conn.execute(pragma)
+
+
+def _to_float(val):
+    """A metric as float or None; display strings ("1.23%", "N/A") are parsed."""
+    if val is None or isinstance(val, float):
+        return None if val != val else val
+    if isinstance(val, int):
+        return float(val)
+    try:
+        return float(str(val).replace('%', '').strip())
+    except ValueError:
+        return None
+
+
+def market_rows_from_frame(df: pd.DataFrame) -> list:
+    """Row tuples in MARKET_COLUMNS order from the CSV export (or any frame of
+    records), parsing numeric columns column-wise."""
+    columns = []
+    for _, field, kind in MARKET_FIELDS:
+        if field not in df:
+            columns.append([None if kind == 'num' else ''] * len(df))
+            continue
+        values = df[field]
+        if kind == 'num':
+            if not pd.api.types.is_numeric_dtype(values):
+                values = values.astype(str).str.replace('%', '', regex=False).str.strip()
+            values = pd.to_numeric(values, errors='coerce')
+        else:
+            values = values.fillna('')
+        columns.append(values.astype(object).where(values.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+_RECORD_FIELDS = tuple((field, kind == 'num') for _, field, kind in MARKET_FIELDS)
+
+
+def market_row_tuples(market_data: list) -> list:
+    """Row tuples in MARKET_COLUMNS order from analyzer records."""
+    return [
+        tuple(_to_float(row.get(field)) if numeric else row.get(field, '') for field, numeric in _RECORD_FIELDS)
+        for row in market_data
+    ]
+
+
+def _write_market_history(conn, market_data: list):
+    """Write records' candle history and refresh state on the caller's transaction."""
+    for row in market_data:
+        history = row.get('Daily Closes')
+        if history:
+            store_daily_closes(conn, row.get('Symbol', ''), *history)
+    record_refresh(conn, market_data)
+
+
+def _write_snapshots(conn, rows: list, run_id: int | None = None):
+    """Append the written row tuples to the snapshot history (SNAPSHOT_HISTORY)."""
+    if not getattr(config, 'SNAPSHOT_HISTORY', True):
+        return
+    record_snapshots(
+        conn,
+        ((row[_SYMBOL_INDEX], tuple(row[i] for i in _SNAPSHOT_INDEXES)) for row in rows),
+        run_id=run_id,
+    )
+
+
+def _category_scope(categories: list | None) -> tuple:
+    """(SQL condition, params) selecting rows of the given categories (all if none)."""
+    selected_categories = [c.lower() for c in (categories or [])]
+    if not selected_categories:
+        return '1=1', []
+    placeholders = ", ".join("?" for _ in selected_categories)
+    return f"lower(category) IN ({placeholders})", selected_categories
+
+
+def _load_retained_symbols(conn, symbols) -> bool:
+    """Fill the temp retained_symbols table; False when there is nothing to retain."""
+    if not symbols:
+        return False
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS retained_symbols (symbol TEXT PRIMARY KEY)')
+    conn.execute('DELETE FROM retained_symbols')
+    conn.executemany(
+        'INSERT OR IGNORE INTO retained_symbols (symbol) VALUES (?)',
+        ((symbol,) for symbol in symbols),
+    )
+    return True
+
+
+def _delete_category_rows(
+    conn, categories: list | None, keep_symbols=None, version: int | None = None, check_size: bool = False
+) -> int:
+    """Delete rows of the given categories (all rows if none), except
+    keep_symbols, tombstoning them at `version`. Returns the rows deleted.
+    With check_size, raises PublishValidationError instead if that would
+    leave less than PUBLISH_MIN_ROW_RATIO of the categories' rows."""
+    scope, params = _category_scope(categories)
+    condition = scope
+    if _load_retained_symbols(conn, keep_symbols):
+        condition += ' AND symbol NOT IN (SELECT symbol FROM retained_symbols)'
+    if check_size:
+        previous = conn.execute(f'SELECT COUNT(*) FROM markets WHERE {scope}', params).fetchone()[0]
+        doomed = conn.execute(f'SELECT COUNT(*) FROM markets WHERE {condition}', params).fetchone()[0]
+        _check_publish_size(previous, previous - doomed)
+    if version is not None:
+        record_deletions(conn, condition, params, version)
+    return conn.execute(f'DELETE FROM markets WHERE {condition}', params).rowcount
+
+
+_DERIVED_VERSION_KEY = 'derived_row_version'
+
+
+def _markets_changed_since_refresh(conn) -> bool:
+    """Whether any market was written or deleted after the derived tables were last refreshed."""
+    row = conn.execute('SELECT value FROM metadata WHERE key = ?', (_DERIVED_VERSION_KEY,)).fetchone()
+    if row is None:
+        return True
+    derived = int(row[0])
+    return conn.execute(
+        '''
+        SELECT EXISTS (SELECT 1 FROM markets WHERE row_version > ?)
+            OR EXISTS (SELECT 1 FROM market_deletions WHERE row_version > ?)
+        ''',
+        (derived, derived),
+    ).fetchone()[0] == 1
+
+
+def _finish_write(conn):
+    """Stamp the fetch time and refresh derived tables on the caller's transaction."""
+    fetched_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute('DELETE FROM metadata WHERE key = ?', ('last_fetch_time',))
+    conn.execute('INSERT INTO metadata (key, value) VALUES (?, ?)', ('last_fetch_time', fetched_at))
+    # Every publish moves last_fetch at least, so conditional GETs revalidate
+    bump_dataset_version(conn)
+
+    if _markets_changed_since_refresh(conn):
+        # Rankings are cross-sectional, so recompute them over the whole table
+        refresh_rankings(conn)
+        refresh_aggregates(conn)
+        conn.execute(
+            'INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)',
+            (_DERIVED_VERSION_KEY, str(current_row_version(conn))),
         )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS metadata (
-            key TEXT PRIMARY KEY,
-            value TEXT,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    else:
+        # Nothing to recompute; only the fetch time moves
+        conn.execute('UPDATE market_aggregates SET last_fetch = ?', (fetched_at,))
+
+    # Downsample/expire old snapshots (a no-op after the first publish of a day)
+    compact_snapshots(
+        conn,
+        raw_days=getattr(config, 'SNAPSHOT_RAW_DAYS', 2),
+        hourly_days=getattr(config, 'SNAPSHOT_HOURLY_DAYS', 30),
+        retention_days=getattr(config, 'SNAPSHOT_RETENTION_DAYS', 365),
+    )
+
+
+class PublishValidationError(Exception):
+    """A staged markets table failed validation and was not swapped in."""
+
+
+_STAGING_COLUMNS = ', '.join(name for name, _ in MARKETS_COLUMNS)
+
+INSERT_STAGING_SQL = f'''
+    INSERT OR REPLACE INTO {MARKETS_STAGING} ({', '.join(VERSIONED_COLUMNS)})
+    VALUES ({', '.join('?' for _ in VERSIONED_COLUMNS)})
+'''
+
+
+def _check_publish_size(previous: int, staged: int):
+    min_ratio = float(getattr(config, 'PUBLISH_MIN_ROW_RATIO', 0.5))
+    if previous and staged < previous * min_ratio:
+        raise PublishValidationError(
+            f"staged {staged} markets where the last run published {previous} "
+            f"(minimum ratio {min_ratio:.0%}); keeping the previous data"
         )
+
+
+def _publish_via_staging(conn, rows: list, categories: list | None, retain_symbols, version: int) -> int:
+    """Build markets_staging from the kept rows plus `rows` and swap it in."""
+    create_markets_staging(conn)
+
+    scope, params = _category_scope(categories)
+    carry_sql = f'SELECT {_STAGING_COLUMNS} FROM markets WHERE NOT ({scope})'
+    if _load_retained_symbols(conn, retain_symbols):
+        carry_sql += ' OR symbol IN (SELECT symbol FROM retained_symbols)'
+    conn.execute(f'INSERT INTO {MARKETS_STAGING} ({_STAGING_COLUMNS}) {carry_sql}', params)
+    carried_outside = conn.execute(
+        f'SELECT COUNT(*) FROM markets WHERE NOT ({scope})', params
+    ).fetchone()[0]
+    conn.executemany(INSERT_STAGING_SQL, rows)
+
+    previous = conn.execute(f'SELECT COUNT(*) FROM markets WHERE {scope}', params).fetchone()[0]
+    staged = conn.execute(f'SELECT COUNT(*) FROM {MARKETS_STAGING}').fetchone()[0] - carried_outside
+    _check_publish_size(previous, staged)
+
+    # Markets whose values did not change keep their version
+    conn.execute(
+        f'''
+        UPDATE {MARKETS_STAGING} AS s
+        SET row_version = m.row_version, last_updated = m.last_updated
+        FROM markets AS m
+        WHERE s.row_version = ? AND m.symbol = s.symbol AND m.content_hash = s.content_hash
+        ''',
+        (version,),
+    )
+    record_deletions(conn, f'symbol NOT IN (SELECT symbol FROM {MARKETS_STAGING})', [], version)
+    changed = conn.execute(
+        f'''
+        SELECT (SELECT COUNT(*) FROM {MARKETS_STAGING} WHERE row_version = ?)
+             + (SELECT COUNT(*) FROM market_deletions WHERE row_version = ?)
+        ''',
+        (version, version),
+    ).fetchone()[0]
+
+    swap_in_markets_staging(conn)
+    return changed
+
+
+def _publish_in_place(conn, rows: list, categories: list | None, retain_symbols, version: int) -> int:
+    """Upsert the changed `rows` and delete the scope's other unretained rows."""
+    scope, params = _category_scope(categories)
+    in_scope = [symbol for symbol, in conn.execute(f'SELECT symbol FROM markets WHERE {scope}', params)]
+    # Comparing hashes here spares the unchanged rows a statement each
+    stored = dict(conn.execute('SELECT symbol, content_hash FROM markets'))
+    changed = conn.executemany(
+        UPSERT_MARKET_SQL,
+        [row for row in rows if stored.get(row[_SYMBOL_INDEX]) != row[-2]],
+    ).rowcount
+
+    keep = {row[_SYMBOL_INDEX] for row in rows}.union(retain_symbols or [])
+    stale = [symbol for symbol in in_scope if symbol not in keep]
+    tombstone_symbols(conn, stale, version)
+    conn.executemany('DELETE FROM markets WHERE symbol = ?', ((symbol,) for symbol in stale))
+
+    staged = conn.execute(f'SELECT COUNT(*) FROM markets WHERE {scope}', params).fetchone()[0]
+    _check_publish_size(len(in_scope), staged)
+    return changed + len(stale)
+
+
+def publish_market_rows(conn, rows: list, categories: list | None = None, retain_symbols=None) -> int:
+    """
+    Replace the markets of the given categories (all categories if none)
+    with `rows`, keeping the retained rows, on the caller's transaction.
+    Returns the number of markets written or deleted.
+
+    Rows are hashed and only markets whose values changed are rewritten and
+    get the new row_version. Usually that is a guarded upsert in place; when
+    `rows` outnumber the stored markets (a first or bulk load) the new table
+    is built in markets_staging and swapped in, with its indexes rebuilt
+    once. Either way readers keep seeing the previous complete table until
+    the transaction commits. If the replaced scope would shrink below
+    PUBLISH_MIN_ROW_RATIO of its current size, PublishValidationError is
+    raised and the caller's rollback keeps the previous data.
+    """
+    if not conn.in_transaction:
+        conn.execute('BEGIN')
+    version = next_row_version(conn)
+    rows = versioned_rows(rows, version)
+
+    stored = conn.execute('SELECT COUNT(*) FROM markets').fetchone()[0]
+    if len(rows) > stored:
+        changed = _publish_via_staging(conn, rows, categories, retain_symbols, version)
+    else:
+        changed = _publish_in_place(conn, rows, categories, retain_symbols, version)
+    clear_deletions(conn, version)
+    return changed
+
+
+MERGE_SHARD_SQL = f'''
+    INSERT INTO main.markets ({', '.join(VERSIONED_COLUMNS)})
+    SELECT {', '.join(MARKET_COLUMNS)}, content_hash, ? FROM {{schema}}.markets
+    WHERE symbol IN (SELECT symbol FROM retained_symbols)
+    ON CONFLICT(symbol) DO UPDATE SET
+''' + ',\n'.join(
+    f'        {col} = excluded.{col}' for col in VERSIONED_COLUMNS if col != 'symbol'
+) + ''',
+        last_updated = CURRENT_TIMESTAMP
+    WHERE markets.content_hash IS NOT excluded.content_hash
+'''
+
+
+def _merge_shard(conn, schema: str, version: int) -> int:
+    """
+    Upsert the attached shard's markets listed in retained_symbols into the
+    main markets table at `version`, skipping rows whose hash is unchanged,
+    then drop the shard's other rows. Returns the main rows written.
+    """
+    changed = conn.execute(MERGE_SHARD_SQL.format(schema=schema), (version,)).rowcount
+    # The shard keeps exactly what was published
+    conn.execute(f'''
+        DELETE FROM {schema}.markets
+        WHERE symbol NOT IN (SELECT symbol FROM retained_symbols)
     ''')
-    
-    conn.commit()
-    _ensure_rsi_columns(conn)
-    conn.close()
-    print(f"[OK] Database initialized at {db_path}")
+    return changed
 
 
-def _ensure_rsi_columns(conn):
-    cur = conn.cursor()
-    cur.execute("PRAGMA table_info(markets)")
-    existing = {row[1] for row in cur.fetchall()}
-    for col in (
-        "rsi_24h",
-        "rsi_1w",
-        "rsi_1m",
-        "rsi_3m",
-        "rsi_6m",
-        "rsi_ytd",
-        "rsi_1h",
-        "rsi_4h",
-        "rsi_1y",
-        "rsi_5y",
-        "rsi_10y",
-    ):
-        if col not in existing:
-            cur.execute(f"ALTER TABLE markets ADD COLUMN {col} REAL")
-    conn.commit()
+def _merge_shard_history(conn, schema: str):
+    """
+    Move the candle history, refresh state, snapshots and journal marks an
+    attached shard collected while streaming into the main tables, on the
+    caller's transaction, and clear them from the shard.
+    """
+    conn.execute(f'''
+        INSERT INTO main.daily_closes (symbol, day, close)
+        SELECT symbol, day, close FROM {schema}.daily_closes WHERE true
+        ON CONFLICT(symbol, day) DO UPDATE SET close = excluded.close
+    ''')
+    conn.execute(f'''
+        INSERT INTO main.refresh_state (symbol, category, market_status, last_refreshed)
+        SELECT symbol, category, market_status, last_refreshed FROM {schema}.refresh_state WHERE true
+        ON CONFLICT(symbol) DO UPDATE SET
+            category = excluded.category,
+            market_status = excluded.market_status,
+            last_refreshed = excluded.last_refreshed
+        WHERE excluded.last_refreshed > refresh_state.last_refreshed
+    ''')
+    merge_snapshots(conn, schema)
+    merge_done_epics(conn, schema)
+    conn.execute(f'DELETE FROM {schema}.daily_closes')
+    conn.execute(f'DELETE FROM {schema}.refresh_state')
 
 
-def store_to_database(market_data: list, db_path: str = 'market_data.db', categories: list | None = None):
+def merge_shard_history(db_path: str):
+    """Move what every category shard collected (see _merge_shard_history) into the database."""
+    keys = existing_shard_keys(db_path)
+    if not keys:
+        return
+    conn = sqlite3.connect(db_path, timeout=30)
+    tune_write_connection(conn)
+    try:
+        with attached_shards(conn, db_path, keys) as shards, conn:
+            for schema in shards.values():
+                _merge_shard_history(conn, schema)
+    finally:
+        conn.close()
+
+
+def resume_journal(db_path: str) -> RunJournal | None:
+    """
+    The interrupted run to resume, if any. Epics an earlier session streamed
+    into category shards are only marked done in the shards until a publish,
+    so they are moved into the journal first.
+    """
+    journal = RunJournal.resume(db_path)
+    if journal is not None:
+        merge_shard_history(db_path)
+    return journal
+
+
+def replace_market_rows(conn, rows: list, categories: list | None = None, retain_symbols=None) -> int:
+    """publish_market_rows, then stamp the fetch time and refresh rankings."""
+    changed = publish_market_rows(conn, rows, categories, retain_symbols)
+    _finish_write(conn)
+    return changed
+
+
+def store_to_database(
+    market_data: list,
+    db_path: str = 'market_data.db',
+    categories: list | None = None,
+    retain_symbols: list | None = None,
+):
     """Store market data directly to SQLite database.
 
     When categories are provided, only rows for those categories are replaced so a
     subset fetch does not erase unrelated data. If no categories are provided,
-    the full table is replaced.
+    the full table is replaced. Rows listed in retain_symbols (markets an
+    incremental run skipped as still fresh) are kept as they are.
     """
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    _ensure_rsi_columns(conn)
+    tune_write_connection(conn)
 
     try:
-        selected_categories = [c.lower() for c in (categories or [])]
-
-        if selected_categories:
-            placeholders = ", ".join("?" for _ in selected_categories)
-            cursor.execute(
-                f"DELETE FROM markets WHERE lower(category) IN ({placeholders})",
-                selected_categories,
-            )
-        else:
-            # Clear existing data
-            cursor.execute('DELETE FROM markets')
-        
-        # Parse percentage value
-        def parse_pct(val):
-            if val is None or val == 'N/A':
-                return None
-            if isinstance(val, str):
-                try:
-                    return float(val.replace('%', '').strip())
-                except (ValueError, AttributeError):
-                    return None
-            return float(val)
-
-        def parse_rsi(val):
-            if val is None or val == '' or val == 'N/A':
-                return None
-            if isinstance(val, (int, float)):
-                return float(val)
-            try:
-                return float(str(val).strip())
-            except (ValueError, TypeError):
-                return None
-
-        # Insert market data
-        for row in market_data:
-            cursor.execute('''
-                INSERT INTO markets (
-                    category, symbol, name, current_price, currency,
-                    price_change_pct, perf_1w_pct, perf_1m_pct, perf_3m_pct,
-                    perf_6m_pct, perf_ytd_pct, perf_1y_pct, perf_5y_pct,
-                    perf_10y_pct, rsi_24h, rsi_1w, rsi_1m, rsi_3m, rsi_6m,
-                    rsi_ytd, rsi_1h, rsi_4h, market_status, type
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                row.get('Category', ''),
-                row.get('Symbol', ''),
-                row.get('Name', ''),
-                parse_pct(row.get('Current Price')),
-                row.get('Currency', ''),
-                parse_pct(row.get('Price Change %')),
-                parse_pct(row.get('Perf % 1W')),
-                parse_pct(row.get('Perf % 1M')),
-                parse_pct(row.get('Perf % 3M')),
-                parse_pct(row.get('Perf % 6M')),
-                parse_pct(row.get('Perf % YTD')),
-                parse_pct(row.get('Perf % 1Y')),
-                parse_pct(row.get('Perf % 5Y')),
-                parse_pct(row.get('Perf % 10Y')),
-                parse_rsi(row.get('RSI 24H')),
-                parse_rsi(row.get('RSI 1W')),
-                parse_rsi(row.get('RSI 1M')),
-                parse_rsi(row.get('RSI 3M')),
-                parse_rsi(row.get('RSI 6M')),
-                parse_rsi(row.get('RSI YTD')),
-                parse_rsi(row.get('RSI 1H')),
-                parse_rsi(row.get('RSI 4H')),
-                row.get('Market Status', ''),
-                row.get('Type', '')
-            ))
-        
-        # Update metadata with last fetch time
-        cursor.execute('DELETE FROM metadata WHERE key = ?', ('last_fetch_time',))
-        cursor.execute(
-            'INSERT INTO metadata (key, value) VALUES (?, ?)',
-            ('last_fetch_time', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        )
-        
-        conn.commit()
-        print(f"[OK] Stored {len(market_data)} markets to database")
+        with conn:
+            rows = market_row_tuples(market_data)
+            changed = replace_market_rows(conn, rows, categories, retain_symbols)
+            _write_market_history(conn, market_data)
+            _write_snapshots(conn, rows)
+        print(f"[OK] Stored {len(market_data)} markets to database ({changed} changed)")
         
     except Exception as e:
         print(f"[ERROR] Error storing to database: {e}")
-        conn.rollback()
     finally:
         conn.close()
 
 
+class MarketWriter:
+    """Background writer that upserts completed records in micro-batches.
+
+    Fetch workers hand records over with put(); the writer thread commits them
+    every batch_size records or flush_interval seconds, so the dashboard fills
+    in while a run progresses and a crash only loses the current batch.
+    With a run journal, written epics are marked done in the same transaction.
+    Call stop() to drain the queue, then publish() once the run completed.
+
+    With CATEGORY_SHARDS, market rows stream into each category's shard file
+    instead (see category_shards), together with their candle history,
+    refresh state, snapshots and journal marks, and publish() merges all of
+    it into the database: the batches never write to the main file, and
+    markets reach the dashboard when the run is published.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        db_path: str = 'market_data.db',
+        batch_size: int = 25,
+        flush_interval: float = 2.0,
+        journal: RunJournal | None = None,
+    ):
+        self.db_path = db_path
+        self.journal = journal
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.written_symbols = set()
+        self.changed = 0
+        self.failed_batches = 0
+        self.category_shards = bool(getattr(config, 'CATEGORY_SHARDS', False))
+        self.shard_keys = set()
+        self._shards = {}
+        self._thread = threading.Thread(target=self._run, name='market-writer', daemon=True)
+
+    @property
+    def written(self) -> int:
+        return len(self.written_symbols)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, record: dict):
+        self.queue.put(record)
+
+    def stop(self):
+        """Flush everything queued so far and stop the writer thread."""
+        if self._thread.is_alive():
+            self.queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self):
+        # Shard workers share the database, so wait for the write lock
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        tune_write_connection(conn)
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is self._STOP:
+                    break
+                if item is not None:
+                    batch.append(item)
+                if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                    self._flush(conn, batch)
+                    batch = []
+                if time.monotonic() >= deadline:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self._flush(conn, batch)
+        finally:
+            conn.close()
+            for shard in self._shards.values():
+                shard.close()
+            self._shards = {}
+
+    def _write_shards(self, batch: list, rows: list) -> int:
+        """Write records and their row tuples into their categories' shard
+        files, one transaction per shard (writer thread only)."""
+        grouped = {}
+        for record, row in zip(batch, rows):
+            records, group = grouped.setdefault(shard_key(row[_CATEGORY_INDEX]), ([], []))
+            records.append(record)
+            group.append(row)
+        changed = 0
+        for key, (records, group) in grouped.items():
+            shard = self._shards.get(key)
+            if shard is None:
+                shard = self._shards[key] = open_shard(self.db_path, key)
+                tune_write_connection(shard)
+            with shard:
+                version = next_row_version(shard)
+                changed += shard.executemany(UPSERT_MARKET_SQL, versioned_rows(group, version)).rowcount
+                _write_market_history(shard, records)
+                _write_snapshots(shard, group, self.journal.run_id if self.journal is not None else None)
+                if self.journal is not None:
+                    self.journal.collect_done(shard, [record.get('Symbol') for record in records])
+            self.shard_keys.add(key)
+        return changed
+
+    def _flush(self, conn, batch: list):
+        try:
+            rows = market_row_tuples(batch)
+            if self.category_shards:
+                # The main file is left alone until publish()
+                changed = self._write_shards(batch, rows)
+            else:
+                with conn:
+                    version = next_row_version(conn)
+                    changed = conn.executemany(UPSERT_MARKET_SQL, versioned_rows(rows, version)).rowcount
+                    clear_deletions(conn, version)
+                    if changed:
+                        # Streamed rows are live before the publish
+                        bump_dataset_version(conn)
+                    _write_market_history(conn, batch)
+                    _write_snapshots(conn, rows, self.journal.run_id if self.journal is not None else None)
+                    if self.journal is not None:
+                        self.journal.mark_done(conn, [row.get('Symbol') for row in batch])
+            self.written_symbols.update(row.get('Symbol') for row in batch)
+            self.changed += changed
+        except Exception as e:
+            self.failed_batches += 1
+            print(f"[ERROR] Error writing {len(batch)} markets to database: {e}")
+
+    def publish(self, categories: list | None = None, retain_symbols: list | None = None):
+        """Merge the category shards (CATEGORY_SHARDS), drop rows of the
+        refreshed categories that this run neither wrote nor retained, stamp
+        the fetch time, refresh rankings and close the journal run in one
+        transaction. If the drop would leave less than PUBLISH_MIN_ROW_RATIO
+        of those categories, nothing is dropped or merged and the run stays
+        open for --resume."""
+        self.stop()
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        tune_write_connection(conn)
+        shard_keys = []
+        if self.category_shards:
+            if categories:
+                shard_keys = sorted(self.shard_keys.union(shard_key(c) for c in categories))
+            else:
+                shard_keys = existing_shard_keys(self.db_path)
+        try:
+            # Shards are attached outside the transaction, as SQLite requires
+            with attached_shards(conn, self.db_path, shard_keys) as shards, conn:
+                for schema in shards.values():
+                    _merge_shard_history(conn, schema)
+                keep = self.written_symbols.union(retain_symbols or [])
+                if self.journal is not None:
+                    # Include epics completed by earlier sessions of a resumed run
+                    keep.update(self.journal.kept_symbols(conn))
+                version = next_row_version(conn)
+                if shards and _load_retained_symbols(conn, keep):
+                    for schema in shards.values():
+                        _merge_shard(conn, schema, version)
+                    clear_deletions(conn, version)
+                # A truncated market listing must not prune most of a category
+                _delete_category_rows(conn, categories, keep, version, check_size=True)
+                _finish_write(conn)
+                if self.journal is not None:
+                    self.journal.finish(conn)
+            print(f"[OK] Stored {self.written} markets to database ({self.changed} changed)")
+        except Exception as e:
+            print(f"[ERROR] Error publishing to database: {e}")
+        finally:
+            conn.close()
+
+
+def load_market_records(db_path: str = 'market_data.db', categories: list | None = None) -> list:
+    """Read stored markets back as typed analyzer records (for the CSV exports)."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        query = 'SELECT * FROM markets'
+        params = []
+        selected_categories = [c.lower() for c in (categories or [])]
+        if selected_categories:
+            query += f" WHERE lower(category) IN ({', '.join('?' for _ in selected_categories)})"
+            params.extend(selected_categories)
+        rows = conn.execute(query + ' ORDER BY category, symbol', params).fetchall()
+    finally:
+        conn.close()
+
+    return [{
+        'Category': row['category'],
+        'Symbol': row['symbol'],
+        'Name': row['name'],
+        'Current Price': row['current_price'],
+        'Currency': row['currency'],
+        'Price Change %': row['price_change_pct'],
+        'Perf % 1D': row['perf_1d_pct'],
+        'Perf % 1W': row['perf_1w_pct'],
+        'Perf % 1M': row['perf_1m_pct'],
+        'Perf % 3M': row['perf_3m_pct'],
+        'Perf % 6M': row['perf_6m_pct'],
+        'Perf % YTD': row['perf_ytd_pct'],
+        'Perf % 1Y': row['perf_1y_pct'],
+        'Perf % 5Y': row['perf_5y_pct'],
+        'Perf % 10Y': row['perf_10y_pct'],
+        'RSI 1H': row['rsi_1h'],
+        'RSI 4H': row['rsi_4h'],
+        'RSI 24H': row['rsi_24h'],
+        'RSI 1W': row['rsi_1w'],
+        'RSI 1M': row['rsi_1m'],
+        'RSI 3M': row['rsi_3m'],
+        'RSI 6M': row['rsi_6m'],
+        'RSI YTD': row['rsi_ytd'],
+        'Market Status': row['market_status'],
+        'Type': row['type'],
+    } for row in rows]
+
+
 def resolve_market_limit(category: str, configured_limit: int | None = None, use_category_defaults: bool = True) -> int | None:
     """Resolve the effective cap for a category.
 
@@ -305,82 +926,258 @@ def resolve_market_limit(category: str, configured_limit: int | None = None, use
     return category_limits.get(category.lower(), 50)
 
 
-def fetch_and_analyze_markets(api: CapitalAPI, categories: list) -> list:
+def record_governor_latency(db_path: str):
+    """Persist the governor's recent per-endpoint latencies for --plan estimates."""
+    governor = get_governor()
+    if governor is not None:
+        record_api_latency(db_path, governor.latency_stats(), int(governor.limiter.limit))
+
+
+def plan_run(
+    categories: list | None = None,
+    db_path: str = 'market_data.db',
+    incremental: bool = False,
+    resume: bool = False,
+    shards: int | None = None,
+) -> dict:
+    """Print the request counts and ETA of a run from cached state, without API calls."""
+    init_database(db_path)
+    plan = build_plan(
+        db_path,
+        categories if categories else config.CATEGORIES,
+        workers=resolve_worker_count(),
+        request_delay=max(0.0, float(getattr(config, 'REQUEST_DELAY', 0.15))),
+        limit_for=lambda c: resolve_market_limit(c, getattr(config, 'MAX_MARKETS_PER_CATEGORY', None)),
+        freshness=getattr(config, 'FRESHNESS_SECONDS', None),
+        incremental=incremental,
+        resume=resume,
+        shards=shards or 1,
+        concurrency=max(1, int(getattr(config, 'MAX_THREADS', 5))),
+    )
+    print_plan(plan)
+    return plan
+
+
+def create_indicator_pool() -> IndicatorPool | None:
+    """Indicator process pool sized by INDICATOR_PROCESSES (None when disabled)."""
+    indicator_processes = resolve_indicator_processes(getattr(config, 'INDICATOR_PROCESSES', 0))
+    if not indicator_processes:
+        return None
+    print(f"Using {indicator_processes} processes for indicator computation")
+    return IndicatorPool(indicator_processes)
+
+
+def fetch_and_analyze_markets(
+    api: CapitalAPI,
+    categories: list,
+    refresh_policy: RefreshPolicy | None = None,
+    writer: MarketWriter | None = None,
+    journal: RunJournal | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    indicator_pool: IndicatorPool | None = None,
+    db_path: str | None = None,
+) -> list:
     """
     Fetch all markets and calculate performance metrics
+
+    With a refresh policy, markets it considers fresh are skipped and their
+    epics collected in refresh_policy.retained. With a writer, each completed
+    record is streamed to it instead of being collected in memory. With a
+    journal, each category's plan is recorded before fetching, and categories
+    it already planned only fetch their remaining epics. A long-lived executor
+    and indicator pool can be passed in (daemon mode) so worker sessions and
+    processes stay warm between runs; otherwise they are created per call.
+    With a db_path, each navigated category is cached for run_analyzer.py --plan.
     
     Returns:
         List of dictionaries with market data and performance metrics
+        (empty when a writer is used)
     """
     all_data = []
-    total_markets = 0
-    max_workers = max(1, int(getattr(config, 'MAX_THREADS', 5)))
+    sink = writer.put if writer is not None else all_data.append
+    max_workers = resolve_worker_count()
     request_delay = max(0.0, float(getattr(config, 'REQUEST_DELAY', 0.15)))
+    owns_pool = indicator_pool is None
+    if owns_pool:
+        indicator_pool = create_indicator_pool()
+
+    try:
+        processed = _fetch_categories(
+            api, categories, sink, max_workers, request_delay, indicator_pool, refresh_policy, journal,
+            executor, db_path,
+        )
+    finally:
+        if owns_pool and indicator_pool is not None:
+            indicator_pool.shutdown()
+
+    governor = get_governor()
+    print(f"\n{'='*60}")
+    print(f"[OK] Completed! Processed {processed} markets across {len(categories)} categories")
+    if governor is not None:
+        print(f"  API: {governor.summary()}")
+    print(f"{'='*60}\n")
     
+    return all_data
+
+
+def _plan_category(
+    api: CapitalAPI,
+    category: str,
+    refresh_policy: RefreshPolicy | None = None,
+    db_path: str | None = None,
+):
+    """Navigate a category and return (markets to fetch, skipped markets)."""
+    category_lower = category.lower()
+    configured_limit = getattr(config, 'MAX_MARKETS_PER_CATEGORY', None)
+    limit = resolve_market_limit(category_lower, configured_limit)
+
+    if limit is None:
+        print(f"  Fetching all available {category} entries")
+    else:
+        print(f"  Limiting to top {limit} {category} entries")
+
+    # Fetch markets in this category
+    markets = api.get_markets_by_category(category, limit=limit)
+    if limit is not None:
+        markets = markets[:limit]
+    if db_path is not None:
+        cache_navigation(db_path, category_lower, markets, api.last_navigation_nodes)
+
+    skipped = []
+    if refresh_policy is not None:
+        markets, skipped = refresh_policy.split(category_lower, markets)
+        print(f"  Incremental: refreshing {len(markets)}, skipping {len(skipped)} fresh or closed markets")
+    return markets, skipped
+
+
+def _fetch_categories(
+    api: CapitalAPI,
+    categories: list,
+    sink,
+    max_workers: int,
+    request_delay: float,
+    indicator_pool: IndicatorPool | None,
+    refresh_policy: RefreshPolicy | None = None,
+    journal: RunJournal | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    db_path: str | None = None,
+) -> int:
+    """Fetch every category's markets, passing each record to sink."""
+    processed = 0
     for category in categories:
         print(f"\n{'='*60}")
         print(f"Processing category: {category.upper()}")
         print(f"{'='*60}")
         
         category_lower = category.lower()
-        configured_limit = getattr(config, 'MAX_MARKETS_PER_CATEGORY', None)
-        limit = resolve_market_limit(category_lower, configured_limit)
-
-        if limit is None:
-            print(f"  Fetching all available {category} entries")
+        planned = journal.planned_markets(category_lower) if journal is not None else None
+        if planned is not None:
+            markets = planned
+            print(f"  Resuming run {journal.run_id}: {len(markets)} markets left")
         else:
-            print(f"  Limiting to top {limit} {category} entries")
-
-        # Fetch markets in this category
-        markets = api.get_markets_by_category(category, limit=limit)
-        if limit is not None:
-            markets = markets[:limit]
+            markets, skipped = _plan_category(api, category, refresh_policy, db_path)
+            if journal is not None:
+                journal.plan(category_lower, markets, skipped)
         
         if len(markets) > 1 and max_workers > 1:
             print(f"  Using up to {max_workers} workers for parallel detail fetches")
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            with nullcontext(executor) if executor is not None else ThreadPoolExecutor(max_workers=max_workers) as workers:
+                # Workers return once fetched; this thread waits for the
+                # indicator pool, so the fetch threads never do
                 future_to_index = {
-                    executor.submit(_build_market_record, category, market, request_delay): idx
+                    workers.submit(
+                        _fetch_market_record, category, market, request_delay, indicator_pool
+                    ): idx
                     for idx, market in enumerate(markets, 1)
                 }
 
                 for future in as_completed(future_to_index):
                     idx = future_to_index[future]
                     try:
-                        market_data = future.result()
+                        fetched = future.result()
+                        market_data = _with_indicators(*fetched) if fetched is not None else None
                     except Exception as exc:
                         print(f"  [{idx}/{len(markets)}] [WARNING] Failed to process market: {exc}")
                         continue
 
                     if market_data is not None:
                         print(f"  [{idx}/{len(markets)}] Completed {market_data['Name']} ({market_data['Symbol']})")
-                        all_data.append(market_data)
-                        total_markets += 1
+                        sink(market_data)
+                        processed += 1
         else:
             for idx, market in enumerate(markets, 1):
                 epic = market.get('epic')
                 name = market.get('instrumentName', epic)
                 
                 print(f"  [{idx}/{len(markets)}] Processing {name} ({epic})...")
-                market_data = _build_market_record(category, market, request_delay)
+                market_data = _build_market_record(category, market, request_delay, indicator_pool)
                 
                 if market_data is None:
                     continue
 
-                all_data.append(market_data)
-                total_markets += 1
+                sink(market_data)
+                processed += 1
                 
                 # Ping session every 20 requests to keep it alive
                 if idx % 20 == 0:
                     api.ping()
 
         api.ping()
-    
-    print(f"\n{'='*60}")
-    print(f"[OK] Completed! Processed {total_markets} markets across {len(categories)} categories")
-    print(f"{'='*60}\n")
-    
-    return all_data
+
+    return processed
+
+
+CSV_FIELDS = [
+    'Category',
+    'Symbol',
+    'Name',
+    'Current Price',
+    'Currency',
+    'Price Change %',
+    'Perf % 30M',
+    'Perf % 1H',
+    'Perf % 4H',
+    'Perf % 6H',
+    'Perf % 1D',
+    'Perf % 1W',
+    'Perf % 1M',
+    'Perf % 3M',
+    'Perf % 6M',
+    'Perf % YTD',
+    'Perf % 1Y',
+    'Perf % 5Y',
+    'Perf % 10Y',
+    'RSI 1H',
+    'RSI 4H',
+    'RSI 24H',
+    'RSI 1W',
+    'RSI 1M',
+    'RSI 3M',
+    'RSI 6M',
+    'RSI YTD',
+    'Market Status',
+    'Type',
+]
+
+# Display formatter for each numeric CSV column; records carry floats or None
+# and are formatted only here, on the way out.
+_DISPLAY_FORMATTERS = {
+    field: format_rsi if field.startswith('RSI ') else format_percentage
+    for field in CSV_FIELDS
+    if field.startswith(('RSI ', 'Perf % ')) or field == 'Price Change %'
+}
+
+
+def format_record(record: dict) -> dict:
+    """A copy of an analyzer record with its metrics as display strings."""
+    formatted = dict(record)
+    for field, fmt in _DISPLAY_FORMATTERS.items():
+        value = record.get(field)
+        if not isinstance(value, str):
+            formatted[field] = fmt(value)
+    if formatted.get('Current Price') is None:
+        formatted['Current Price'] = 'N/A'
+    return formatted
 
 
 def export_to_csv(data: list, filename: str):
@@ -389,44 +1186,12 @@ def export_to_csv(data: list, filename: str):
         print("[ERROR] No data to export")
         return
     
-    # Define column order
-    fieldnames = [
-        'Category',
-        'Symbol',
-        'Name',
-        'Current Price',
-        'Currency',
-        'Price Change %',
-        'Perf % 30M',
-        'Perf % 1H',
-        'Perf % 4H',
-        'Perf % 6H',
-        'Perf % 1D',
-        'Perf % 1W',
-        'Perf % 1M',
-        'Perf % 3M',
-        'Perf % 6M',
-        'Perf % YTD',
-        'Perf % 1Y',
-        'Perf % 5Y',
-        'Perf % 10Y',
-        'RSI 1H',
-        'RSI 4H',
-        'RSI 24H',
-        'RSI 1W',
-        'RSI 1M',
-        'RSI 3M',
-        'RSI 6M',
-        'RSI YTD',
-        'Market Status',
-        'Type',
-    ]
     
     try:
         with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=CSV_FIELDS, restval='N/A', extrasaction='ignore')
             writer.writeheader()
-            writer.writerows(data)
+            writer.writerows(format_record(row) for row in data)
         
         print(f"[OK] Data exported to: {filename}")
         print(f"  Total rows: {len(data)}")
@@ -434,8 +1199,22 @@ def export_to_csv(data: list, filename: str):
         print(f"[ERROR] Error exporting to CSV: {str(e)}")
 
 
+def export_formats() -> set:
+    """The export file formats selected by EXPORT_FORMATS ('csv', 'parquet')."""
+    return {fmt.lower() for fmt in getattr(config, 'EXPORT_FORMATS', ['csv'])}
+
+
+def export_records(data: list, filename: str, formats: set | None = None):
+    """Export records as CSV and/or Parquet; filename is the CSV path."""
+    formats = export_formats() if formats is None else formats
+    if 'csv' in formats:
+        export_to_csv(data, filename)
+    if 'parquet' in formats:
+        export_to_parquet(data, parquet_path(filename))
+
+
 def export_to_category_files(data: list, categories: list | None = None, output_dir: str = 'category_exports'):
-    """Write a separate CSV file per category for easy per-category storage."""
+    """Write a separate file per category (EXPORT_FORMATS) for easy per-category storage."""
     if not data:
         return
 
@@ -455,57 +1234,117 @@ def export_to_category_files(data: list, categories: list | None = None, output_
     for category_name, rows in grouped.items():
         safe_name = ''.join(ch if ch.isalnum() else '_' for ch in category_name.lower()).strip('_') or 'unknown'
         file_path = os.path.join(output_dir, f"{safe_name}.csv")
-        export_to_csv(rows, file_path)
+        export_records(rows, file_path)
 
 
-def main():
-    """Main execution function"""
-    parser = argparse.ArgumentParser(description="Capital.com Market Analyzer")
-    parser.add_argument('--categories', nargs='+', help='Categories to process')
-    args = parser.parse_args()
+def _run_categories(
+    api: CapitalAPI,
+    categories: list,
+    db_path: str,
+    incremental: bool = False,
+    journal: RunJournal | None = None,
+    executor: ThreadPoolExecutor | None = None,
+    indicator_pool: IndicatorPool | None = None,
+):
+    """
+    Journal, fetch, stream and publish one run over the given categories.
 
-    target_categories = args.categories if args.categories else config.CATEGORIES
+    Returns (writer, journal, completed) where completed counts the run's
+    epics that were written or deliberately kept.
+    """
+    refresh_policy = None
+    if incremental:
+        refresh_policy = RefreshPolicy.load(db_path, getattr(config, 'FRESHNESS_SECONDS', None))
+
+    if journal is None:
+        journal = RunJournal.start(db_path, categories)
+
+    # Fetch and analyze markets, streaming records into the database (primary storage)
+    writer = MarketWriter(
+        db_path,
+        batch_size=int(getattr(config, 'WRITE_BATCH_SIZE', 25)),
+        journal=journal,
+    ).start()
+    try:
+        fetch_and_analyze_markets(
+            api, categories, refresh_policy, writer=writer, journal=journal,
+            executor=executor, indicator_pool=indicator_pool, db_path=db_path,
+        )
+    finally:
+        # Keep whatever completed, even if the run is interrupted
+        writer.stop()
+        record_governor_latency(db_path)
+
+    completed, _ = journal.progress()
+    if completed:
+        print("\nPublishing data to database...")
+        writer.publish(
+            categories=categories,
+            retain_symbols=refresh_policy.retained if refresh_policy else None,
+        )
+    return writer, journal, completed
+
+
+def run_analysis(
+    categories: list | None = None,
+    db_path: str = 'market_data.db',
+    incremental: bool = False,
+    resume: bool = False,
+) -> dict:
+    """
+    Run one full analyzer pass in-process: fetch, stream into the database,
+    publish and write the CSV backups.
+
+    Used by the command line and by the web app's background worker.
+
+    Returns:
+        Summary dict with success, markets_processed, duration and run_id
+    """
+    target_categories = categories if categories else config.CATEGORIES
+
+    # Initialize database (the journal lives in it)
+    print("\nInitializing SQLite database...")
+    init_database(db_path)
+
+    journal = None
+    if resume:
+        journal = resume_journal(db_path)
+        if journal is None:
+            print("[WARNING] No interrupted run to resume; starting a new run")
+        else:
+            target_categories = journal.categories
+            completed, planned = journal.progress()
+            print(f"[OK] Resuming run {journal.run_id}: {completed}/{planned} planned markets already done")
 
     print("="*60)
     print("Capital.com Market Analyzer")
     print("="*60)
     print(f"Environment: {'DEMO' if config.USE_DEMO else 'LIVE'}")
     print(f"Categories: {', '.join(target_categories)}")
-    print(f"Database: market_data.db (primary storage)")
+    print(f"Database: {db_path} (primary storage)")
     print("="*60)
     
-    # Initialize database
-    print("\nInitializing SQLite database...")
-    init_database('market_data.db')
-    
     # Initialize API client
     print("Initializing API client...")
-    api = CapitalAPI(
-        api_key=config.API_KEY,
-        identifier=config.USERNAME,
-        password=config.PASSWORD,
-        demo=config.USE_DEMO
-    )
+    api = create_api()
     
     # Create session
     if not api.create_session():
         print("[ERROR] Failed to create session. Please check your credentials.")
-        return
+        return {'success': False, 'error': 'Failed to create session'}
     
-    # Fetch and analyze markets
     start_time = datetime.now()
-    market_data = fetch_and_analyze_markets(api, target_categories)
+    writer, journal, completed = _run_categories(
+        api, target_categories, db_path, incremental=incremental, journal=journal
+    )
     end_time = datetime.now()
-    
-    # Store to database (primary storage)
-    if market_data:
-        print("\nStoring data to database...")
-        store_to_database(market_data, 'market_data.db', categories=target_categories)
+
+    market_data = load_market_records(db_path, target_categories) if completed else []
     
     # Also export to CSV for backup
     if market_data:
         print("Exporting data to CSV (backup)...")
-        export_to_csv(market_data, config.OUTPUT_FILENAME)
+        export_records(market_data, config.OUTPUT_FILENAME)
         export_to_category_files(market_data, target_categories)
     
     # Print summary
@@ -514,21 +1353,164 @@ def main():
     print(f"Execution Summary")
     print(f"{'='*60}")
     print(f"Total time: {duration:.2f} seconds")
-    print(f"Markets processed: {len(market_data)}")
-    print(f"Categories: {len(config.CATEGORIES)}")
-    print(f"Primary database: market_data.db")
+    print(f"Markets processed: {writer.written}")
+    print(f"Categories: {len(target_categories)}")
+    print(f"Primary database: {db_path}")
     print(f"Backup CSV: {config.OUTPUT_FILENAME}")
     print(f"{'='*60}\n")
     
     print("[OK] Analysis complete! Data saved to database and CSV file.")
     print("You can now view the data using the web viewer (app.py) or open the CSV file.")
 
+    return {
+        'success': bool(completed),
+        'markets_processed': writer.written,
+        'duration': duration,
+        'run_id': journal.run_id,
+    }
+
+
+def run_daemon(
+    categories: list | None = None,
+    db_path: str = 'market_data.db',
+    incremental: bool = False,
+    stop_event: threading.Event | None = None,
+):
+    """
+    Stay resident and refresh each category on its own cadence
+    (CATEGORY_REFRESH_SECONDS), keeping one API session, the worker threads
+    (and their sessions) and the indicator processes alive between jobs.
+    """
+    target_categories = categories if categories else config.CATEGORIES
+    stop_event = stop_event or threading.Event()
+    keepalive_seconds = 5 * 60
+
+    init_database(db_path)
+    api = create_api()
+    if not api.create_session():
+        print("[ERROR] Failed to create session. Please check your credentials.")
+        return
+
+    scheduler = CategoryScheduler(target_categories, getattr(config, 'CATEGORY_REFRESH_SECONDS', None))
+    print("[OK] Daemon started. Refresh cadences:")
+    for category, cadence in sorted(scheduler.cadences.items(), key=lambda item: item[1]):
+        print(f"  {category:20s} every {cadence / 60:.0f} min")
+
+    max_workers = resolve_worker_count()
+    indicator_pool = create_indicator_pool()
+    last_ping = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while not stop_event.is_set():
+                job = scheduler.pop_due()
+                if job is None:
+                    if time.time() - last_ping >= keepalive_seconds:
+                        api.ping()
+                        last_ping = time.time()
+                    due, _ = scheduler.peek()
+                    stop_event.wait(max(0.0, min(due - time.time(), keepalive_seconds)))
+                    continue
+
+                due, category = job
+                print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Refreshing {category}")
+                try:
+                    _, _, completed = _run_categories(
+                        api, [category], db_path, incremental=incremental,
+                        executor=executor, indicator_pool=indicator_pool,
+                    )
+                    if completed:
+                        export_to_category_files(load_market_records(db_path, [category]), [category])
+                except Exception as e:
+                    print(f"[ERROR] Refresh of {category} failed: {e}")
+                last_ping = time.time()
+                next_due = scheduler.reschedule(category, due)
+                print(f"  Next {category} refresh at {datetime.fromtimestamp(next_due).strftime('%H:%M:%S')}")
+    finally:
+        if indicator_pool is not None:
+            indicator_pool.shutdown()
+        print("[OK] Daemon stopped")
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description="Capital.com Market Analyzer")
+    parser.add_argument('--categories', nargs='+', help='Categories to process')
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Only refetch markets that are stale and still trading (see FRESHNESS_SECONDS)',
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue the last interrupted run, fetching only its remaining markets',
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Stay resident and refresh each category on its own cadence (see CATEGORY_REFRESH_SECONDS)',
+    )
+    parser.add_argument(
+        '--shards',
+        type=int,
+        metavar='N',
+        help='Fetch with N worker processes, each owning a hash partition of the epics',
+    )
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Print request counts and an ETA from cached navigation data without calling the API',
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    query_parser = subparsers.add_parser(
+        'query',
+        help='Run SQL over the Parquet exports (view "markets") and the snapshot history (view "snapshots")',
+    )
+    query_parser.add_argument('sql', help='e.g. "SELECT category, avg(perf_1m_pct) FROM markets GROUP BY 1"')
+    query_parser.add_argument('--db', default='market_data.db', help='Database holding the snapshot history')
+    query_parser.add_argument('--export-dir', default='category_exports', help='Directory of per-category Parquet exports')
+    query_parser.add_argument('--symbol', nargs='+', dest='symbols', help='Load only these symbols into "snapshots"')
+    query_parser.add_argument('--since', help='Load "snapshots" from this UTC date/time, or e.g. 24h / 7d ago')
+    query_parser.add_argument('--until', help='Load "snapshots" before this UTC date/time, or e.g. 1d ago')
+    args = parser.parse_args()
+
+    if args.command == 'query':
+        try:
+            result = run_query(
+                args.sql, db_path=args.db, export_dir=args.export_dir,
+                output_file=parquet_path(config.OUTPUT_FILENAME),
+                symbols=args.symbols,
+                since=parse_since(args.since) if args.since else None,
+                until=parse_since(args.until) if args.until else None,
+            )
+        except (RuntimeError, ValueError) as e:
+            print(f"[ERROR] {e}")
+            return
+        print(result.to_string(index=False))
+        return
+
+    if args.plan:
+        plan_run(args.categories, incremental=args.incremental, resume=args.resume, shards=args.shards)
+        return
+
+    if args.shards:
+        from shard_coordinator import run_sharded
+        run_sharded(args.categories, args.shards, incremental=args.incremental, resume=args.resume)
+        return
+
+    if args.daemon:
+        run_daemon(args.categories, incremental=args.incremental)
+        return
+
+    run_analysis(args.categories, incremental=args.incremental, resume=args.resume)
+
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
         print("\n\n[ERROR] Process interrupted by user")
+        print("Completed markets were saved; run with --resume to continue.")
     except Exception as e:
         print(f"\n[ERROR] Unexpected error: {str(e)}")
         import traceback
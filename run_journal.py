@@ -0,0 +1,218 @@
+"""
+Checkpoint journal for analyzer runs
+
+Records each run's planned epics per category and marks them done in the
+same transaction that writes their market rows, so an interrupted run can
+be resumed with only the remaining epics (run_analyzer.py --resume).
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+from typing import List, Optional
+
+PENDING = 'pending'
+DONE = 'done'
+SKIPPED = 'skipped'
+
+# Seconds to wait for the write lock when several shard workers share the file
+BUSY_TIMEOUT = 30
+
+
+def ensure_done_epics_table(conn):
+    """Create the table a category shard collects done epics in until publish."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS run_epics_done (
+            run_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            PRIMARY KEY (run_id, symbol)
+        ) WITHOUT ROWID
+    ''')
+
+
+def merge_done_epics(conn, schema: str):
+    """Mark done the epics an attached shard collected, then clear them there."""
+    conn.execute(
+        f'''
+        UPDATE run_epics SET state = ?
+        FROM {schema}.run_epics_done AS d
+        WHERE run_epics.run_id = d.run_id AND run_epics.symbol = d.symbol
+        ''',
+        (DONE,),
+    )
+    conn.execute(f'DELETE FROM {schema}.run_epics_done')
+
+
+class RunJournal:
+    """One analyzer run's plan and per-epic progress."""
+
+    def __init__(self, db_path: str, run_id: int, categories: List[str]):
+        self.db_path = db_path
+        self.run_id = run_id
+        self.categories = categories
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+
+    @classmethod
+    def start(cls, db_path: str, categories: List[str]) -> 'RunJournal':
+        """Open a new run for the given categories."""
+        categories = [c.lower() for c in categories]
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+        try:
+            with conn:
+                # A new run supersedes any earlier unfinished one; resuming that
+                # plan later would replay a stale market listing
+                conn.execute(
+                    "UPDATE analyzer_runs SET status = 'abandoned', finished_at = ? WHERE status = 'running'",
+                    (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),),
+                )
+                cur = conn.execute(
+                    'INSERT INTO analyzer_runs (started_at, status, categories) VALUES (?, ?, ?)',
+                    (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'running', json.dumps(categories)),
+                )
+                run_id = cur.lastrowid
+        finally:
+            conn.close()
+        return cls(db_path, run_id, categories)
+
+    @classmethod
+    def resume(cls, db_path: str) -> Optional['RunJournal']:
+        """The most recent run if it is unfinished, or None."""
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+        try:
+            row = conn.execute(
+                'SELECT run_id, categories, status FROM analyzer_runs ORDER BY run_id DESC LIMIT 1'
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None or row[2] != 'running':
+            return None
+        return cls(db_path, row[0], json.loads(row[1]))
+
+    def planned_markets(self, category: str) -> Optional[list]:
+        """Pending markets of an already planned category, or None if unplanned."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT symbol, name, market_status, state FROM run_epics '
+                'WHERE run_id = ? AND category = ?',
+                (self.run_id, category.lower()),
+            ).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return None
+        return [
+            {'epic': symbol, 'instrumentName': name, 'marketStatus': status}
+            for symbol, name, status, state in rows
+            if state == PENDING
+        ]
+
+    def pending_markets(self) -> list:
+        """(category, market) pairs still pending across all planned categories."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT category, symbol, name, market_status FROM run_epics '
+                'WHERE run_id = ? AND state = ? ORDER BY category, symbol',
+                (self.run_id, PENDING),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            (category, {'epic': symbol, 'instrumentName': name, 'marketStatus': status})
+            for category, symbol, name, status in rows
+        ]
+
+    def plan(self, category: str, markets: list, skipped: list | None = None):
+        """Record a category's epics: markets to fetch and skipped (kept) ones."""
+        category = category.lower()
+        rows = [
+            (self.run_id, m.get('epic'), category, m.get('instrumentName'), m.get('marketStatus'), state)
+            for state, group in ((PENDING, markets), (SKIPPED, skipped or []))
+            for m in group
+            if m.get('epic')
+        ]
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO run_epics '
+                    '(run_id, symbol, category, name, market_status, state) VALUES (?, ?, ?, ?, ?, ?)',
+                    rows,
+                )
+        finally:
+            conn.close()
+
+    def mark_done(self, conn, symbols):
+        """Mark epics complete on the caller's (market write) transaction."""
+        conn.executemany(
+            'UPDATE run_epics SET state = ? WHERE run_id = ? AND symbol = ?',
+            ((DONE, self.run_id, symbol) for symbol in symbols),
+        )
+
+    def collect_done(self, shard, symbols):
+        """Record epics complete on a category shard's transaction (see merge_done_epics)."""
+        shard.executemany(
+            'INSERT OR IGNORE INTO run_epics_done (run_id, symbol) VALUES (?, ?)',
+            ((self.run_id, symbol) for symbol in symbols),
+        )
+
+    def kept_symbols(self, conn) -> List[str]:
+        """Epics this run wrote or deliberately skipped, across all sessions."""
+        return [row[0] for row in conn.execute(
+            'SELECT symbol FROM run_epics WHERE run_id = ? AND state != ?',
+            (self.run_id, PENDING),
+        )]
+
+    def progress(self) -> tuple:
+        """(completed or skipped, planned) epic counts."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT SUM(state != ?), COUNT(*) FROM run_epics WHERE run_id = ?',
+                (PENDING, self.run_id),
+            ).fetchone()
+        finally:
+            conn.close()
+        return (row[0] or 0, row[1] or 0)
+
+    def report_shard(self, shard: int, status: str, written: int = 0):
+        """Record a shard worker's status ('running', 'done' or 'failed')."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    '''
+                    INSERT INTO run_shards (run_id, shard, status, written, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(run_id, shard) DO UPDATE SET
+                        status = excluded.status,
+                        written = excluded.written,
+                        updated_at = excluded.updated_at
+                    ''',
+                    (self.run_id, shard, status, written, datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+                )
+        finally:
+            conn.close()
+
+    def shard_statuses(self) -> dict:
+        """{shard: (status, written)} for this run."""
+        conn = self._connect()
+        try:
+            return {
+                shard: (status, written)
+                for shard, status, written in conn.execute(
+                    'SELECT shard, status, written FROM run_shards WHERE run_id = ?', (self.run_id,)
+                )
+            }
+        finally:
+            conn.close()
+
+    def finish(self, conn):
+        """Mark the run completed on the caller's (publish) transaction."""
+        conn.execute(
+            "UPDATE analyzer_runs SET status = 'completed', finished_at = ? WHERE run_id = ?",
+            (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.run_id),
+        )
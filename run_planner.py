@@ -0,0 +1,261 @@
+"""
+Offline run planning (run_analyzer.py --plan)
+
+Every run caches the epics it navigated per category, and the number of
+navigation nodes it visited. It also records recent per-endpoint API
+latencies. From that cache, the configured metrics and the refresh or
+journal state, the planner counts the HTTP requests a run would make per
+endpoint and estimates its duration. It makes no API calls.
+"""
+
+import math
+import sqlite3
+from datetime import datetime
+
+from capital_analyzer import PERFORMANCE_HORIZONS, RSI_SERIES
+from refresh_policy import RefreshPolicy
+from run_journal import RunJournal
+
+# Requests _build_market_record makes per market: details twice (once for
+# the record, once for the current price in calculate_performance), one
+# /prices call per performance horizon and one per RSI series.
+MARKET_REQUESTS = {
+    'markets': 2,
+    'prices': len(PERFORMANCE_HORIZONS) + len(RSI_SERIES),
+}
+NAVIGATION_DELAY = 0.05        # sleep after each navigation node
+DEFAULT_LATENCY_SECONDS = 0.3  # assumed per request before any run was observed
+
+
+def cache_navigation(db_path: str, category: str, markets: list, nodes: int):
+    """Replace a category's cached epic list with the one just navigated."""
+    category = category.lower()
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            conn.execute('DELETE FROM navigation_cache WHERE category = ?', (category,))
+            conn.executemany(
+                'INSERT OR IGNORE INTO navigation_cache (category, symbol, name, market_status) '
+                'VALUES (?, ?, ?, ?)',
+                [
+                    (category, m.get('epic'), m.get('instrumentName'), m.get('marketStatus'))
+                    for m in markets if m.get('epic')
+                ],
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO navigation_categories (category, nodes, markets, cached_at) '
+                'VALUES (?, ?, ?, ?)',
+                (category, nodes, len(markets), datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            )
+    finally:
+        conn.close()
+
+
+def record_api_latency(db_path: str, stats: dict, concurrency: int | None = None):
+    """Store the latest per-endpoint latency stats (from ApiGovernor.latency_stats)."""
+    if not stats:
+        return
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO api_latency '
+                '(endpoint, samples, mean_seconds, p95_seconds, concurrency, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (endpoint, s['samples'], s['mean'], s['p95'], concurrency, now)
+                    for endpoint, s in stats.items()
+                ],
+            )
+    finally:
+        conn.close()
+
+
+def _load_cache(conn, category: str):
+    row = conn.execute(
+        'SELECT nodes, cached_at FROM navigation_categories WHERE category = ?', (category,)
+    ).fetchone()
+    if row is None:
+        return None
+    markets = [
+        {'epic': symbol, 'instrumentName': name, 'marketStatus': status}
+        for symbol, name, status in conn.execute(
+            'SELECT symbol, name, market_status FROM navigation_cache WHERE category = ? ORDER BY rowid',
+            (category,),
+        )
+    ]
+    return {'nodes': row[0], 'cached_at': row[1], 'markets': markets}
+
+
+def build_plan(
+    db_path: str,
+    categories: list,
+    workers: int,
+    request_delay: float,
+    limit_for=None,
+    freshness: dict | None = None,
+    incremental: bool = False,
+    resume: bool = False,
+    shards: int = 1,
+    concurrency: int | None = None,
+) -> dict:
+    """
+    Count the requests a run would make and estimate its duration.
+
+    workers is the worker threads per process and concurrency the requests
+    in flight per process (defaults to workers; the limit the adaptive
+    governor last settled on wins when one was recorded).
+    limit_for(category) gives the configured market cap (None = all). With
+    incremental, cached markets go through the refresh policy; with resume,
+    the last unfinished run's pending epics are counted instead and its
+    already planned categories need no navigation.
+
+    Returns:
+        Dict with categories (per-category rows), requests (per endpoint),
+        eta_seconds, latencies and uncached (categories with no cache)
+    """
+    journal = RunJournal.resume(db_path) if resume else None
+    pending = {}
+    if journal is not None:
+        categories = journal.categories
+        for category, market in journal.pending_markets():
+            pending.setdefault(category, []).append(market)
+    refresh_policy = RefreshPolicy.load(db_path, freshness) if incremental else None
+
+    conn = sqlite3.connect(db_path)
+    try:
+        caches = {c.lower(): _load_cache(conn, c.lower()) for c in categories}
+        latencies = {
+            endpoint: {'mean': mean, 'p95': p95, 'samples': samples, 'concurrency': concurrency,
+                       'updated_at': updated_at}
+            for endpoint, samples, mean, p95, concurrency, updated_at in conn.execute(
+                'SELECT endpoint, samples, mean_seconds, p95_seconds, concurrency, updated_at FROM api_latency'
+            )
+        }
+    finally:
+        conn.close()
+
+    rows = []
+    uncached = []
+    requests = {'session': 1, 'marketnavigation': 0, 'markets': 0, 'prices': 0, 'ping': 0}
+    total_markets = 0
+    serial_client = False
+    for category in (c.lower() for c in categories):
+        cache = caches.get(category)
+        planned = journal.planned_markets(category) if journal is not None else None
+        if planned is not None:
+            to_fetch, skipped, nodes = pending.get(category, []), [], 0
+        elif cache is None:
+            uncached.append(category)
+            continue
+        else:
+            markets = cache['markets']
+            limit = limit_for(category) if limit_for else None
+            if limit is not None:
+                markets = markets[:limit]
+            to_fetch, skipped = refresh_policy.split(category, markets) if refresh_policy else (markets, [])
+            nodes = cache['nodes']
+
+        n = len(to_fetch)
+        total_markets += n
+        requests['marketnavigation'] += nodes
+        requests['markets'] += n * MARKET_REQUESTS['markets']
+        requests['prices'] += n * MARKET_REQUESTS['prices']
+        if shards <= 1:
+            # A fresh worker pool (one session per thread) per category; serial
+            # categories share one extra client and ping every 20 markets
+            parallel_category = n > 1 and workers > 1
+            requests['session'] += min(workers, n) if parallel_category else 0
+            serial_client = serial_client or (n > 0 and not parallel_category)
+            requests['ping'] += 1 + (0 if parallel_category else n // 20)
+        rows.append({
+            'category': category,
+            'cached': len(cache['markets']) if cache else None,
+            'cached_at': cache['cached_at'] if cache else None,
+            'to_fetch': n,
+            'skipped': len(skipped),
+            'nodes': nodes,
+        })
+    if shards > 1:
+        # Each shard runs one pool over its whole partition and does not ping
+        requests['session'] += shards * min(workers, math.ceil(total_markets / shards))
+    elif serial_client:
+        requests['session'] += 1
+
+    def latency(endpoint):
+        observed = latencies.get(endpoint)
+        return observed['mean'] if observed else DEFAULT_LATENCY_SECONDS
+
+    observed_limits = [l['concurrency'] for l in latencies.values() if l['concurrency']]
+    in_flight = max(observed_limits) if observed_limits else (concurrency or workers)
+    in_flight = max(1, min(in_flight, workers)) * max(1, shards)
+
+    # Navigation is sequential; market requests run in_flight wide and each
+    # worker thread sleeps request_delay before its market
+    market_seconds = sum(count * latency(endpoint) for endpoint, count in MARKET_REQUESTS.items())
+    eta = (
+        requests['marketnavigation'] * (latency('marketnavigation') + NAVIGATION_DELAY)
+        + requests['ping'] * latency('ping')
+        + requests['session'] * latency('session') / in_flight
+        + total_markets * market_seconds / in_flight
+        + total_markets * request_delay / (workers * max(1, shards))
+    )
+    return {
+        'categories': rows,
+        'requests': requests,
+        'markets': total_markets,
+        'eta_seconds': eta,
+        'latencies': latencies,
+        'uncached': uncached,
+        'workers': workers,
+        'in_flight': in_flight,
+        'shards': shards,
+        'run_id': journal.run_id if journal is not None else None,
+    }
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+
+def print_plan(plan: dict):
+    """Print a plan from build_plan."""
+    print("="*60)
+    print("Run plan (no API calls)")
+    print("="*60)
+    if plan['run_id'] is not None:
+        print(f"Resuming run {plan['run_id']}")
+    print(f"{'Category':20s} {'Cached':>7s} {'Fetch':>7s} {'Skip':>6s} {'Nodes':>6s}  Cached at")
+    for row in plan['categories']:
+        cached = '-' if row['cached'] is None else str(row['cached'])
+        print(f"{row['category']:20s} {cached:>7s} {row['to_fetch']:>7d} {row['skipped']:>6d} "
+              f"{row['nodes']:>6d}  {row['cached_at'] or '-'}")
+    for category in plan['uncached']:
+        print(f"{category:20s} {'-':>7s} {'?':>7s} {'?':>6s} {'?':>6s}  not cached yet (run once to populate)")
+
+    print("\nRequests by endpoint:")
+    for endpoint, count in plan['requests'].items():
+        print(f"  {endpoint:18s} {count:>8d}")
+    print(f"  {'total':18s} {sum(plan['requests'].values()):>8d}")
+
+    if plan['latencies']:
+        observed = max(l['updated_at'] for l in plan['latencies'].values())
+        source = f"latencies observed {observed}"
+    else:
+        source = f"assumed {DEFAULT_LATENCY_SECONDS * 1000:.0f}ms per request (no run observed yet)"
+    width = f"{plan['in_flight']} requests in flight"
+    if plan['shards'] > 1:
+        width += f" over {plan['shards']} shards"
+    print(f"\nEstimated duration: {_format_duration(plan['eta_seconds'])} "
+          f"for {plan['markets']} markets ({width}, {source})")
+    if plan['uncached']:
+        print("[WARNING] Estimate excludes uncached categories: " + ', '.join(plan['uncached']))
+    print("="*60)
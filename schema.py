@@ -0,0 +1,513 @@
+"""
+Schema and migrations for market_data.db shared by the analyzer and the web app
+
+PRAGMA user_version records how many MIGRATIONS a database file has applied.
+migrate() runs at startup (init_database / the app's init_db): an up-to-date
+file costs one PRAGMA read, and the write paths never re-inspect the table.
+New tables, columns and indexes go in as a new migration appended to the list.
+Each migration spells out its own DDL instead of calling the modules' current
+helpers, so what an old migration does never changes for a file that has not
+run it yet.
+
+Composite (category, metric) indexes let per-category "best by metric"
+queries walk an index instead of scanning and sorting the markets table.
+"""
+
+from aggregates import refresh_aggregates
+from row_versions import VERSION_KEY
+from search import ensure_search_index, fts5_available, has_search_index
+
+PERF_COLUMNS = (
+    'price_change_pct',
+    'perf_1w_pct',
+    'perf_1m_pct',
+    'perf_3m_pct',
+    'perf_6m_pct',
+    'perf_ytd_pct',
+    'perf_1y_pct',
+    'perf_5y_pct',
+    'perf_10y_pct',
+)
+
+RSI_COLUMNS = (
+    'rsi_1h',
+    'rsi_4h',
+    'rsi_24h',
+    'rsi_1w',
+    'rsi_1m',
+    'rsi_3m',
+    'rsi_6m',
+    'rsi_ytd',
+)
+
+INDEXED_METRICS = PERF_COLUMNS + RSI_COLUMNS
+
+# (column, declaration) for every markets column after `id`, in table order
+MARKETS_COLUMNS = (
+    ('category', 'TEXT NOT NULL'),
+    ('symbol', 'TEXT NOT NULL UNIQUE'),
+    ('name', 'TEXT NOT NULL'),
+    ('current_price', 'REAL'),
+    ('currency', 'TEXT'),
+    ('price_change_pct', 'REAL'),
+    ('perf_1w_pct', 'REAL'),
+    ('perf_1m_pct', 'REAL'),
+    ('perf_3m_pct', 'REAL'),
+    ('perf_6m_pct', 'REAL'),
+    ('perf_ytd_pct', 'REAL'),
+    ('perf_1y_pct', 'REAL'),
+    ('perf_5y_pct', 'REAL'),
+    ('perf_10y_pct', 'REAL'),
+    ('rsi_24h', 'REAL'),
+    ('rsi_1w', 'REAL'),
+    ('rsi_1m', 'REAL'),
+    ('rsi_3m', 'REAL'),
+    ('rsi_6m', 'REAL'),
+    ('rsi_ytd', 'REAL'),
+    ('rsi_1h', 'REAL'),
+    ('rsi_4h', 'REAL'),
+    ('rsi_1y', 'REAL'),
+    ('rsi_5y', 'REAL'),
+    ('rsi_10y', 'REAL'),
+    ('market_status', 'TEXT'),
+    ('type', 'TEXT'),
+    ('last_updated', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'),
+    ('content_hash', 'INTEGER'),
+    ('row_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('perf_1d_pct', 'REAL'),
+)
+
+MARKETS_STAGING = 'markets_staging'
+
+# The markets layout migration 1 creates; later columns come from their own
+# migrations
+_V1_MARKETS_COLUMNS = (
+    ('category', 'TEXT NOT NULL'),
+    ('symbol', 'TEXT NOT NULL UNIQUE'),
+    ('name', 'TEXT NOT NULL'),
+    ('current_price', 'REAL'),
+    ('currency', 'TEXT'),
+    ('price_change_pct', 'REAL'),
+    ('perf_1w_pct', 'REAL'),
+    ('perf_1m_pct', 'REAL'),
+    ('perf_3m_pct', 'REAL'),
+    ('perf_6m_pct', 'REAL'),
+    ('perf_ytd_pct', 'REAL'),
+    ('perf_1y_pct', 'REAL'),
+    ('perf_5y_pct', 'REAL'),
+    ('perf_10y_pct', 'REAL'),
+    ('rsi_24h', 'REAL'),
+    ('rsi_1w', 'REAL'),
+    ('rsi_1m', 'REAL'),
+    ('rsi_3m', 'REAL'),
+    ('rsi_6m', 'REAL'),
+    ('rsi_ytd', 'REAL'),
+    ('rsi_1h', 'REAL'),
+    ('rsi_4h', 'REAL'),
+    ('rsi_1y', 'REAL'),
+    ('rsi_5y', 'REAL'),
+    ('rsi_10y', 'REAL'),
+    ('market_status', 'TEXT'),
+    ('type', 'TEXT'),
+    ('last_updated', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'),
+)
+
+# Columns of the pre-REAL layout database.py used to create: TEXT "1.23%"
+# values under names without the _pct suffix
+_LEGACY_TEXT_COLUMNS = {
+    'price_change_pct': 'price_change_pct',
+    'perf_1w': 'perf_1w_pct',
+    'perf_1m': 'perf_1m_pct',
+    'perf_3m': 'perf_3m_pct',
+    'perf_6m': 'perf_6m_pct',
+    'perf_ytd': 'perf_ytd_pct',
+    'perf_1y': 'perf_1y_pct',
+    'perf_5y': 'perf_5y_pct',
+    'perf_10y': 'perf_10y_pct',
+}
+
+
+def _table_columns(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def create_markets_table(conn, table: str = 'markets', columns: tuple = MARKETS_COLUMNS):
+    declarations = ',\n'.join(f'            {name} {decl}' for name, decl in columns)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+{declarations}
+        )
+    ''')
+
+
+def _rebuild_legacy_markets(conn, existing: set):
+    """Copy a database.py-era markets table (TEXT percentages) into the REAL layout."""
+    conn.execute('ALTER TABLE markets RENAME TO markets_legacy')
+    create_markets_table(conn, columns=_V1_MARKETS_COLUMNS)
+    targets, sources = [], []
+    for name, _ in _V1_MARKETS_COLUMNS:
+        if name in existing and name not in _LEGACY_TEXT_COLUMNS:
+            targets.append(name)
+            sources.append(name)
+    for legacy, name in _LEGACY_TEXT_COLUMNS.items():
+        if legacy in existing:
+            targets.append(name)
+            sources.append(f"CAST(NULLIF(TRIM(REPLACE({legacy}, '%', '')), 'N/A') AS REAL)")
+    if 'updated_at' in existing:
+        targets.append('last_updated')
+        sources.append('updated_at')
+    conn.execute(f'''
+        INSERT INTO markets ({', '.join(targets)})
+        SELECT {', '.join(sources)} FROM markets_legacy
+        WHERE symbol IS NOT NULL
+    ''')
+    conn.execute('DROP TABLE markets_legacy')
+
+
+def _migrate_markets_table(conn):
+    """v1: markets and metadata in the REAL *_pct layout, upgrading older files."""
+    existing = _table_columns(conn, 'markets')
+    if not existing:
+        create_markets_table(conn, columns=_V1_MARKETS_COLUMNS)
+    elif 'perf_1w' in existing:
+        _rebuild_legacy_markets(conn, existing)
+    else:
+        # Files from before the RSI columns were added
+        for name, decl in _V1_MARKETS_COLUMNS:
+            if name not in existing:
+                conn.execute(f'ALTER TABLE markets ADD COLUMN {name} {decl}')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+_V2_FEATURE_TABLES = (
+    '''
+        CREATE TABLE IF NOT EXISTS market_ranks (
+            symbol TEXT NOT NULL,
+            category TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            value REAL NOT NULL,
+            category_rank INTEGER NOT NULL,
+            category_percentile REAL NOT NULL,
+            category_zscore REAL NOT NULL,
+            global_rank INTEGER NOT NULL,
+            global_percentile REAL NOT NULL,
+            global_zscore REAL NOT NULL,
+            PRIMARY KEY (metric, symbol)
+        )
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_market_ranks_category_pct
+        ON market_ranks (metric, category, category_percentile)
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_market_ranks_global_pct
+        ON market_ranks (metric, global_percentile)
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS daily_closes (
+            symbol TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            close REAL NOT NULL,
+            PRIMARY KEY (symbol, day)
+        ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_daily_closes_day ON daily_closes (day)',
+    '''
+        CREATE TABLE IF NOT EXISTS refresh_state (
+            symbol TEXT PRIMARY KEY,
+            category TEXT NOT NULL,
+            market_status TEXT,
+            last_refreshed REAL NOT NULL
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS analyzer_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            status TEXT NOT NULL,
+            categories TEXT NOT NULL
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS run_epics (
+            run_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            category TEXT NOT NULL,
+            name TEXT,
+            market_status TEXT,
+            state TEXT NOT NULL,
+            PRIMARY KEY (run_id, symbol)
+        )
+    ''',
+    '''
+        CREATE INDEX IF NOT EXISTS idx_run_epics_category
+        ON run_epics (run_id, category, state)
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS run_shards (
+            run_id INTEGER NOT NULL,
+            shard INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            written INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (run_id, shard)
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS navigation_cache (
+            category TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            name TEXT,
+            market_status TEXT,
+            PRIMARY KEY (category, symbol)
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS navigation_categories (
+            category TEXT PRIMARY KEY,
+            nodes INTEGER NOT NULL,
+            markets INTEGER NOT NULL,
+            cached_at TEXT NOT NULL
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS api_latency (
+            endpoint TEXT PRIMARY KEY,
+            samples INTEGER NOT NULL,
+            mean_seconds REAL NOT NULL,
+            p95_seconds REAL NOT NULL,
+            concurrency INTEGER,
+            updated_at TEXT NOT NULL
+        )
+    ''',
+)
+
+
+def _create_feature_tables(conn):
+    """v2: rankings (filled from the markets already stored), candle history, refresh state, journal and planner tables."""
+    # rankings imports the metric column constants from this module
+    from rankings import refresh_rankings
+
+    for statement in _V2_FEATURE_TABLES:
+        conn.execute(statement)
+    refresh_rankings(conn)
+
+
+_V3_INDEXED_METRICS = (
+    'price_change_pct', 'perf_1w_pct', 'perf_1m_pct', 'perf_3m_pct', 'perf_6m_pct',
+    'perf_ytd_pct', 'perf_1y_pct', 'perf_5y_pct', 'perf_10y_pct',
+    'rsi_1h', 'rsi_4h', 'rsi_24h', 'rsi_1w', 'rsi_1m', 'rsi_3m', 'rsi_6m', 'rsi_ytd',
+)
+
+
+def _create_market_indexes(conn):
+    """v3: (category, metric) indexes on markets."""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_markets_category ON markets (category)')
+    for column in _V3_INDEXED_METRICS:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_markets_category_{column} ON markets (category, {column})')
+
+
+_V4_SNAPSHOT_METRICS = (
+    'current_price', 'price_change_pct', 'perf_1w_pct', 'perf_1m_pct', 'perf_3m_pct',
+    'perf_6m_pct', 'perf_ytd_pct', 'perf_1y_pct', 'perf_5y_pct', 'perf_10y_pct',
+    'rsi_1h', 'rsi_4h', 'rsi_24h', 'rsi_1w', 'rsi_1m', 'rsi_3m', 'rsi_6m', 'rsi_ytd',
+)
+
+
+def _create_snapshot_tables(conn):
+    """v4: market_snapshots keyed by (day, symbol id, second), and snapshot_symbols."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_symbols (
+            symbol_id INTEGER PRIMARY KEY,
+            symbol TEXT NOT NULL UNIQUE
+        )
+    ''')
+    metrics = ',\n'.join(f'            {column} REAL' for column in _V4_SNAPSHOT_METRICS)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS market_snapshots (
+            day INTEGER NOT NULL,
+            symbol_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            run_id INTEGER,
+{metrics},
+            PRIMARY KEY (day, symbol_id, ts)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_market_snapshots_symbol
+        ON market_snapshots (symbol_id, ts)
+    ''')
+
+
+def ensure_market_indexes(conn):
+    """Create the (category, metric) indexes for every metric column present."""
+    existing = _table_columns(conn, 'markets')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_markets_category ON markets (category)')
+    for column in INDEXED_METRICS:
+        if column in existing:
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_markets_category_{column} ON markets (category, {column})'
+            )
+    if 'row_version' in existing:
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_markets_row_version ON markets (row_version)')
+
+
+def create_markets_staging(conn):
+    """An empty markets_staging table in the markets layout, replacing any leftover."""
+    conn.execute(f'DROP TABLE IF EXISTS {MARKETS_STAGING}')
+    create_markets_table(conn, MARKETS_STAGING)
+
+
+def swap_in_markets_staging(conn):
+    """
+    Replace markets with markets_staging and rebuild everything that hangs
+    off the table, on the caller's transaction. Building the indexes once
+    over the loaded table is cheaper than maintaining them row by row.
+    """
+    conn.execute('DROP TABLE markets')
+    conn.execute(f'ALTER TABLE {MARKETS_STAGING} RENAME TO markets')
+    ensure_market_indexes(conn)
+    if has_search_index(conn):
+        # The triggers went with the old table and every id changed
+        ensure_search_index(conn, rebuild=True)
+
+
+def _create_aggregates_table(conn):
+    """v5: market_aggregates, filled from the data already published."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS market_aggregates (
+            scope TEXT PRIMARY KEY,
+            markets INTEGER NOT NULL,
+            categories INTEGER NOT NULL,
+            gainers INTEGER NOT NULL,
+            losers INTEGER NOT NULL,
+            extremes TEXT NOT NULL,
+            last_fetch TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    refresh_aggregates(conn)
+
+
+_V6_SEARCH_DDL = (
+    '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS markets_fts USING fts5(
+            symbol, name,
+            content = 'markets', content_rowid = 'id',
+            prefix = '2 3 4'
+        )
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS markets_fts_ai AFTER INSERT ON markets BEGIN
+            INSERT INTO markets_fts (rowid, symbol, name) VALUES (new.id, new.symbol, new.name);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS markets_fts_ad AFTER DELETE ON markets BEGIN
+            INSERT INTO markets_fts (markets_fts, rowid, symbol, name) VALUES ('delete', old.id, old.symbol, old.name);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS markets_fts_au AFTER UPDATE OF symbol, name ON markets BEGIN
+            INSERT INTO markets_fts (markets_fts, rowid, symbol, name) VALUES ('delete', old.id, old.symbol, old.name);
+            INSERT INTO markets_fts (rowid, symbol, name) VALUES (new.id, new.symbol, new.name);
+        END
+    ''',
+)
+
+
+def _create_search_index(conn):
+    """v6: markets_fts full-text index over name and symbol, with sync triggers."""
+    if not fts5_available(conn):
+        print("[WARNING] SQLite was built without FTS5; market search will scan the table")
+        return
+    for statement in _V6_SEARCH_DDL:
+        conn.execute(statement)
+    conn.execute("INSERT INTO markets_fts (markets_fts) VALUES ('rebuild')")
+
+
+_V7_FTS_UPDATE_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS markets_fts_au AFTER UPDATE OF symbol, name ON markets
+    WHEN old.symbol IS NOT new.symbol OR old.name IS NOT new.name BEGIN
+        INSERT INTO markets_fts (markets_fts, rowid, symbol, name) VALUES ('delete', old.id, old.symbol, old.name);
+        INSERT INTO markets_fts (rowid, symbol, name) VALUES (new.id, new.symbol, new.name);
+    END
+'''
+
+
+def _add_row_versions(conn):
+    """v7: content_hash and row_version on markets, and market_deletions."""
+    existing = _table_columns(conn, 'markets')
+    for name, decl in (('content_hash', 'INTEGER'), ('row_version', 'INTEGER NOT NULL DEFAULT 0')):
+        if name not in existing:
+            conn.execute(f'ALTER TABLE markets ADD COLUMN {name} {decl}')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS market_deletions (
+            symbol TEXT PRIMARY KEY,
+            row_version INTEGER NOT NULL
+        )
+    ''')
+    # Rows already stored count as written by version 1; their hash is
+    # filled in by the next write that sees them
+    if conn.execute('UPDATE markets SET row_version = 1').rowcount:
+        conn.execute('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', (VERSION_KEY, '1'))
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_markets_row_version ON markets (row_version)')
+    if has_search_index(conn):
+        # Versioned upserts rewrite name unchanged; resync the index only on a real change
+        conn.execute('DROP TRIGGER IF EXISTS markets_fts_au')
+        conn.execute(_V7_FTS_UPDATE_TRIGGER)
+
+
+def _add_perf_1d(conn):
+    """v8: perf_1d_pct on markets, the one-day performance the exports carry."""
+    conn.execute('ALTER TABLE markets ADD COLUMN perf_1d_pct REAL')
+
+
+# Applied in order; a database at user_version N has run the first N
+MIGRATIONS = (
+    _migrate_markets_table,
+    _create_feature_tables,
+    _create_market_indexes,
+    _create_snapshot_tables,
+    _create_aggregates_table,
+    _create_search_index,
+    _add_row_versions,
+    _add_perf_1d,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn) -> int:
+    """
+    Apply the migrations a database has not run yet, in one transaction.
+
+    Returns the version the database started at. Concurrent callers (shard
+    workers, the app and the analyzer) serialize on BEGIN IMMEDIATE and the
+    later ones find nothing left to do.
+    """
+    start = schema_version(conn)
+    if start >= SCHEMA_VERSION:
+        return start
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = schema_version(conn)
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            step(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return start
@@ -0,0 +1,146 @@
+"""
+Market name and symbol search
+
+markets_fts is an FTS5 index over markets (external content, kept in sync by
+triggers) with prefix indexes, so typing "gol" finds "Gold" from the index
+instead of a LIKE '%gol%' scan of every row. search_markets (the
+/api/markets/search endpoint) tiers its results: the exact symbol first,
+then symbols starting with the query (both from the markets symbol index),
+then token prefix matches on name or symbol ranked by bm25.
+
+The ?search= filter of /api/markets keeps its substring semantics ("usd"
+finds EURUSD, "old" finds "Gold"), which token prefixes cannot express, so
+matching_ids_sql stays a LIKE condition.
+"""
+
+import re
+from typing import List, Optional
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+_TRIGGERS = (
+    '''
+        CREATE TRIGGER IF NOT EXISTS markets_fts_ai AFTER INSERT ON markets BEGIN
+            INSERT INTO markets_fts (rowid, symbol, name) VALUES (new.id, new.symbol, new.name);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS markets_fts_ad AFTER DELETE ON markets BEGIN
+            INSERT INTO markets_fts (markets_fts, rowid, symbol, name) VALUES ('delete', old.id, old.symbol, old.name);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS markets_fts_au AFTER UPDATE OF symbol, name ON markets
+        WHEN old.symbol IS NOT new.symbol OR old.name IS NOT new.name BEGIN
+            INSERT INTO markets_fts (markets_fts, rowid, symbol, name) VALUES ('delete', old.id, old.symbol, old.name);
+            INSERT INTO markets_fts (rowid, symbol, name) VALUES (new.id, new.symbol, new.name);
+        END
+    ''',
+)
+
+
+def fts5_available(conn) -> bool:
+    """Whether this SQLite build has the FTS5 extension."""
+    return any(row[0] == 'ENABLE_FTS5' for row in conn.execute('PRAGMA compile_options'))
+
+
+def has_search_index(conn) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'markets_fts'"
+    ).fetchone() is not None
+
+
+def ensure_search_index(conn, rebuild: bool = False):
+    """
+    Create markets_fts and its sync triggers (rebuild=True re-reads every
+    market, needed after the markets table was replaced). Without FTS5 the
+    index is skipped and search_markets falls back to LIKE.
+    """
+    if not fts5_available(conn):
+        print("[WARNING] SQLite was built without FTS5; market search will scan the table")
+        return
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS markets_fts USING fts5(
+            symbol, name,
+            content = 'markets', content_rowid = 'id',
+            prefix = '2 3 4'
+        )
+    ''')
+    for trigger in _TRIGGERS:
+        conn.execute(trigger)
+    if rebuild:
+        conn.execute("INSERT INTO markets_fts (markets_fts) VALUES ('rebuild')")
+
+
+def match_expression(query: str) -> Optional[str]:
+    """The FTS5 query for user input: every word as a prefix ("gold oil" -> "gold"* "oil"*)."""
+    tokens = _TOKEN.findall(query or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_markets(conn, query: str, limit: int = 20, category: Optional[str] = None) -> List:
+    """
+    Up to `limit` markets rows matching query: the exact symbol, then symbol
+    prefix matches, then name/symbol token prefix matches by relevance.
+    """
+    expression = match_expression(query)
+    if expression is None or limit <= 0:
+        return []
+    category_sql = ' AND m.category = ?' if category else ''
+    category_params = [category] if category else []
+
+    results, seen = [], set()
+
+    def take(sql, params):
+        for row in conn.execute(sql, params):
+            # m.* starts with markets.id
+            if row[0] not in seen:
+                seen.add(row[0])
+                results.append(row)
+        return len(results) >= limit
+
+    symbol = query.strip().upper()
+    if symbol and take(
+        f'SELECT m.* FROM markets AS m WHERE m.symbol = ?{category_sql}',
+        [symbol] + category_params,
+    ):
+        return results[:limit]
+    # Symbols share the markets UNIQUE index, so a prefix is a range scan
+    if symbol and take(
+        f'''SELECT m.* FROM markets AS m
+            WHERE m.symbol > ? AND m.symbol < ?{category_sql}
+            ORDER BY m.symbol LIMIT ?''',
+        [symbol, symbol + '\uffff'] + category_params + [limit],
+    ):
+        return results[:limit]
+
+    if has_search_index(conn):
+        take(
+            f'''SELECT m.* FROM markets_fts JOIN markets AS m ON m.id = markets_fts.rowid
+                WHERE markets_fts MATCH ?{category_sql}
+                ORDER BY markets_fts.rank LIMIT ?''',
+            [expression] + category_params + [limit + len(results)],
+        )
+    else:
+        pattern = f'%{query.strip()}%'
+        take(
+            f'''SELECT m.* FROM markets AS m
+                WHERE (m.name LIKE ? OR m.symbol LIKE ?){category_sql} LIMIT ?''',
+            [pattern, pattern] + category_params + [limit + len(results)],
+        )
+    return results[:limit]
+
+
+def matching_ids_sql(conn, query: str):
+    """
+    (SQL condition on markets, params) for rows whose name or symbol contains
+    query anywhere, or None without a query. This is the ?search= filter of
+    /api/markets; see the module docstring for why it is not the FTS index.
+    """
+    query = (query or '').strip()
+    if not query:
+        return None
+    pattern = f'%{query}%'
+    return '(name LIKE ? OR symbol LIKE ?)', [pattern, pattern]
@@ -0,0 +1,169 @@
+"""
+Sharded multi-process fetch for very large universes
+
+The coordinator plans every category into a run journal, then launches N
+worker processes. Each worker owns the epics that hash to its shard, opens
+its own API sessions and streams completed markets into the shared database
+through a MarketWriter. The run is published (stale rows pruned, rankings
+refreshed) only once every shard has reported done; otherwise it stays in
+the journal and `run_analyzer.py --shards N --resume` picks it up.
+"""
+
+import hashlib
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import config
+from refresh_policy import RefreshPolicy
+from run_journal import RunJournal
+import run_analyzer
+
+
+def shard_for(epic: str, shards: int) -> int:
+    """Stable shard index of an epic (independent of process and hash seed)."""
+    return int(hashlib.sha1(epic.encode('utf-8')).hexdigest()[:8], 16) % shards
+
+
+def shard_worker(
+    db_path: str,
+    run_id: int,
+    categories: list,
+    shard: int,
+    shards: int,
+    api_base_url: str | None = None,
+) -> None:
+    """Fetch this shard's pending epics of a planned run (runs in its own process)."""
+    if api_base_url:
+        config.API_BASE_URL = api_base_url
+    journal = RunJournal(db_path, run_id, categories)
+    journal.report_shard(shard, 'running')
+
+    markets = [
+        (category, market)
+        for category, market in journal.pending_markets()
+        if shard_for(market['epic'], shards) == shard
+    ]
+    print(f"[shard {shard}/{shards}] {len(markets)} markets to fetch")
+
+    max_workers = run_analyzer.resolve_worker_count()
+    request_delay = max(0.0, float(getattr(config, 'REQUEST_DELAY', 0.15)))
+    writer = run_analyzer.MarketWriter(
+        db_path,
+        batch_size=int(getattr(config, 'WRITE_BATCH_SIZE', 25)),
+        journal=journal,
+    ).start()
+    status = 'done'
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as workers:
+            futures = {
+                workers.submit(run_analyzer._build_market_record, category, market, request_delay): market
+                for category, market in markets
+            }
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception as exc:
+                    print(f"[shard {shard}] [WARNING] Failed to process {futures[future].get('epic')}: {exc}")
+                    continue
+                if record is not None:
+                    writer.put(record)
+    except BaseException:
+        status = 'failed'
+        raise
+    finally:
+        writer.stop()
+        run_analyzer.record_governor_latency(db_path)
+        if writer.failed_batches:
+            status = 'failed'
+        journal.report_shard(shard, status, writer.written)
+    print(f"[shard {shard}/{shards}] [OK] Wrote {writer.written} markets")
+
+
+def _plan_run(api, journal: RunJournal, refresh_policy: RefreshPolicy | None):
+    """Record every not yet planned category of the run in the journal."""
+    for category in journal.categories:
+        if journal.planned_markets(category) is not None:
+            continue
+        print(f"\nPlanning {category.upper()}")
+        markets, skipped = run_analyzer._plan_category(api, category, refresh_policy, journal.db_path)
+        journal.plan(category, markets, skipped)
+
+
+def run_sharded(
+    categories: list | None = None,
+    shards: int = 2,
+    db_path: str = 'market_data.db',
+    incremental: bool = False,
+    resume: bool = False,
+) -> dict:
+    """
+    Plan, fan out to `shards` worker processes and publish once all are done.
+
+    Returns:
+        Summary dict with success, markets_processed, duration, run_id and shards
+    """
+    shards = max(1, int(shards))
+    run_analyzer.init_database(db_path)
+
+    journal = run_analyzer.resume_journal(db_path) if resume else None
+    if journal is None:
+        if resume:
+            print("[WARNING] No interrupted run to resume; starting a new run")
+        journal = RunJournal.start(db_path, categories if categories else config.CATEGORIES)
+
+    api = run_analyzer.create_api()
+    if not api.create_session():
+        print("[ERROR] Failed to create session. Please check your credentials.")
+        return {'success': False, 'error': 'Failed to create session', 'run_id': journal.run_id}
+
+    start_time = datetime.now()
+    refresh_policy = None
+    if incremental:
+        refresh_policy = RefreshPolicy.load(db_path, getattr(config, 'FRESHNESS_SECONDS', None))
+    _plan_run(api, journal, refresh_policy)
+    completed, planned = journal.progress()
+    print(f"\n[OK] Run {journal.run_id}: {planned - completed} markets pending across {shards} shards")
+
+    # Spawn rather than fork: workers must not inherit the coordinator's sessions or threads
+    context = multiprocessing.get_context('spawn')
+    api_base_url = getattr(config, 'API_BASE_URL', None)
+    workers = [
+        context.Process(
+            target=shard_worker,
+            args=(db_path, journal.run_id, journal.categories, shard, shards, api_base_url),
+            name=f"analyzer-shard-{shard}",
+        )
+        for shard in range(shards)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    statuses = journal.shard_statuses()
+    written = sum(statuses.get(shard, ('', 0))[1] for shard in range(shards))
+    failed = [
+        shard for shard, worker in enumerate(workers)
+        if worker.exitcode != 0 or statuses.get(shard, ('missing',))[0] != 'done'
+    ]
+    if failed:
+        print(f"[ERROR] Shards {failed} did not finish; rerun with --resume to complete run {journal.run_id}")
+    else:
+        print("\nPublishing data to database...")
+        run_analyzer.MarketWriter(db_path, journal=journal).publish(categories=journal.categories)
+        market_data = run_analyzer.load_market_records(db_path, journal.categories)
+        if market_data:
+            print("Exporting data to CSV (backup)...")
+            run_analyzer.export_records(market_data, config.OUTPUT_FILENAME)
+            run_analyzer.export_to_category_files(market_data, journal.categories)
+
+    duration = (datetime.now() - start_time).total_seconds()
+    print(f"\n[OK] Sharded run {journal.run_id}: {written} markets in {duration:.2f} seconds")
+    return {
+        'success': not failed,
+        'markets_processed': written,
+        'duration': duration,
+        'run_id': journal.run_id,
+        'shards': shards,
+    }
@@ -0,0 +1,189 @@
+"""
+Append-only history of every market's metrics, one snapshot per write
+
+The markets table only holds the latest values. Each time the analyzer
+writes a market it also appends a row to market_snapshots, keyed by UTC day,
+an integer symbol id (from snapshot_symbols) and the epoch second, so
+"how did RSI 1H move today" is a single index range scan.
+
+The day leads the clustered key, so each day's snapshots sit together like a
+partition: retention and downsampling delete whole contiguous day ranges.
+compact_snapshots() keeps every snapshot for `raw_days`, the last one per
+hour until `hourly_days`, the last one per day until `retention_days`, and
+drops anything older.
+"""
+
+import time
+from typing import Iterable, List, Optional, Tuple
+
+# Metric columns stored per snapshot (the markets table's numeric columns)
+SNAPSHOT_METRICS = (
+    'current_price',
+    'price_change_pct',
+    'perf_1w_pct',
+    'perf_1m_pct',
+    'perf_3m_pct',
+    'perf_6m_pct',
+    'perf_ytd_pct',
+    'perf_1y_pct',
+    'perf_5y_pct',
+    'perf_10y_pct',
+    'rsi_1h',
+    'rsi_4h',
+    'rsi_24h',
+    'rsi_1w',
+    'rsi_1m',
+    'rsi_3m',
+    'rsi_6m',
+    'rsi_ytd',
+)
+
+DAY_SECONDS = 86400
+HOUR_SECONDS = 3600
+
+_COMPACTED_KEY = 'snapshots_compacted_day'
+
+
+def ensure_snapshot_tables(conn):
+    """Create the snapshot history and symbol id tables."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_symbols (
+            symbol_id INTEGER PRIMARY KEY,
+            symbol TEXT NOT NULL UNIQUE
+        )
+    ''')
+    metrics = ',\n'.join(f'            {column} REAL' for column in SNAPSHOT_METRICS)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS market_snapshots (
+            day INTEGER NOT NULL,
+            symbol_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            run_id INTEGER,
+{metrics},
+            PRIMARY KEY (day, symbol_id, ts)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_market_snapshots_symbol
+        ON market_snapshots (symbol_id, ts)
+    ''')
+
+
+def record_snapshots(
+    conn,
+    snapshots: Iterable[Tuple[str, tuple]],
+    run_id: Optional[int] = None,
+    taken_at: Optional[float] = None,
+):
+    """
+    Append (symbol, metrics in SNAPSHOT_METRICS order) pairs as one snapshot
+    each, on the caller's transaction. A second snapshot of a symbol within
+    the same second replaces the first.
+    """
+    snapshots = list(snapshots)
+    if not snapshots:
+        return
+    ts = int(time.time() if taken_at is None else taken_at)
+    day = ts // DAY_SECONDS
+    conn.executemany(
+        'INSERT OR IGNORE INTO snapshot_symbols (symbol) VALUES (?)',
+        ((symbol,) for symbol, _ in snapshots),
+    )
+    columns = ', '.join(SNAPSHOT_METRICS)
+    placeholders = ', '.join('?' for _ in SNAPSHOT_METRICS)
+    conn.executemany(
+        f'''
+        INSERT OR REPLACE INTO market_snapshots (day, symbol_id, ts, run_id, {columns})
+        SELECT ?, symbol_id, ?, ?, {placeholders} FROM snapshot_symbols WHERE symbol = ?
+        ''',
+        ((day, ts, run_id, *metrics, symbol) for symbol, metrics in snapshots),
+    )
+
+
+def merge_snapshots(conn, schema: str):
+    """
+    Move the snapshots of an attached database (a category shard) into the
+    main history on the caller's transaction, mapping its symbol ids to the
+    main file's, and clear them there.
+    """
+    conn.execute(f'INSERT OR IGNORE INTO main.snapshot_symbols (symbol) SELECT symbol FROM {schema}.snapshot_symbols')
+    columns = ', '.join(SNAPSHOT_METRICS)
+    conn.execute(f'''
+        INSERT OR REPLACE INTO main.market_snapshots (day, symbol_id, ts, run_id, {columns})
+        SELECT s.day, m.symbol_id, s.ts, s.run_id, {', '.join(f's.{column}' for column in SNAPSHOT_METRICS)}
+        FROM {schema}.market_snapshots AS s
+        JOIN {schema}.snapshot_symbols AS sym ON sym.symbol_id = s.symbol_id
+        JOIN main.snapshot_symbols AS m ON m.symbol = sym.symbol
+    ''')
+    conn.execute(f'DELETE FROM {schema}.market_snapshots')
+
+
+def snapshot_history(conn, symbol: str, metric: str, since: Optional[float] = None) -> List[Tuple[int, float]]:
+    """(epoch second, value) pairs of one symbol's metric, oldest first."""
+    if metric not in SNAPSHOT_METRICS:
+        raise ValueError(f"Unknown snapshot metric: {metric}")
+    rows = conn.execute(
+        f'''
+        SELECT s.ts, s.{metric}
+        FROM market_snapshots AS s
+        JOIN snapshot_symbols AS sym ON sym.symbol_id = s.symbol_id
+        WHERE sym.symbol = ? AND s.ts >= ?
+        ORDER BY s.ts
+        ''',
+        (symbol, int(since or 0)),
+    ).fetchall()
+    return [(ts, value) for ts, value in rows]
+
+
+def _keep_last_per_bucket(conn, first_day: int, end_day: int, bucket: int) -> int:
+    """Within [first_day, end_day), delete all but each symbol's last snapshot per bucket seconds."""
+    cursor = conn.execute(
+        '''
+        DELETE FROM market_snapshots AS s
+        WHERE s.day >= ? AND s.day < ?
+          AND s.ts < (
+              SELECT MAX(t.ts) FROM market_snapshots AS t
+              WHERE t.day = s.day AND t.symbol_id = s.symbol_id
+                AND t.ts >= (s.ts / ?) * ? AND t.ts < (s.ts / ? + 1) * ?
+          )
+        ''',
+        (first_day, end_day, bucket, bucket, bucket, bucket),
+    )
+    return cursor.rowcount
+
+
+def compact_snapshots(
+    conn,
+    raw_days: int = 2,
+    hourly_days: int = 30,
+    retention_days: int = 365,
+    now: Optional[float] = None,
+) -> dict:
+    """
+    Apply the retention policy on the caller's transaction, at most once per
+    UTC day. Only the days that crossed a tier boundary since the last
+    compaction are rewritten. Returns the number of snapshots deleted per tier.
+    """
+    today = int(time.time() if now is None else now) // DAY_SECONDS
+    row = conn.execute('SELECT value FROM metadata WHERE key = ?', (_COMPACTED_KEY,)).fetchone()
+    last = int(row[0]) if row else None
+    if last is not None and last >= today:
+        return {}
+
+    def window(age_days: int) -> Tuple[int, int]:
+        end = today - age_days
+        start = 0 if last is None else last - age_days
+        return start, end
+
+    deleted = {}
+    start, end = window(raw_days)
+    deleted['hourly'] = _keep_last_per_bucket(conn, start, end, HOUR_SECONDS)
+    start, end = window(hourly_days)
+    deleted['daily'] = _keep_last_per_bucket(conn, start, end, DAY_SECONDS)
+    deleted['expired'] = conn.execute(
+        'DELETE FROM market_snapshots WHERE day < ?', (today - retention_days,)
+    ).rowcount
+
+    conn.execute('DELETE FROM metadata WHERE key = ?', (_COMPACTED_KEY,))
+    conn.execute('INSERT INTO metadata (key, value) VALUES (?, ?)', (_COMPACTED_KEY, str(today)))
+    return deleted
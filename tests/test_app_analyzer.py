@@ -0,0 +1,187 @@
+import importlib.util
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+spec = importlib.util.spec_from_file_location("app_module", ROOT / "app.py")
+app_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(app_module)
+
+
+def test_run_analyzer_runs_pipeline_in_process(monkeypatch):
+    calls = []
+
+    def fake_run_analysis(categories, db_path):
+        calls.append((categories, db_path))
+        return {"success": True, "markets_processed": 3}
+
+    monkeypatch.setattr(app_module, "run_analysis", fake_run_analysis)
+    monkeypatch.setattr(app_module, "import_csv_to_db", _fail_csv_import)
+    app_module.ANALYZER_RUNNING = True
+
+    result = app_module.run_analyzer(["forex"])
+
+    assert calls == [(["forex"], app_module.DB_PATH)]
+    assert result["success"] is True
+    assert app_module.ANALYZER_RUNNING is False
+    assert app_module.ANALYZER_LAST_RESULT == result
+
+
+def _fail_csv_import(*_):
+    raise AssertionError("analyzer results must not be re-imported from CSV")
+
+
+def test_stats_come_from_the_aggregate_row(tmp_path, monkeypatch):
+    from run_analyzer import init_database, store_to_database
+
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([
+        {"Category": "Forex", "Symbol": "EURUSD", "Name": "EUR/USD", "Price Change %": 0.5, "Perf % 1M": 2.0},
+        {"Category": "Forex", "Symbol": "GBPUSD", "Name": "GBP/USD", "Price Change %": -0.25, "Perf % 1M": -1.0},
+        {"Category": "Shares", "Symbol": "AAPL", "Name": "Apple", "Price Change %": 1.0, "Perf % 1M": 7.5},
+    ], db_path)
+    monkeypatch.setattr(app_module, "DB_PATH", db_path)
+    monkeypatch.setattr(app_module, "load_markets_from_db", _fail_full_load)
+
+    stats = app_module.app.test_client().get("/api/stats").get_json()
+    dashboard = app_module.get_dashboard_stats()
+
+    assert (stats["total_markets"], stats["total_categories"]) == (3, 2)
+    assert (stats["gainers"], stats["losers"]) == (2, 1)
+    assert stats["last_fetch"] != "Never"
+    assert dashboard["best_performer"] == {"name": "Apple", "symbol": "AAPL", "value": "7.50%"}
+
+
+def _fail_full_load(*_, **__):
+    raise AssertionError("stats must not load every market")
+
+
+def test_markets_page_by_keyset_with_range_filters(tmp_path, monkeypatch):
+    from run_analyzer import init_database, store_to_database
+
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([
+        {"Category": "Forex", "Symbol": "EURUSD", "Name": "EUR/USD", "RSI 1H": 25.0, "Perf % 1W": 1.0},
+        {"Category": "Forex", "Symbol": "GBPUSD", "Name": "GBP/USD", "RSI 1H": 45.0, "Perf % 1W": 2.0},
+        {"Category": "Forex", "Symbol": "USDJPY", "Name": "USD/JPY", "RSI 1H": 25.0},
+        {"Category": "Forex", "Symbol": "AUDUSD", "Name": "AUD/USD"},
+        {"Category": "Shares", "Symbol": "AAPL", "Name": "Apple", "RSI 1H": 20.0},
+    ], db_path)
+    monkeypatch.setattr(app_module, "DB_PATH", db_path)
+    client = app_module.app.test_client()
+
+    # No paging parameters: the dashboard's plain array
+    assert isinstance(client.get("/api/markets").get_json(), list)
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/markets?category=Forex&sort=rsi_1h&dir=desc&limit=2"
+        page = client.get(url + (f"&cursor={cursor}" if cursor else "")).get_json()
+        assert page["total_estimate"] == 4
+        seen += [m["Symbol"] for m in page["markets"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    # Ties broken by id, markets without an RSI last
+    assert seen == ["GBPUSD", "USDJPY", "EURUSD", "AUDUSD"]
+
+    page = client.get("/api/markets?rsi_1h_lt=30&perf_1w_gte=0.5").get_json()
+    assert [m["Symbol"] for m in page["markets"]] == ["EURUSD"]
+    assert page["total_estimate"] == 1
+
+    assert client.get("/api/markets?sort=nope").status_code == 400
+    assert client.get(f"/api/markets?category=Forex&sort=symbol&cursor={cursor or 'x'}").status_code == 400
+
+
+def test_markets_search_parameter_matches_substrings(tmp_path, monkeypatch):
+    from run_analyzer import init_database, store_to_database
+
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([
+        {"Category": "Forex", "Symbol": "EURUSD", "Name": "EUR/USD"},
+        {"Category": "Commodities", "Symbol": "GOLD", "Name": "Spot Gold"},
+        {"Category": "Shares", "Symbol": "AAPL", "Name": "Apple"},
+    ], db_path)
+    monkeypatch.setattr(app_module, "DB_PATH", db_path)
+    client = app_module.app.test_client()
+
+    def found(url):
+        body = client.get(url).get_json()
+        markets = body["markets"] if isinstance(body, dict) else body
+        return [m["Symbol"] for m in markets]
+
+    assert found("/api/markets?search=usd") == ["EURUSD"]
+    assert found("/api/markets?search=old") == ["GOLD"]
+    assert found("/api/markets?search=usd&sort=symbol") == ["EURUSD"]
+    # The search endpoint matches word prefixes only
+    assert found("/api/markets/search?q=old") == []
+
+
+def test_dataset_endpoints_answer_conditional_requests_from_the_version(tmp_path, monkeypatch):
+    from email.utils import parsedate_to_datetime
+
+    from run_analyzer import init_database, store_to_database
+
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    record = {"Category": "Forex", "Symbol": "EURUSD", "Name": "EUR/USD", "Price Change %": 0.5}
+    store_to_database([record], db_path)
+    monkeypatch.setattr(app_module, "DB_PATH", db_path)
+    client = app_module.app.test_client()
+
+    first = client.get("/api/markets")
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+    assert "no-store" not in first.headers["Cache-Control"]
+
+    monkeypatch.setattr(app_module, "load_markets_from_db", _fail_full_load)
+    monkeypatch.setattr(app_module, "get_dashboard_stats", _fail_full_load)
+    for url in ("/api/markets", "/api/stats", "/api/top-performers"):
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+    monkeypatch.undo()
+    monkeypatch.setattr(app_module, "DB_PATH", db_path)
+
+    store_to_database([dict(record, **{"Price Change %": 0.75})], db_path)
+    second = client.get("/api/markets", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != etag
+    assert second.get_json()[0]["Price Change %"] == 0.75
+
+    last_modified = second.headers["Last-Modified"]
+    assert client.get("/api/markets", headers={"If-Modified-Since": last_modified}).status_code == 304
+    # A bump within the same second still gets a later Last-Modified
+    store_to_database([dict(record, **{"Price Change %": 1.0})], db_path)
+    third = client.get("/api/markets", headers={"If-Modified-Since": last_modified})
+    assert third.status_code == 200
+    assert parsedate_to_datetime(third.headers["Last-Modified"]) > parsedate_to_datetime(last_modified)
+    later = "Fri, 01 Jan 2100 00:00:00 GMT"
+    assert client.get("/api/markets", headers={"If-Modified-Since": later}).status_code == 304
+    stale = client.get("/api/markets", headers={"If-None-Match": etag, "If-Modified-Since": later})
+    assert stale.status_code == 200
+
+
+def test_requests_on_fresh_threads_share_released_readers(tmp_path, monkeypatch):
+    import threading
+
+    from run_analyzer import init_database
+
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    monkeypatch.setattr(app_module, "DB_PATH", db_path)
+    client = app_module.app.test_client()
+
+    for _ in range(20):
+        thread = threading.Thread(target=lambda: client.get("/api/stats"))
+        thread.start()
+        thread.join()
+
+    assert len(app_module.pool_for(db_path)._readers) == 1
+    app_module.pool_for(db_path).close()
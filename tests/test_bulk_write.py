@@ -0,0 +1,97 @@
+import importlib.util
+import pathlib
+import sqlite3
+import sys
+
+import pandas as pd
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from run_analyzer import (  # noqa: E402
+    MARKET_COLUMNS,
+    export_to_csv,
+    init_database,
+    load_market_records,
+    market_rows_from_frame,
+    store_to_database,
+)
+
+spec = importlib.util.spec_from_file_location("app_module", ROOT / "app.py")
+app_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(app_module)
+
+
+def test_market_rows_from_frame_parses_display_strings():
+    df = pd.DataFrame({
+        "Category": ["Forex", "Forex"],
+        "Symbol": ["EURUSD", "GBPUSD"],
+        "Name": ["EUR/USD", None],
+        "Current Price": [1.08123, "N/A"],
+        "Perf % 1M": ["1.25%", " -0.50% "],
+        "RSI 1H": ["55.10", None],
+    })
+
+    rows = [dict(zip(MARKET_COLUMNS, row)) for row in market_rows_from_frame(df)]
+
+    assert rows[0]["current_price"] == 1.08123
+    assert rows[1]["current_price"] is None
+    assert rows[0]["perf_1m_pct"] == 1.25
+    assert rows[1]["perf_1m_pct"] == -0.5
+    assert rows[0]["rsi_1h"] == 55.1
+    assert rows[1]["rsi_1h"] is None
+    assert rows[1]["name"] == ""
+    # Columns missing from the frame default like missing record fields
+    assert rows[0]["currency"] == "" and rows[0]["perf_5y_pct"] is None
+
+
+def test_import_csv_replaces_table_in_one_upsert(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    monkeypatch.setattr(app_module, "DB_PATH", db_path)
+    csv_path = str(tmp_path / "analysis.csv")
+
+    export_to_csv([
+        {"Category": "Forex", "Symbol": "EURUSD", "Name": "EUR/USD", "Perf % 1M": "1.00%"},
+        {"Category": "Shares", "Symbol": "AAPL", "Name": "Apple", "Perf % 1M": "N/A"},
+    ], csv_path)
+    assert app_module.import_csv_to_db(csv_path)
+
+    export_to_csv([
+        {"Category": "Forex", "Symbol": "EURUSD", "Name": "EUR/USD", "Perf % 1M": "2.50%"},
+    ], csv_path)
+    assert app_module.import_csv_to_db(csv_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT symbol, perf_1m_pct FROM markets").fetchall()
+        ranked = conn.execute("SELECT COUNT(*) FROM market_ranks").fetchone()[0]
+    finally:
+        conn.close()
+    assert rows == [("EURUSD", 2.5)]
+    assert ranked > 0
+
+
+def test_typed_records_keep_precision_and_format_only_in_the_csv(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([
+        {"Category": "Forex", "Symbol": "EURUSD", "Name": "EUR/USD", "Current Price": None,
+         "Perf % 1D": -0.4567, "Perf % 1M": 1.23456, "RSI 1H": 55.125, "Perf % 1Y": None},
+    ], db_path)
+
+    record = load_market_records(db_path)[0]
+    assert record["Perf % 1D"] == -0.4567
+    assert record["Perf % 1M"] == 1.23456
+    assert record["RSI 1H"] == 55.125
+    assert record["Perf % 1Y"] is None
+
+    csv_path = str(tmp_path / "analysis.csv")
+    export_to_csv([record], csv_path)
+    row = pd.read_csv(csv_path, dtype=str, keep_default_na=False).iloc[0]
+    assert row["Perf % 1D"] == "-0.46%"
+    assert row["Perf % 1M"] == "1.23%"
+    assert row["RSI 1H"] == "55.12"
+    assert row["Perf % 1Y"] == "N/A"
+    assert row["Current Price"] == "N/A"
@@ -0,0 +1,46 @@
+import unittest
+
+from category_scheduler import CategoryScheduler
+
+
+class CategorySchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = CategoryScheduler(
+            ["shares", "forex", "indices", "cryptocurrencies"],
+            {"forex": 300, "cryptocurrencies": 300, "indices": 3600, "shares": 21600},
+            now=0.0,
+        )
+
+    def test_first_runs_are_staggered_fastest_first(self):
+        jobs = [self.scheduler.pop_due(now=1000.0) for _ in range(4)]
+        self.assertEqual(
+            jobs,
+            [(0.0, "cryptocurrencies"), (75.0, "forex"), (150.0, "indices"), (225.0, "shares")],
+        )
+        self.assertIsNone(self.scheduler.pop_due(now=1000.0))
+
+    def test_only_due_jobs_are_popped(self):
+        self.assertEqual(self.scheduler.pop_due(now=10.0), (0.0, "cryptocurrencies"))
+        self.assertIsNone(self.scheduler.pop_due(now=10.0))
+
+    def test_reschedule_keeps_phase_and_skips_missed_slots(self):
+        self.assertEqual(self.scheduler.reschedule("forex", 75.0, now=100.0), 375.0)
+        # A run that overran two cadences does not fire the missed slots.
+        self.assertEqual(self.scheduler.reschedule("indices", 150.0, now=8000.0), 10950.0)
+
+    def test_phases_never_collide(self):
+        fired = {}
+        now = 0.0
+        while now < 4 * 3600:
+            job = self.scheduler.pop_due(now=now)
+            if job is None:
+                now = self.scheduler.peek()[0]
+                continue
+            due, category = job
+            fired.setdefault(due, []).append(category)
+            self.scheduler.reschedule(category, due, now=due)
+        self.assertTrue(all(len(categories) == 1 for categories in fired.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
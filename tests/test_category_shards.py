@@ -0,0 +1,105 @@
+import os
+import sqlite3
+
+import config
+from category_shards import existing_shard_keys, shard_path
+from run_analyzer import MarketWriter, init_database
+
+
+def _row(category, symbol, perf_1m):
+    return {"Category": category, "Symbol": symbol, "Name": symbol, "Perf % 1M": perf_1m}
+
+
+def _markets(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT symbol, perf_1m_pct FROM markets"))
+    finally:
+        conn.close()
+
+
+def _run(db_path, records, categories):
+    writer = MarketWriter(db_path, batch_size=2).start()
+    for record in records:
+        writer.put(record)
+    writer.stop()
+    staged = _markets(db_path)
+    writer.publish(categories=categories)
+    return writer, staged
+
+
+def test_categories_stream_into_their_own_files_and_publish_into_the_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "CATEGORY_SHARDS", True)
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+
+    _, staged = _run(db_path, [
+        _row("Forex", "EURUSD", 1.0),
+        _row("Forex", "GBPUSD", 2.0),
+        _row("Shares", "AAPL", 3.0),
+    ], ["forex", "shares"])
+
+    # Nothing reached the main table before the publish
+    assert staged == {}
+    assert existing_shard_keys(db_path) == ["forex", "shares"]
+    assert _markets(shard_path(db_path, "Shares")) == {"AAPL": 3.0}
+    assert _markets(db_path) == {"EURUSD": 1.0, "GBPUSD": 2.0, "AAPL": 3.0}
+
+    # A forex refresh only touches the forex shard; GBPUSD was delisted
+    shares_mtime = os.stat(shard_path(db_path, "shares")).st_mtime_ns
+    writer, _ = _run(db_path, [_row("Forex", "EURUSD", 1.5)], ["forex"])
+
+    assert writer.changed == 1
+    assert _markets(db_path) == {"EURUSD": 1.5, "AAPL": 3.0}
+    assert _markets(shard_path(db_path, "forex")) == {"EURUSD": 1.5}
+    assert os.stat(shard_path(db_path, "shares")).st_mtime_ns == shares_mtime
+
+
+def _count(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_streamed_batches_leave_the_database_alone_until_publish(tmp_path, monkeypatch):
+    from row_versions import dataset_version
+    from run_analyzer import resume_journal
+    from run_journal import RunJournal
+
+    monkeypatch.setattr(config, "CATEGORY_SHARDS", True)
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    journal = RunJournal.start(db_path, ["forex"])
+    journal.plan("forex", [{"epic": "EURUSD"}, {"epic": "GBPUSD"}])
+    records = [_row("Forex", "EURUSD", 1.0), _row("Forex", "GBPUSD", 2.0)]
+    records[0]["Daily Closes"] = ([738000, 738001], [1.08, 1.09])
+
+    conn = sqlite3.connect(db_path)
+    version_before = dataset_version(conn)
+    conn.close()
+    writer = MarketWriter(db_path, batch_size=1, journal=journal).start()
+    for record in records:
+        writer.put(record)
+    writer.stop()
+
+    # History, snapshots, refresh state and journal marks wait in the shard
+    for table in ("daily_closes", "market_snapshots", "refresh_state"):
+        assert _count(db_path, table) == 0
+    assert _count(shard_path(db_path, "forex"), "market_snapshots") == 2
+    assert journal.progress() == (0, 2)
+    conn = sqlite3.connect(db_path)
+    assert dataset_version(conn) == version_before
+    conn.close()
+
+    # An interrupted run's resume picks the collected marks up
+    assert resume_journal(db_path).progress() == (2, 2)
+    assert _count(db_path, "market_snapshots") == 2
+
+    writer.publish(categories=["forex"])
+    assert _markets(db_path) == {"EURUSD": 1.0, "GBPUSD": 2.0}
+    assert _count(db_path, "daily_closes") == 2
+    assert _count(db_path, "refresh_state") == 2
+    assert _count(shard_path(db_path, "forex"), "market_snapshots") == 0
+    assert RunJournal.resume(db_path) is None
@@ -0,0 +1,86 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("duckdb")
+
+import pyarrow.parquet as pq  # noqa: E402
+
+import config  # noqa: E402
+from columnar import export_to_parquet, run_query  # noqa: E402
+from run_analyzer import export_to_category_files, init_database, load_market_records, store_to_database  # noqa: E402
+
+
+def _record(category, symbol, perf_1m, currency="USD"):
+    return {
+        "Category": category,
+        "Symbol": symbol,
+        "Name": symbol,
+        "Current Price": 1.5,
+        "Currency": currency,
+        "Perf % 1D": 0.25,
+        "Perf % 1M": perf_1m,
+        "RSI 1H": None,
+        "Market Status": "TRADEABLE",
+    }
+
+
+def test_parquet_export_is_typed_and_dictionary_encoded(tmp_path):
+    path = str(tmp_path / "markets.parquet")
+    assert export_to_parquet([_record("Forex", "EURUSD", 1.25), _record("Forex", "GBPUSD", "-0.50%")], path)
+
+    table = pq.read_table(path)
+    assert table.schema.field("perf_1m_pct").type == pa.float64()
+    assert pa.types.is_dictionary(table.schema.field("category").type)
+    assert pa.types.is_dictionary(table.schema.field("currency").type)
+    assert table.column("perf_1m_pct").to_pylist() == [1.25, -0.5]
+    assert table.column("rsi_1h").to_pylist() == [None, None]
+
+
+def test_query_aggregates_parquet_exports_and_snapshot_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "EXPORT_FORMATS", ["parquet"])
+    db_path = str(tmp_path / "market_data.db")
+    export_dir = str(tmp_path / "exports")
+    init_database(db_path)
+    store_to_database([
+        _record("Forex", "EURUSD", 1.0),
+        _record("Forex", "GBPUSD", 3.0),
+        _record("Indices", "US500", -2.0),
+    ], db_path)
+    export_to_category_files(load_market_records(db_path), output_dir=export_dir)
+
+    result = run_query(
+        "SELECT category, avg(perf_1m_pct) AS avg_1m, count(*) AS n FROM markets GROUP BY 1 ORDER BY 1",
+        db_path=db_path, export_dir=export_dir,
+    )
+    assert result.to_dict("records") == [
+        {"category": "Forex", "avg_1m": 2.0, "n": 2},
+        {"category": "Indices", "avg_1m": -2.0, "n": 1},
+    ]
+
+    history = run_query(
+        "SELECT s.symbol, s.perf_1m_pct, m.category FROM snapshots AS s "
+        "JOIN markets AS m USING (symbol) WHERE s.symbol = 'US500'",
+        db_path=db_path, export_dir=export_dir,
+    )
+    assert history.to_dict("records") == [{"symbol": "US500", "perf_1m_pct": -2.0, "category": "Indices"}]
+
+    # Perf % 1D is stored, so the exports rebuilt from the database keep it
+    one_day = run_query("SELECT DISTINCT perf_1d_pct FROM markets", db_path=db_path, export_dir=export_dir)
+    assert one_day["perf_1d_pct"].tolist() == [0.25]
+
+
+def test_snapshot_history_is_narrowed_in_sqlite(tmp_path, monkeypatch):
+    import time
+
+    from columnar import parse_since, snapshot_table
+
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([_record("Forex", "EURUSD", 1.0), _record("Forex", "GBPUSD", 2.0)], db_path)
+    monkeypatch.setattr("columnar.SNAPSHOT_BATCH_ROWS", 1)
+
+    assert snapshot_table(db_path).num_rows == 2
+    assert snapshot_table(db_path, symbols=["GBPUSD"]).column("symbol").to_pylist() == ["GBPUSD"]
+    assert snapshot_table(db_path, since=parse_since("1d")).num_rows == 2
+    assert snapshot_table(db_path, until=time.time() - 86400).num_rows == 0
+    assert parse_since("2026-10-01") == parse_since("2026-10-01T00:00:00+00:00")
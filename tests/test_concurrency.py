@@ -0,0 +1,126 @@
+import pytest
+
+from concurrency import AdaptiveLimiter, ApiGovernor, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def _run_window(limiter, latency, overloaded=False):
+    # Fill every slot, as a busy worker pool would, then complete one window
+    for _ in range(limiter.window):
+        limiter.acquire()
+        limiter.release(latency, overloaded=overloaded)
+
+
+def _saturated_window(limiter, latency):
+    for _ in range(int(limiter.limit) - 1):
+        limiter.acquire()
+    held = int(limiter.limit) - 1
+    for _ in range(limiter.window):
+        limiter.acquire()
+        limiter.release(latency)
+    limiter.in_flight -= held
+
+
+def test_limiter_grows_when_saturated_and_healthy_and_backs_off_on_overload():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(initial=4, max_limit=6, window=10, clock=clock)
+
+    for _ in range(5):
+        _saturated_window(limiter, 0.1)
+    assert limiter.limit == 6
+
+    # Unsaturated healthy windows do not grow the limit further
+    _run_window(limiter, 0.1)
+    assert limiter.limit == 6
+
+    clock.now = 10.0
+    limiter.acquire()
+    limiter.release(0.1, overloaded=True)
+    assert limiter.limit == pytest.approx(4.2)
+
+    # A burst of overload inside the cooldown shrinks only once
+    limiter.acquire()
+    limiter.release(0.1, overloaded=True)
+    assert limiter.limit == pytest.approx(4.2)
+
+
+def test_limiter_shrinks_when_p95_latency_degrades():
+    limiter = AdaptiveLimiter(initial=5, window=10)
+    _saturated_window(limiter, 0.1)
+    assert limiter.limit == 6
+    _saturated_window(limiter, 0.5)
+    assert limiter.limit == 5
+
+
+def test_breaker_fails_fast_then_probes_for_recovery():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 31
+    assert breaker.allow()          # single half-open probe
+    assert not breaker.allow()
+    breaker.record_failure()        # failed probe reopens
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 62
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_governor_breaks_per_endpoint():
+    governor = ApiGovernor(AdaptiveLimiter(initial=2), failure_threshold=2)
+    for _ in range(2):
+        assert governor.request("prices", lambda: Response(503)).status_code == 503
+    with pytest.raises(CircuitOpenError):
+        governor.request("prices", lambda: Response(200))
+
+    # Other endpoints keep working; client errors are not failures
+    assert governor.request("markets", lambda: Response(404)).status_code == 404
+    assert governor.breaker("markets").state == CircuitBreaker.CLOSED
+    assert "open circuits: prices" in governor.summary()
+
+
+def test_governor_caps_concurrent_logins_below_the_request_limit():
+    import threading
+    import time
+
+    governor = ApiGovernor(AdaptiveLimiter(initial=16, max_limit=16), max_logins=2)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def login():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return Response(200)
+
+    threads = [threading.Thread(target=governor.login, args=(login,)) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+    assert governor.latency_stats()["session"]["samples"] == 16
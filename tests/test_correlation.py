@@ -0,0 +1,86 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from correlation import (
+    CorrelationEngine,
+    blocked_correlation,
+    ensure_candle_history_table,
+    store_daily_closes,
+)
+
+
+def test_blocked_correlation_matches_pairwise_pandas():
+    rng = np.random.default_rng(7)
+    returns = rng.normal(size=(11, 60))
+    returns[3] = returns[2] * 0.5 + rng.normal(scale=0.1, size=60)
+    returns[rng.random(returns.shape) < 0.15] = np.nan
+    returns[5, 10:] = np.nan  # too little overlap with everyone
+
+    result = blocked_correlation(returns, block=4, min_overlap=20)
+    expected = pd.DataFrame(returns.T).corr(min_periods=20).to_numpy()
+
+    np.testing.assert_allclose(result, expected, atol=1e-5, equal_nan=True)
+    assert np.isnan(result[5]).all()
+
+
+def test_top_correlated_from_candle_history():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE markets (symbol TEXT)")
+    conn.execute(
+        "CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT, updated_at TIMESTAMP)"
+    )
+    ensure_candle_history_table(conn)
+
+    rng = np.random.default_rng(1)
+    base = np.cumsum(rng.normal(size=80)) + 100
+    series = {
+        "LEAD": base,
+        "TWIN": base * 2,
+        "INVERSE": 300 - base,
+        "NOISE": np.cumsum(rng.normal(size=80)) + 100,
+    }
+    days = list(range(738000, 738080))
+    for symbol, closes in series.items():
+        conn.execute("INSERT INTO markets VALUES (?)", (symbol,))
+        # Drop a few days for one symbol; pairwise masks must cope.
+        keep = [i for i in range(80) if symbol != "TWIN" or i % 9]
+        store_daily_closes(conn, symbol, [days[i] for i in keep], [closes[i] for i in keep])
+
+    engine = CorrelationEngine()
+    top = engine.top_correlated(conn, "LEAD", window=60, k=2)
+
+    assert [s for s, _ in top] == ["TWIN", "NOISE"]
+    # TWIN's return after each gap spans two of LEAD's days
+    assert top[0][1] > 0.95
+    assert engine.top_correlated(conn, "MISSING", window=60) is None
+    assert len(engine._cache) == 1
+
+    # A streamed batch advances the row version, so the next lookup recomputes
+    from row_versions import next_row_version
+
+    next_row_version(conn)
+    store_daily_closes(conn, "NOISE", days, list(base * 3))
+    assert engine.top_correlated(conn, "LEAD", window=60, k=1)[0][0] == "NOISE"
+    assert len(engine._cache) == 2
+
+
+def test_weekday_returns_span_weekends_next_to_crypto():
+    from correlation import load_log_returns
+
+    conn = sqlite3.connect(":memory:")
+    ensure_candle_history_table(conn)
+    days = range(738000, 738091)
+    weekdays = [d for d in days if d % 7 < 5]  # two days off every seven
+    store_daily_closes(conn, "BTCUSD", list(days), [100.0 + d % 13 for d in days])
+    store_daily_closes(conn, "AAPL", weekdays, [50.0 + d % 11 for d in weekdays])
+
+    symbols, returns = load_log_returns(conn, window=40)
+
+    assert symbols == ["AAPL", "BTCUSD"]
+    observed = ~np.isnan(returns)
+    # Window counts each symbol's own observations; Mondays included
+    assert observed.sum(axis=1).tolist() == [40, 40]
+    closes = np.array([50.0 + d % 11 for d in weekdays[-41:]])
+    np.testing.assert_allclose(returns[0, observed[0]], np.diff(np.log(closes)))
@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+import time
+
+from db_connections import ConnectionPool
+from run_analyzer import init_database, store_to_database
+
+
+def _row(symbol):
+    return {"Category": "Forex", "Symbol": symbol, "Name": symbol}
+
+
+def test_reads_see_last_commit_while_a_write_is_open(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([_row("EURUSD")], db_path)
+    pool = ConnectionPool(db_path)
+
+    write_open = threading.Event()
+    release_write = threading.Event()
+
+    def slow_write():
+        with pool.writer() as conn:
+            conn.execute("DELETE FROM markets")
+            conn.execute(
+                "INSERT INTO markets (category, symbol, name) VALUES ('Forex', 'GBPUSD', 'GBPUSD')"
+            )
+            write_open.set()
+            release_write.wait(5)
+
+    writer = threading.Thread(target=slow_write)
+    writer.start()
+    try:
+        assert write_open.wait(5)
+        start = time.monotonic()
+        rows = pool.reader().execute("SELECT symbol FROM markets").fetchall()
+        assert time.monotonic() - start < 1.0
+        assert [r["symbol"] for r in rows] == ["EURUSD"]
+    finally:
+        release_write.set()
+        writer.join()
+
+    assert [r[0] for r in pool.reader().execute("SELECT symbol FROM markets")] == ["GBPUSD"]
+    assert pool.reader().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    pool.close()
+
+
+def test_readers_are_reused_per_thread_and_read_only(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    pool = ConnectionPool(db_path)
+
+    assert pool.reader() is pool.reader()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(pool.reader()))
+    thread.start()
+    thread.join()
+    assert other[0] is not pool.reader()
+
+    try:
+        pool.reader().execute("DELETE FROM markets")
+        raise AssertionError("reader connections must be read-only")
+    except sqlite3.OperationalError:
+        pass
+    pool.close()
+
+
+def test_released_readers_are_reused_by_later_threads(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    pool = ConnectionPool(db_path, max_idle_readers=2)
+
+    def request():
+        pool.reader().execute("SELECT COUNT(*) FROM markets").fetchone()
+        pool.release()
+
+    # A thread per request, as Flask's threaded dev server runs them
+    for _ in range(50):
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+    assert len(pool._readers) == 1
+
+    # Past the idle cap, released readers are closed
+    held, ready, done = [], threading.Barrier(4), threading.Event()
+
+    def hold():
+        held.append(pool.reader())
+        ready.wait()
+        done.wait()
+        pool.release()
+
+    threads = [threading.Thread(target=hold) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    assert len(pool._readers) == 3
+    done.set()
+    for thread in threads:
+        thread.join()
+    assert len(pool._readers) == 2
+    pool.close()
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+from capital_analyzer import (
+    _normalize_candles,
+    _parse_price_candles,
+    rsi_metrics_from_candles,
+)
+from indicator_pool import IndicatorPool, resolve_indicator_processes
+
+
+def _payload(start, step, count):
+    prices = []
+    for i in range(count):
+        t = start + step * i
+        close = 100 + (i % 7) - (i % 3) * 0.5
+        prices.append({
+            "snapshotTimeUTC": t.strftime("%Y-%m-%dT%H:%M:%S"),
+            "closePrice": {"bid": close},
+        })
+    # API order is not guaranteed; the compute stage must sort.
+    prices.reverse()
+    return {"prices": prices}
+
+
+def test_pool_matches_in_thread_computation():
+    now = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+    payloads = {
+        "day": _payload(now - timedelta(days=300), timedelta(days=1), 300),
+        "hour": _payload(now - timedelta(hours=400), timedelta(hours=1), 400),
+        "h4": _payload(now - timedelta(hours=4 * 100), timedelta(hours=4), 100),
+    }
+    expected = rsi_metrics_from_candles(
+        _normalize_candles(_parse_price_candles(payloads["day"])),
+        _normalize_candles(_parse_price_candles(payloads["hour"])),
+        _normalize_candles(_parse_price_candles(payloads["h4"])),
+        now,
+    )
+
+    with IndicatorPool(processes=2) as pool:
+        result = pool.rsi_metrics(payloads, now=now)
+        empty = pool.rsi_metrics({"day": None, "hour": {"prices": []}, "h4": None}, now=now)
+
+    assert result == expected
+    assert result["rsi_1h"] is not None
+    assert all(v is None for v in empty.values())
+
+
+def test_submitted_markets_are_batched_into_ring_blocks():
+    now = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+    markets = [
+        {"day": _payload(now - timedelta(days=n), timedelta(days=1), n)}
+        for n in range(20, 60, 2)
+    ]
+    expected = [
+        rsi_metrics_from_candles(_normalize_candles(_parse_price_candles(m["day"])), [], [], now)
+        for m in markets
+    ]
+
+    with IndicatorPool(processes=1, batch_size=4, linger=0.5) as pool:
+        tasks = []
+        submit = pool.executor.submit
+        pool.executor.submit = lambda *args: tasks.append(args[3]) or submit(*args)
+        futures = [pool.submit(m, now=now) for m in markets]
+        results = [future.result(timeout=30) for future in futures]
+        # More rows than a ring block holds: sent in a block of its own
+        rows = pool.capacity + 100
+        oversized = {"hour": _payload(now - timedelta(hours=rows), timedelta(hours=1), rows)}
+        assert pool.submit(oversized, now=now).result(timeout=30)[0]["rsi_1h"] is not None
+
+    assert [rsi for rsi, _ in results] == expected
+    assert [len(closes[0]) for _, closes in results] == list(range(20, 60, 2))
+    assert [len(batch) for batch in tasks] == [4, 4, 4, 4, 4, 1]
+
+
+def test_resolve_indicator_processes():
+    assert resolve_indicator_processes(0) == 0
+    assert resolve_indicator_processes(3) == 3
+
+
+def test_default_pool_is_one_process_per_core_and_off_on_a_single_core(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    assert resolve_indicator_processes(None) == 8
+    monkeypatch.setattr("os.cpu_count", lambda: 1)
+    assert resolve_indicator_processes(None) == 0
@@ -0,0 +1,39 @@
+import sqlite3
+
+from run_analyzer import MarketWriter, init_database, load_market_records, store_to_database
+
+
+def _row(category, symbol, perf="1.00%"):
+    return {"Category": category, "Symbol": symbol, "Name": symbol, "Perf % 1M": perf}
+
+
+def _symbols(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [r[0] for r in conn.execute("SELECT symbol FROM markets ORDER BY symbol")]
+    finally:
+        conn.close()
+
+
+def test_writer_streams_batches_and_publish_prunes_stale_rows(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database(
+        [_row("Forex", "OLD"), _row("Forex", "EURUSD", "0.50%"), _row("Shares", "AAPL")], db_path
+    )
+
+    writer = MarketWriter(db_path, batch_size=2, flush_interval=60).start()
+    writer.put(_row("Forex", "EURUSD", "2.00%"))
+    writer.put(_row("Forex", "GBPUSD"))
+    writer.put(_row("Forex", "USDJPY"))
+    writer.stop()
+
+    # Streamed rows are visible before the run is published.
+    assert _symbols(db_path) == ["AAPL", "EURUSD", "GBPUSD", "OLD", "USDJPY"]
+    assert writer.written == 3
+
+    writer.publish(categories=["forex"])
+
+    assert _symbols(db_path) == ["AAPL", "EURUSD", "GBPUSD", "USDJPY"]
+    eurusd = [r for r in load_market_records(db_path, ["forex"]) if r["Symbol"] == "EURUSD"]
+    assert eurusd[0]["Perf % 1M"] == 2.0
@@ -0,0 +1,116 @@
+import sqlite3
+
+import pytest
+
+from db_connections import ConnectionPool
+from run_analyzer import PublishValidationError, init_database, market_row_tuples, replace_market_rows, store_to_database
+
+
+def _rows(category, n, prefix):
+    return [{"Category": category, "Symbol": f"{prefix}{i}", "Name": f"{prefix}{i}"} for i in range(n)]
+
+
+def _symbols(conn):
+    return sorted(r[0] for r in conn.execute("SELECT symbol FROM markets"))
+
+
+def test_readers_see_the_previous_table_until_the_swap_commits(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database(_rows("Forex", 4, "OLD"), db_path)
+    pool = ConnectionPool(db_path)
+    reader = pool.reader()
+
+    with pool.writer() as conn:
+        replace_market_rows(conn, market_row_tuples(_rows("Forex", 3, "NEW")))
+        # Mid-publish: staging is swapped in but not committed
+        assert _symbols(reader) == ["OLD0", "OLD1", "OLD2", "OLD3"]
+
+    assert _symbols(reader) == ["NEW0", "NEW1", "NEW2"]
+    indexes = {r[0] for r in reader.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'markets'")}
+    assert "idx_markets_category_perf_1m_pct" in indexes
+    assert "markets_staging" not in {r[0] for r in reader.execute("SELECT name FROM sqlite_master")}
+    pool.close()
+
+
+def test_publish_that_drops_most_rows_is_rejected(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database(_rows("Forex", 10, "FX") + _rows("Shares", 2, "SH"), db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with pytest.raises(PublishValidationError):
+            with conn:
+                replace_market_rows(conn, market_row_tuples(_rows("Forex", 3, "FX")), categories=["forex"])
+        assert len(_symbols(conn)) == 12
+
+        # A subset refresh that keeps its size only replaces its own category
+        with conn:
+            replace_market_rows(conn, market_row_tuples(_rows("Forex", 9, "NEWFX")), categories=["forex"])
+        assert _symbols(conn) == sorted([f"NEWFX{i}" for i in range(9)] + ["SH0", "SH1"])
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("category_shards", [False, True])
+def test_streamed_publish_that_would_prune_most_rows_is_rejected(tmp_path, monkeypatch, category_shards):
+    import config
+    from run_analyzer import MarketWriter
+
+    monkeypatch.setattr(config, "CATEGORY_SHARDS", category_shards)
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database(_rows("Forex", 10, "FX") + _rows("Shares", 2, "SH"), db_path)
+
+    # A truncated listing: only 3 of the 10 forex markets came back
+    writer = MarketWriter(db_path).start()
+    for row in _rows("Forex", 3, "FX"):
+        writer.put(row)
+    writer.publish(categories=["forex"])
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert len(_symbols(conn)) == 12
+    finally:
+        conn.close()
+
+
+def test_aggregates_are_recomputed_only_when_a_publish_changes_rows(tmp_path, monkeypatch):
+    import run_analyzer
+    from aggregates import load_aggregates
+
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    refreshes = []
+    refresh_aggregates = run_analyzer.refresh_aggregates
+    monkeypatch.setattr(run_analyzer, "refresh_aggregates", lambda conn: refreshes.append(1) or refresh_aggregates(conn))
+
+    def publish(changes):
+        rows = [{"Category": "Forex", "Symbol": symbol, "Name": symbol, "Price Change %": change}
+                for symbol, change in changes.items()]
+        store_to_database(rows, db_path, categories=["forex"])
+        conn = sqlite3.connect(db_path)
+        try:
+            stats = load_aggregates(conn)
+            fetched = conn.execute("SELECT value FROM metadata WHERE key = 'last_fetch_time'").fetchone()[0]
+        finally:
+            conn.close()
+        assert stats["last_fetch"] == fetched
+        return stats
+
+    stats = publish({"EURUSD": 0.5, "GBPUSD": -0.25})
+    assert (len(refreshes), stats["markets"], stats["gainers"], stats["losers"]) == (1, 2, 1, 1)
+
+    # Nothing changed: only the fetch time moves
+    unchanged = publish({"EURUSD": 0.5, "GBPUSD": -0.25})
+    assert len(refreshes) == 1
+    assert dict(unchanged, last_fetch=None) == dict(stats, last_fetch=None)
+
+    stats = publish({"EURUSD": 0.5, "GBPUSD": 0.75})
+    assert (len(refreshes), stats["gainers"], stats["losers"]) == (2, 2, 0)
+    assert stats["extremes"]["price_change_pct"]["best"]["symbol"] == "GBPUSD"
+
+    # A publish that only deletes a market changes the aggregates too
+    stats = publish({"GBPUSD": 0.75})
+    assert (len(refreshes), stats["markets"], stats["gainers"]) == (3, 1, 1)
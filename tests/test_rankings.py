@@ -0,0 +1,85 @@
+import sqlite3
+
+import pandas as pd
+
+from rankings import compute_rankings, top_performers
+from run_analyzer import init_database, store_to_database
+
+
+def test_compute_rankings_per_category_and_global():
+    df = pd.DataFrame({
+        "symbol": ["A", "B", "C", "D"],
+        "category": ["Forex", "Forex", "Forex", "Shares"],
+        "perf_1m_pct": [1.0, 3.0, 2.0, None],
+        "rsi_1h": [50.0, 50.0, 70.0, 30.0],
+    })
+
+    ranks = compute_rankings(df).set_index(["metric", "symbol"])
+
+    perf = ranks.loc["perf_1m_pct"]
+    assert "D" not in perf.index
+    assert perf.loc["B", "category_rank"] == 1
+    assert perf.loc["A", "category_rank"] == 3
+    assert perf.loc["B", "category_percentile"] == 1.0
+    assert abs(perf.loc["C", "category_zscore"]) < 1e-12
+
+    rsi = ranks.loc["rsi_1h"]
+    assert rsi.loc["D", "category_rank"] == 1
+    assert rsi.loc["D", "category_zscore"] == 0.0
+    assert rsi.loc["D", "global_rank"] == 4
+    assert rsi.loc["A", "global_rank"] == rsi.loc["B", "global_rank"] == 2
+
+
+def test_store_to_database_writes_rankings(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    rows = [
+        {"Category": "Forex", "Symbol": f"FX{i}", "Name": f"FX {i}", "Perf % 1M": f"{i}.00%"}
+        for i in range(10)
+    ]
+    store_to_database(rows, db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        top_decile = conn.execute(
+            """
+            SELECT symbol FROM market_ranks
+            WHERE metric = 'perf_1m_pct' AND category = 'Forex' AND category_percentile > 0.9
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+
+    assert top_decile == [("FX9",)]
+
+
+def test_top_performers_ranks_each_category_from_its_index(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    rows = [
+        {"Category": "Forex", "Symbol": f"FX{i}", "Name": f"FX {i}", "Perf % 1M": f"{i}.00%"}
+        for i in range(8)
+    ] + [
+        {"Category": "Shares", "Symbol": "AAPL", "Name": "Apple", "Perf % 1M": "3.00%"},
+        {"Category": "Indices", "Symbol": "US500", "Name": "US 500", "Perf % 1M": "N/A"},
+    ]
+    store_to_database(rows, db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        leaders = top_performers(conn, "perf_1m_pct", limit=3)
+        plan = " ".join(str(r) for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT rowid FROM markets WHERE category = 'Forex' "
+            "AND perf_1m_pct IS NOT NULL ORDER BY perf_1m_pct DESC LIMIT 3"
+        ))
+    finally:
+        conn.close()
+
+    assert [(r[0], r[2], r[3], r[4]) for r in leaders] == [
+        ("Forex", "FX7", 7.0, 1),
+        ("Forex", "FX6", 6.0, 2),
+        ("Forex", "FX5", 5.0, 3),
+        ("Indices", None, None, 1),
+        ("Shares", "AAPL", 3.0, 1),
+    ]
+    assert "idx_markets_category_perf_1m_pct" in plan
@@ -0,0 +1,60 @@
+import sqlite3
+
+from refresh_policy import RefreshPolicy
+from run_analyzer import init_database, store_to_database
+
+NOW = 1_700_000_000.0
+
+
+def test_policy_skips_fresh_and_closed_markets():
+    state = {
+        "FRESH": ("TRADEABLE", NOW - 60),
+        "STALE_OPEN": ("TRADEABLE", NOW - 3600),
+        "CLOSED_CAPTURED": ("CLOSED", NOW - 86400),
+        "CLOSED_SINCE": ("TRADEABLE", NOW - 86400),
+    }
+    policy = RefreshPolicy(state, {"forex": 300}, now=NOW)
+    markets = [
+        {"epic": "FRESH", "marketStatus": "TRADEABLE"},
+        {"epic": "STALE_OPEN", "marketStatus": "TRADEABLE"},
+        {"epic": "CLOSED_CAPTURED", "marketStatus": "CLOSED"},
+        {"epic": "CLOSED_SINCE", "marketStatus": "CLOSED"},
+        {"epic": "NEW", "marketStatus": "CLOSED"},
+    ]
+
+    to_fetch, skipped = policy.split("forex", markets)
+
+    assert [m["epic"] for m in to_fetch] == ["STALE_OPEN", "CLOSED_SINCE", "NEW"]
+    assert [m["epic"] for m in skipped] == ["FRESH", "CLOSED_CAPTURED"]
+    assert policy.retained == ["FRESH", "CLOSED_CAPTURED"]
+
+
+def test_store_keeps_retained_rows_and_records_refresh(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database(
+        [
+            {"Category": "Forex", "Symbol": "EURUSD", "Name": "EUR/USD", "Market Status": "CLOSED"},
+            {"Category": "Forex", "Symbol": "GBPUSD", "Name": "GBP/USD", "Market Status": "TRADEABLE"},
+        ],
+        db_path,
+        categories=["forex"],
+    )
+
+    store_to_database(
+        [{"Category": "Forex", "Symbol": "GBPUSD", "Name": "GBP/USD", "Market Status": "TRADEABLE"}],
+        db_path,
+        categories=["forex"],
+        retain_symbols=["EURUSD"],
+    )
+
+    conn = sqlite3.connect(db_path)
+    try:
+        symbols = [r[0] for r in conn.execute("SELECT symbol FROM markets ORDER BY symbol")]
+    finally:
+        conn.close()
+    policy = RefreshPolicy.load(db_path)
+
+    assert symbols == ["EURUSD", "GBPUSD"]
+    assert policy.state["EURUSD"][0] == "CLOSED"
+    assert not policy.needs_refresh("forex", {"epic": "EURUSD", "marketStatus": "CLOSED"})
@@ -0,0 +1,68 @@
+import sqlite3
+
+from row_versions import changes_since, current_row_version
+from run_analyzer import MarketWriter, init_database, store_to_database
+
+
+def _row(symbol, perf_1m, category="Forex"):
+    return {"Category": category, "Symbol": symbol, "Name": symbol, "Perf % 1M": perf_1m}
+
+
+def _versions(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT symbol, row_version FROM markets"))
+    finally:
+        conn.close()
+
+
+def test_unchanged_markets_are_not_rewritten_and_changes_are_versioned(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([_row("EURUSD", 1.0), _row("GBPUSD", 2.0), _row("USDJPY", 3.0)], db_path)
+    first = _versions(db_path)
+
+    store_to_database([_row("EURUSD", 1.0), _row("GBPUSD", 2.0), _row("USDJPY", 3.0)], db_path)
+    assert _versions(db_path) == first
+
+    conn = sqlite3.connect(db_path)
+    seen = current_row_version(conn)
+    conn.close()
+    store_to_database([_row("EURUSD", 1.0), _row("GBPUSD", 2.5), _row("AUDUSD", 4.0)], db_path)
+    second = _versions(db_path)
+    assert second["EURUSD"] == first["EURUSD"]
+    assert second["GBPUSD"] == second["AUDUSD"] > seen
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows, deleted, version = changes_since(conn, seen)
+        assert sorted(row["symbol"] for row in rows) == ["AUDUSD", "GBPUSD"]
+        assert deleted == ["USDJPY"]
+        assert version == current_row_version(conn)
+        assert changes_since(conn, version)[:2] == ([], [])
+    finally:
+        conn.close()
+
+
+def test_writer_skips_unchanged_rows_and_a_relisted_market_loses_its_tombstone(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([_row("EURUSD", 1.0), _row("GBPUSD", 2.0)], db_path)
+    store_to_database([_row("EURUSD", 1.0), _row("GBPUSD", 2.0), _row("USDJPY", 3.0)], db_path)
+    store_to_database([_row("EURUSD", 1.0), _row("GBPUSD", 2.0)], db_path)
+
+    writer = MarketWriter(db_path, batch_size=10).start()
+    for record in (_row("EURUSD", 1.0), _row("GBPUSD", 2.0), _row("USDJPY", 3.5)):
+        writer.put(record)
+    writer.publish(categories=["forex"])
+
+    assert writer.written == 3
+    assert writer.changed == 1
+    conn = sqlite3.connect(db_path)
+    try:
+        rows, deleted, _ = changes_since(conn, 0)
+        assert len(rows) == 3
+        assert deleted == []
+    finally:
+        conn.close()
@@ -0,0 +1,73 @@
+import sqlite3
+
+from run_analyzer import MarketWriter, init_database, store_to_database
+from run_journal import RunJournal
+
+
+def _market(epic):
+    return {"epic": epic, "instrumentName": epic.title(), "marketStatus": "TRADEABLE"}
+
+
+def _row(symbol):
+    return {"Category": "Forex", "Symbol": symbol, "Name": symbol}
+
+
+def test_interrupted_run_resumes_remaining_epics_and_publishes(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([_row("DELISTED"), _row("SKIPPED")], db_path)
+
+    journal = RunJournal.start(db_path, ["Forex"])
+    journal.plan("forex", [_market("EURUSD"), _market("GBPUSD"), _market("USDJPY")], [_market("SKIPPED")])
+
+    # First session completes one market, then dies before publishing.
+    writer = MarketWriter(db_path, batch_size=1, journal=journal).start()
+    writer.put(_row("EURUSD"))
+    writer.stop()
+
+    resumed = RunJournal.resume(db_path)
+    assert resumed.run_id == journal.run_id
+    assert resumed.categories == ["forex"]
+    assert [m["epic"] for m in resumed.planned_markets("forex")] == ["GBPUSD", "USDJPY"]
+    assert resumed.progress() == (2, 4)
+
+    writer = MarketWriter(db_path, batch_size=1, journal=resumed).start()
+    writer.put(_row("GBPUSD"))
+    writer.put(_row("USDJPY"))
+    writer.publish(categories=resumed.categories)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        symbols = [r[0] for r in conn.execute("SELECT symbol FROM markets ORDER BY symbol")]
+        status = conn.execute(
+            "SELECT status FROM analyzer_runs WHERE run_id = ?", (journal.run_id,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+    assert symbols == ["EURUSD", "GBPUSD", "SKIPPED", "USDJPY"]
+    assert status == "completed"
+    assert RunJournal.resume(db_path) is None
+
+
+def test_only_the_latest_unfinished_run_resumes(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+
+    stale = RunJournal.start(db_path, ["Forex"])
+    stale.plan("forex", [_market("EURUSD")])
+    latest = RunJournal.start(db_path, ["Forex"])
+    assert RunJournal.resume(db_path).run_id == latest.run_id
+
+    writer = MarketWriter(db_path, journal=latest).start()
+    writer.put(_row("EURUSD"))
+    writer.publish(categories=latest.categories)
+
+    # The earlier run was superseded, not left to be replayed
+    assert RunJournal.resume(db_path) is None
+    conn = sqlite3.connect(db_path)
+    try:
+        status = conn.execute("SELECT status FROM analyzer_runs WHERE run_id = ?", (stale.run_id,)).fetchone()[0]
+    finally:
+        conn.close()
+    assert status == "abandoned"
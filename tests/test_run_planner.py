@@ -0,0 +1,53 @@
+import config
+import run_analyzer
+from mock_capital_api import mock_markets, serve_mock_api
+from run_planner import MARKET_REQUESTS, build_plan, cache_navigation, record_api_latency
+
+
+def _market(epic, status="TRADEABLE"):
+    return {"epic": epic, "instrumentName": epic, "marketStatus": status}
+
+
+def test_plan_counts_requests_from_cache_and_estimates_eta(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    run_analyzer.init_database(db_path)
+    cache_navigation(db_path, "forex", [_market(f"FX{i}") for i in range(30)], nodes=4)
+    record_api_latency(db_path, {
+        "markets": {"samples": 10, "mean": 0.1, "p95": 0.2},
+        "prices": {"samples": 10, "mean": 0.2, "p95": 0.4},
+    }, concurrency=4)
+
+    plan = build_plan(db_path, ["Forex", "Shares"], workers=8, request_delay=0.0, limit_for=lambda c: 20)
+
+    assert plan["uncached"] == ["shares"]
+    assert plan["markets"] == 20
+    assert plan["requests"]["marketnavigation"] == 4
+    assert plan["requests"]["markets"] == 20 * MARKET_REQUESTS["markets"]
+    assert plan["requests"]["prices"] == 20 * MARKET_REQUESTS["prices"]
+    assert plan["requests"]["session"] == 1 + 8
+    # Recorded concurrency (4) drives the estimate, not the 8 worker threads
+    assert plan["in_flight"] == 4
+    market_seconds = 2 * 0.1 + MARKET_REQUESTS["prices"] * 0.2
+    assert plan["eta_seconds"] > 20 * market_seconds / 4
+
+
+def test_plan_matches_requests_made_by_the_next_run(tmp_path, monkeypatch):
+    server = serve_mock_api(markets=mock_markets(6, ["forex", "indices"]))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "API_BASE_URL", server.base_url, raising=False)
+    monkeypatch.setattr(config, "OUTPUT_FILENAME", str(tmp_path / "analysis.csv"))
+    monkeypatch.setattr(config, "REQUEST_DELAY", 0)
+    db_path = str(tmp_path / "market_data.db")
+
+    try:
+        run_analyzer.run_analysis(["forex", "indices"], db_path=db_path)
+        plan = run_analyzer.plan_run(["forex", "indices"], db_path=db_path)
+        before = dict(server.request_counts)
+        run_analyzer.run_analysis(["forex", "indices"], db_path=db_path)
+        made = {k: v - before.get(k, 0) for k, v in server.request_counts.items()}
+    finally:
+        server.shutdown()
+
+    assert plan["uncached"] == []
+    for endpoint in ("marketnavigation", "markets", "prices", "ping"):
+        assert made.get(endpoint, 0) == plan["requests"][endpoint], endpoint
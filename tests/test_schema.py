@@ -0,0 +1,83 @@
+import sqlite3
+
+from run_analyzer import init_database, load_market_records
+from schema import SCHEMA_VERSION, migrate
+
+
+def _version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_new_database_is_created_at_the_current_version(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert migrate(conn) == SCHEMA_VERSION
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    assert _version(db_path) == SCHEMA_VERSION
+    assert {"markets", "metadata", "market_ranks", "daily_closes", "run_epics", "api_latency"} <= tables
+
+
+def test_legacy_text_percentages_are_migrated_to_real_columns(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE markets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT, symbol TEXT UNIQUE, name TEXT,
+            current_price REAL, currency TEXT, price_change_pct TEXT, perf_1w TEXT, perf_1m TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO markets (category, symbol, name, price_change_pct, perf_1w, perf_1m) "
+        "VALUES ('Forex', 'EURUSD', 'EUR/USD', '0.25%', 'N/A', '-1.50%')"
+    )
+    conn.commit()
+    conn.close()
+
+    init_database(db_path)
+
+    record = load_market_records(db_path)[0]
+    assert record["Price Change %"] == 0.25
+    assert record["Perf % 1W"] is None
+    assert record["Perf % 1M"] == -1.5
+    assert record["RSI 1H"] is None
+    assert _version(db_path) == SCHEMA_VERSION
+
+    # Rankings are filled by the migration, not only by the next publish
+    conn = sqlite3.connect(db_path)
+    try:
+        ranks = conn.execute("SELECT metric, global_rank FROM market_ranks ORDER BY metric").fetchall()
+    finally:
+        conn.close()
+    assert ranks == [("perf_1m_pct", 1), ("price_change_pct", 1)]
+
+
+def test_frozen_migrations_build_the_current_layout(tmp_path):
+    from schema import create_markets_table
+    from snapshots import ensure_snapshot_tables
+
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    current = sqlite3.connect(":memory:")
+    create_markets_table(current)
+    ensure_snapshot_tables(current)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        for table in ("markets", "market_snapshots"):
+            migrated = [r[1:3] for r in conn.execute(f"PRAGMA table_info({table})")]
+            assert migrated == [r[1:3] for r in current.execute(f"PRAGMA table_info({table})")]
+    finally:
+        conn.close()
+        current.close()
@@ -0,0 +1,72 @@
+import sqlite3
+
+from run_analyzer import MarketWriter, init_database, store_to_database
+from search import search_markets
+
+
+def _row(symbol, name, category="Shares"):
+    return {"Category": category, "Symbol": symbol, "Name": name}
+
+
+def _symbols(conn, query, **kwargs):
+    return [row["symbol"] for row in search_markets(conn, query, **kwargs)]
+
+
+def test_search_ranks_exact_symbol_then_prefix_then_words(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([
+        _row("GOLDMAN", "Goldman Sachs"),
+        _row("GOLD", "Spot Gold", "Commodities"),
+        _row("GDX", "Gold Miners ETF"),
+        _row("AAPL", "Apple Inc"),
+    ], db_path)
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        assert _symbols(conn, "gold") == ["GOLD", "GOLDMAN", "GDX"]
+        assert _symbols(conn, "appl") == ["AAPL"]
+        assert _symbols(conn, "gold miners") == ["GDX"]
+        assert _symbols(conn, "gold", category="Commodities") == ["GOLD"]
+        assert _symbols(conn, "  ") == []
+    finally:
+        conn.close()
+
+
+def test_index_follows_streamed_writes_and_publishes(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([_row("AAPL", "Apple Inc"), _row("MSFT", "Microsoft")], db_path)
+
+    writer = MarketWriter(db_path, batch_size=1, flush_interval=60).start()
+    writer.put(_row("MSFT", "Microsoft Corporation"))
+    writer.put(_row("NVDA", "Nvidia"))
+    writer.publish(categories=["shares"])
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        assert _symbols(conn, "corporation") == ["MSFT"]
+        assert _symbols(conn, "nvid") == ["NVDA"]
+        # AAPL was pruned at publish
+        assert _symbols(conn, "apple") == []
+    finally:
+        conn.close()
+
+
+def test_word_matches_rank_by_relevance(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([
+        _row("BRENT", "Brent Crude Oil Rolling Futures Contract", "Commodities"),
+        _row("WTI", "Oil", "Commodities"),
+    ], db_path)
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        assert _symbols(conn, "oil") == ["WTI", "BRENT"]
+    finally:
+        conn.close()
+
@@ -0,0 +1,47 @@
+import sqlite3
+
+import config
+from mock_capital_api import mock_markets, serve_mock_api
+from run_journal import RunJournal
+from shard_coordinator import run_sharded, shard_for
+
+
+def test_shard_for_is_stable_and_covers_all_shards():
+    epics = [f"EPIC{i}" for i in range(200)]
+    assert [shard_for(e, 4) for e in epics] == [shard_for(e, 4) for e in epics]
+    assert {shard_for(e, 4) for e in epics} == {0, 1, 2, 3}
+
+
+def test_sharded_run_against_mock_api_publishes_every_market(tmp_path, monkeypatch):
+    markets = mock_markets(6, ["forex", "indices"])
+    server = serve_mock_api(markets=markets)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "API_BASE_URL", server.base_url, raising=False)
+    monkeypatch.setattr(config, "OUTPUT_FILENAME", str(tmp_path / "analysis.csv"))
+    monkeypatch.setattr(config, "MAX_MARKETS_PER_CATEGORY", None)
+    db_path = str(tmp_path / "market_data.db")
+
+    try:
+        result = run_sharded(["forex", "indices"], shards=2, db_path=db_path)
+    finally:
+        server.shutdown()
+
+    assert result["success"] is True
+    assert result["markets_processed"] == 12
+
+    conn = sqlite3.connect(db_path)
+    try:
+        symbols = [r[0] for r in conn.execute("SELECT symbol FROM markets ORDER BY symbol")]
+        shards = conn.execute(
+            "SELECT shard, status FROM run_shards WHERE run_id = ? ORDER BY shard", (result["run_id"],)
+        ).fetchall()
+        closes = conn.execute("SELECT COUNT(DISTINCT symbol) FROM daily_closes").fetchone()[0]
+    finally:
+        conn.close()
+
+    assert symbols == sorted(m["epic"] for group in markets.values() for m in group)
+    assert shards == [(0, "done"), (1, "done")]
+    assert closes == 12
+    assert RunJournal.resume(db_path) is None
+    # Each market is owned by one shard (two detail lookups per market)
+    assert server.request_counts["markets"] == 24
@@ -0,0 +1,53 @@
+import sqlite3
+
+from run_analyzer import init_database, store_to_database
+from snapshots import DAY_SECONDS, SNAPSHOT_METRICS, compact_snapshots, record_snapshots, snapshot_history
+
+
+def _metrics(rsi):
+    return tuple(rsi if column == "rsi_1h" else None for column in SNAPSHOT_METRICS)
+
+
+def test_each_store_appends_a_snapshot(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    store_to_database([{"Category": "Forex", "Symbol": "EURUSD", "Name": "EUR/USD", "RSI 1H": 40.0}], db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        record_snapshots(conn, [("EURUSD", _metrics(45.0))], taken_at=4102444800)
+        history = snapshot_history(conn, "EURUSD", "rsi_1h")
+    finally:
+        conn.close()
+
+    assert [value for _, value in history] == [40.0, 45.0]
+
+
+def test_compaction_downsamples_by_age_and_expires(tmp_path):
+    db_path = str(tmp_path / "market_data.db")
+    init_database(db_path)
+    today = 20000
+    now = today * DAY_SECONDS + 12 * 3600
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            for days_ago in (1, 5, 40, 400):
+                start = (today - days_ago) * DAY_SECONDS
+                # Four snapshots in each of two hours of the day
+                for minute in (0, 15, 30, 45, 60, 75, 90, 105):
+                    record_snapshots(conn, [("EURUSD", _metrics(minute))], taken_at=start + minute * 60)
+            deleted = compact_snapshots(conn, raw_days=2, hourly_days=30, retention_days=365, now=now)
+            again = compact_snapshots(conn, now=now)
+        by_day = dict(conn.execute(
+            "SELECT day, COUNT(*) FROM market_snapshots GROUP BY day"
+        ).fetchall())
+        kept = [v for _, v in snapshot_history(conn, "EURUSD", "rsi_1h", since=(today - 5) * DAY_SECONDS)]
+    finally:
+        conn.close()
+
+    # Raw inside raw_days, last per hour to hourly_days, nothing past retention
+    assert by_day == {today - 1: 8, today - 5: 2, today - 40: 1}
+    assert kept[:2] == [45, 105]
+    assert deleted == {"hourly": 18, "daily": 2, "expired": 1}
+    assert again == {}